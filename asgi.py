@@ -0,0 +1,7 @@
+from asgiref.wsgi import WsgiToAsgi
+
+from wsgi import app as wsgi_app
+
+# ASGI entry point: uvicorn asgi:app --host 0.0.0.0 --port 8000 --workers 2
+# Requests run on asgiref's thread pool; each worker process loads its own datasets (no preload).
+app = WsgiToAsgi(wsgi_app)
@@ -0,0 +1,309 @@
+"""Offline load test of the query endpoints on synthetic data.
+
+    python benchmark.py --concurrency 1 4 16 --requests 500 --output bench.json
+    python benchmark.py --baseline bench.json      # exits with 1 when an endpoint regressed
+
+Generates X_test/y_pred (through the tabular training CSV), an image archive with its
+predictions, a SNIPS-shaped text CSV, sentence embeddings and a similarity matrix in a scratch
+DATA_DIR, builds the app with create_app and drives it in-process with Flask test clients.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from config import Config
+
+WORDS = ["play", "song", "playlist", "add", "book", "table", "restaurant", "weather", "tomorrow", "rate",
+         "movie", "find", "schedule", "music", "the", "my", "this", "to", "in", "at", "for", "show", "album"]
+
+
+def generate_data(data_dir, tabular_rows, tabular_features, n_images, image_size, n_texts, embedding_dim, seed=0):
+    """Write every input file the app loads at startup into ``data_dir``."""
+    rng = np.random.default_rng(seed)
+    os.makedirs(data_dir, exist_ok=True)
+
+    # Tabular training CSV; the startup loader fits the model and publishes X_test.npy / y_pred.npy
+    X = rng.standard_normal((tabular_rows, tabular_features))
+    y = (X[:, :5].argmax(axis=1) + (rng.random(tabular_rows) < 0.1)) % 5
+    frame = pd.DataFrame(X, columns=[f"f{i}" for i in range(tabular_features)])
+    frame["Class"] = y
+    frame.to_csv(os.path.join(data_dir, "synthetic_dataset.csv"), index=False)
+
+    # Image archive and its multi-label scores (no model weights, so the scores are served as they are)
+    images = rng.integers(0, 256, size=(n_images, image_size, image_size, 3), dtype=np.uint8)
+    np.savez_compressed(os.path.join(data_dir, "X_test_image.npz"), x=images)
+    np.save(os.path.join(data_dir, "y_pred_image.npy"), rng.random((n_images, 15), dtype=np.float32))
+
+    # SNIPS-shaped text CSV: clustered utterances with their embeddings, so similar texts exist
+    n_texts = max(n_texts, max(Config.RLA_SELECTED_TEXTS) + 1)
+    n_clusters = max(1, n_texts // 20)
+    cluster = rng.integers(0, n_clusters, n_texts)
+    labels = list(Config.TEXT_ID2LABEL.values())
+    pd.DataFrame({
+        "utterance": [" ".join(rng.choice(WORDS, size=rng.integers(3, 9))) for _ in range(n_texts)],
+        "human-assigned label": [labels[c % len(labels)] for c in cluster],
+        "model-assigned label": [labels[(c + (r < 0.2)) % len(labels)] for c, r in zip(cluster, rng.random(n_texts))],
+        "explanation": [f"expl {i}" for i in range(n_texts)],
+        "featured": False,
+    }).to_csv(os.path.join(data_dir, Config.TEXT_DATA_FILENAME))
+
+    centers = rng.standard_normal((n_clusters, embedding_dim)).astype(np.float32)
+    centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+    embeddings = centers[cluster] + 0.03 * rng.standard_normal((n_texts, embedding_dim)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    np.save(os.path.join(data_dir, Config.TEXT_EMBEDDING_FILENAME), embeddings.astype(Config.TEXT_EMBEDDING_DTYPE))
+
+    # Dense similarity matrix, written block by block
+    matrix = np.lib.format.open_memmap(os.path.join(data_dir, Config.TEXT_SIMILARITY_FILENAME), mode="w+",
+                                       dtype=np.float32, shape=(n_texts, n_texts))
+    for start in range(0, n_texts, 1024):
+        matrix[start:start + 1024] = embeddings[start:start + 1024] @ embeddings.T
+    matrix.flush()
+    del matrix
+
+
+def scenarios(sizes):
+    """endpoint name -> function(rng) returning a request URL with random, valid parameters."""
+    return {
+        "tabular_query": lambda rng: f"/query/tabular_data/query?class_value={rng.randrange(5)}"
+                                     f"&page={rng.randint(1, 3)}&per_page=10",
+        "image_query": lambda rng: f"/image_query/image_data/query?class_value={rng.randrange(5)}"
+                                   f"&page={rng.randint(1, 3)}",
+        "image": lambda rng: f"/image_query/image/{rng.randrange(sizes['images'])}",
+        "image_find_similar": lambda rng: f"/image_query/find_similar?index={rng.randrange(sizes['tabular_test'])}",
+        "text_query": lambda rng: f"/text_query/text_data/query?class_value={rng.randrange(7)}"
+                                  f"&page={rng.randint(1, 3)}",
+        "text_find_similar": lambda rng: f"/text_query/text_data/find_similar?index={rng.randrange(sizes['texts'])}",
+        "text_find_keyword": lambda rng: f"/text_query/text_data/find_keyword?keyword={rng.choice(WORDS)}"
+                                         f"&page={rng.randint(1, 3)}",
+    }
+
+
+def process_peak_rss_mb():
+    # Peak over the whole process lifetime (monotonic across runs); ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def current_rss_mb():
+    # Resident set size right now, from /proc (Linux); None where it is not available
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return round(pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024), 1)
+
+
+class RSSSampler:
+    """Samples current_rss_mb() every ``interval`` seconds on a thread, for the RSS of one run."""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            rss = current_rss_mb()
+            if rss is not None:
+                self.samples.append(rss)
+            if self._stop.wait(self.interval):
+                return
+
+    def stats(self):
+        # RSS when the run started and the highest sample during it (None without /proc)
+        if not self.samples:
+            return {"rss_start_mb": None, "rss_peak_mb": None}
+        return {"rss_start_mb": self.samples[0], "rss_peak_mb": max(self.samples)}
+
+
+def run_load(app, make_url, concurrency, n_requests, warmup, seed=0):
+    """Issue ``n_requests`` GETs from ``concurrency`` threads; latency percentiles and throughput."""
+    client = app.test_client()
+    warm_rng = random.Random(seed)
+    for _ in range(warmup):
+        client.get(make_url(warm_rng))
+
+    latencies, statuses, errors = [], {}, 0
+    counter = iter(range(n_requests))
+    lock = threading.Lock()
+
+    def worker(worker_id):
+        nonlocal errors
+        client = app.test_client()
+        rng = random.Random(seed * 1000 + worker_id + 1)
+        while True:
+            with lock:
+                if next(counter, None) is None:
+                    return
+            url = make_url(rng)
+            started = time.perf_counter()
+            try:
+                status = client.get(url).status_code
+            except Exception:
+                status = "exception"
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+                if status == "exception" or status >= 500:
+                    errors += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    with RSSSampler() as rss:
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - started
+
+    latencies_ms = np.asarray(latencies) * 1000
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+    return {"concurrency": concurrency, "requests": len(latencies), "errors": errors, "statuses": statuses,
+            "p50_ms": round(p50, 3), "p95_ms": round(p95, 3), "p99_ms": round(p99, 3),
+            "mean_ms": round(latencies_ms.mean(), 3), "max_ms": round(latencies_ms.max(), 3),
+            "throughput_rps": round(len(latencies) / wall, 2), **rss.stats(),
+            "process_peak_rss_mb": process_peak_rss_mb()}
+
+
+def compare(results, baseline, tolerance):
+    """(endpoint, concurrency, metric, baseline, current) for every p95 or throughput regression beyond ``tolerance``.
+
+    Memory is reported but not compared: it depends on everything the process ran before.
+    """
+    previous = {(row["endpoint"], row["concurrency"]): row for row in baseline["results"]}
+    regressions = []
+    for row in results:
+        before = previous.get((row["endpoint"], row["concurrency"]))
+        if before is None:
+            continue
+        if row["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append((row["endpoint"], row["concurrency"], "p95_ms", before["p95_ms"], row["p95_ms"]))
+        if row["throughput_rps"] < before["throughput_rps"] * (1 - tolerance):
+            regressions.append((row["endpoint"], row["concurrency"], "throughput_rps", before["throughput_rps"],
+                                row["throughput_rps"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the query endpoints against create_app on synthetic data.")
+    parser.add_argument("--endpoints", nargs="+", default=None, help="subset of endpoints (default: all)")
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16], help="client threads per run")
+    parser.add_argument("--requests", type=int, default=300, help="requests per endpoint and concurrency level")
+    parser.add_argument("--warmup", type=int, default=20, help="untimed requests before each run")
+    parser.add_argument("--tabular-rows", type=int, default=50000, help="rows of the training CSV (40%% become X_test)")
+    parser.add_argument("--tabular-features", type=int, default=16)
+    parser.add_argument("--images", type=int, default=500)
+    parser.add_argument("--image-size", type=int, default=224)
+    parser.add_argument("--texts", type=int, default=2000)
+    parser.add_argument("--embedding-dim", type=int, default=64)
+    parser.add_argument("--result-cache", choices=["memory", "sqlite", "none"], default="none",
+                        help="RESULT_CACHE_BACKEND during the run (default: none, every request is computed)")
+    parser.add_argument("--data-dir", default=None, help="where to generate the data (default: a temporary directory)")
+    parser.add_argument("--keep-data", action="store_true", help="keep the generated data directory")
+    parser.add_argument("--output", default=None, help="write the results as JSON")
+    parser.add_argument("--baseline", default=None, help="earlier --output file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative p95/throughput change")
+    args = parser.parse_args()
+
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="web_model_bench_")
+    started = time.perf_counter()
+    generate_data(data_dir, args.tabular_rows, args.tabular_features, args.images, args.image_size,
+                  args.texts, args.embedding_dim)
+    generate_seconds = time.perf_counter() - started
+
+    # Settings are read when web_model is imported, so they are set first
+    Config.DATA_DIR = data_dir
+    Config.RESULT_CACHE_BACKEND = None if args.result_cache == "none" else args.result_cache
+    started = time.perf_counter()
+    from web_model import create_app
+    from web_model.lifecycle import lifecycle, startup_report
+    import_seconds = time.perf_counter() - started
+
+    try:
+        started = time.perf_counter()
+        app = create_app()
+        create_app_seconds = time.perf_counter() - started
+        lifecycle.request()  # load everything before measuring, whatever STARTUP_WARMUP says
+        ready = lifecycle.wait()
+        startup = {"seconds": round(time.perf_counter() - started, 3),
+                   "import_seconds": round(import_seconds, 3),
+                   "create_app_seconds": round(create_app_seconds, 3),
+                   **startup_report()}
+        if not ready:
+            print(f"Startup failed: {json.dumps(lifecycle.snapshot(), default=str)}")
+            return 2
+
+        sizes = {"tabular_test": len(np.load(os.path.join(data_dir, "X_test.npy"), mmap_mode="r")),
+                 "images": args.images,
+                 "texts": len(np.load(os.path.join(data_dir, Config.TEXT_EMBEDDING_FILENAME), mmap_mode="r"))}
+        available = scenarios(sizes)
+        endpoints = args.endpoints or list(available)
+        unknown = sorted(set(endpoints) - set(available))
+        if unknown:
+            parser.error(f"unknown endpoints {unknown}; choose from {sorted(available)}")
+
+        results = []
+        for endpoint in endpoints:
+            for concurrency in args.concurrency:
+                row = {"endpoint": endpoint,
+                       **run_load(app, available[endpoint], concurrency, args.requests, args.warmup)}
+                results.append(row)
+                print(f"{endpoint:20s} c={concurrency:<3d} p50={row['p50_ms']:8.2f}ms p95={row['p95_ms']:8.2f}ms "
+                      f"p99={row['p99_ms']:8.2f}ms {row['throughput_rps']:9.1f} req/s "
+                      f"rss={row['rss_start_mb']}->{row['rss_peak_mb']}MB errors={row['errors']}")
+    finally:
+        if args.data_dir is None and not args.keep_data:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    report = {
+        "meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+                 "numpy": np.__version__, "platform": platform.platform(), "cpu_count": os.cpu_count(),
+                 "requests": args.requests, "warmup": args.warmup, "result_cache": args.result_cache,
+                 "sizes": {"tabular_rows": args.tabular_rows, "tabular_features": args.tabular_features,
+                           "images": args.images, "image_size": args.image_size, "texts": sizes["texts"],
+                           "embedding_dim": args.embedding_dim},
+                 "generate_seconds": round(generate_seconds, 3)},
+        "startup": startup,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for endpoint, concurrency, metric, before, after in regressions:
+            print(f"REGRESSION {endpoint} c={concurrency} {metric}: {before} -> {after}")
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,6 +2,10 @@ import os
 import logging
 
 class Config:
+    # Directory of every dataset, model and derived artifact; None -> the web_model package directory.
+    # Read when web_model is imported (e.g. the top-level benchmark.py points it at generated data).
+    DATA_DIR = None
+
     EXPERIMENT_GROUP = True
     TEXT_DATA_FILENAME = 'snips_bert-mini_test_ranked.csv'
     TEXT_SIMILARITY_FILENAME = 'bert-mini-sim_matrix.npy'
@@ -11,10 +15,147 @@ class Config:
 
     RLA_SELECTED_TEXTS = [181, 54, 131, 133, 77, 159, 137, 125, 128, 103, 7, 153, 136, 190, 108, 66, 148, 6, 132, 138, 15, 63, 35, 38, 67, 91, 116, 32, 62, 161, 107, 83, 143, 41, 118, 162, 31, 163, 191, 130, 170, 79, 94, 80, 147, 39, 183, 113, 100, 196]
 
+    # Top-k neighbour store built from the similarity matrix (python -m web_model.similarity_store);
+    # TEXT_TOPK_NEIGHBORS must be >= TOP_N_SIMILAR_TEXTS
+    TEXT_TOPK_PREFIX = 'bert-mini-sim_topk'
+    TEXT_TOPK_NEIGHBORS = 32
+
+    # Normalized sentence embeddings (python -m web_model.text_embeddings); find_similar uses them
+    # when TEXT_SIMILARITY_BACKEND is 'embeddings' and the file exists, otherwise the top-k store
+    TEXT_EMBEDDING_FILENAME = 'bert-mini-embeddings.npy'
+    TEXT_EMBEDDING_DTYPE = 'float16'
+    TEXT_SIMILARITY_BACKEND = 'embeddings'
+
+    # Ranked text frame cached as column arrays (python -m web_model.text_store); rebuilt when the
+    # CSV or RLA_SELECTED_TEXTS changes
+    TEXT_STORE_PREFIX = 'snips_bert-mini_test_ranked'
+
+    # Fitted tabular scaler/model/predictions, cached per (hyperparameters, dataset content hash)
+    TABULAR_ARTIFACT_DIR = 'artifacts/tabular'
+    TABULAR_ARTIFACT_KEEP = 3
+    # 'batch' (LogisticRegression on the whole CSV) or 'streaming' (chunked float32 reads,
+    # SGDClassifier.partial_fit, memory-mapped outputs; memory stays flat with file size)
+    TABULAR_TRAINING_MODE = 'batch'
+    TABULAR_STREAMING_CHUNK_ROWS = 100000
+    TABULAR_STREAMING_EPOCHS = 5
+    # Batch mode hyperparameter sweep: candidates are fitted in parallel on a loky process pool
+    # and the best by validation accuracy is kept. None fits the single default LogisticRegression.
+    # e.g. [{"model": "LogisticRegression", "params": {"max_iter": 1000}, "grid": {"C": [0.1, 1.0, 10.0]}},
+    #       {"model": "RandomForestClassifier", "grid": {"n_estimators": [100, 300], "max_depth": [None, 10]}}]
+    TABULAR_SWEEP_CANDIDATES = None
+    TABULAR_SWEEP_N_JOBS = -1
+    TABULAR_VALIDATION_SIZE = 0.2
+
     TOP_N_SIMILAR_TEXTS = 10
     TEXT_SIMILARITY_THRESHOLD = 0.9
 
     DEFAULT_PER_PAGE = 8 
+    MAX_PER_PAGE = 1000  # larger ?per_page= values are capped
+    # Click/feedback events: queued in memory and written in groups by a background thread.
+    # 'legacy' (clicks as JSON lines in the experiment .log, feedback as rows of feedback.csv, as before),
+    # 'ndjson' (per-process files, rotated and gzipped) or 'sqlite' (one WAL database shared by processes);
+    # EVENT_LOG_DIR None -> LoggerConfig.basepath. A full queue answers 503 after EVENT_PUT_TIMEOUT seconds.
+    EVENT_LOG_BACKEND = 'legacy'
+    EVENT_LOG_DIR = None
+    EVENT_LOG_ROTATE_BYTES = 64 * 1024 * 1024
+    EVENT_LOG_COMPRESS = True
+    EVENT_LOG_FSYNC = True
+    EVENT_LOG_SQLITE_FILENAME = 'events.sqlite3'
+    EVENT_QUEUE_SIZE = 10000
+    EVENT_BATCH_SIZE = 256
+    EVENT_FLUSH_SECONDS = 1.0
+    EVENT_PUT_TIMEOUT = 0.05
+
+    # Startup loaders (tabular model, image store/predictions, text data) run on a thread pool in
+    # dependency order. Requests for a dataset still loading wait up to STARTUP_REQUEST_WAIT seconds,
+    # then get 503 with Retry-After. /status/stream pushes state changes as Server-Sent Events.
+    STARTUP_MAX_WORKERS = 4
+    STARTUP_REQUEST_WAIT = 2.0
+    STARTUP_RETRY_AFTER = 5
+    STARTUP_SSE_KEEPALIVE = 15.0
+    # 'background': start every loader as soon as the app is created. 'on_demand': start a loader
+    # (and the loaders it depends on) with the first request that needs it, so the app is up at once.
+    STARTUP_WARMUP = 'background'
+
+    # Production serving: gunicorn -c gunicorn.conf.py wsgi:app (or an ASGI server on asgi:app).
+    # With SERVE_PRELOAD_APP the master loads datasets and models once before forking the workers,
+    # which share those pages copy-on-write.
+    SERVE_BIND = '0.0.0.0:8000'
+    SERVE_WORKERS = 2
+    SERVE_THREADS = 8
+    SERVE_PRELOAD_APP = True
+    SERVE_TIMEOUT = 120
+    # Longest the preloading master waits for the startup loaders before forking anyway; workers
+    # forked early rerun the unfinished loaders themselves
+    SERVE_PRELOAD_WAIT = 600.0
+    # CPU-heavy request work (image encoding, similarity search, upload decoding) runs on a bounded
+    # thread pool per process. Past HEAVY_POOL_MAX_PENDING waiting jobs a request waits at most
+    # HEAVY_POOL_QUEUE_TIMEOUT seconds for a slot, then gets 503. 0 workers runs it on the request thread.
+    HEAVY_POOL_WORKERS = 4
+    HEAVY_POOL_MAX_PENDING = 32
+    HEAVY_POOL_QUEUE_TIMEOUT = 1.0
+
+    # Instrumentation: per-endpoint/stage latency histograms on GET /metrics (Prometheus text, per process)
+    # and a Server-Timing header. ?profile=1 answers with the request's sampled stacks (folded,
+    # flame-graph ready) when REQUEST_PROFILING is set or the app runs in debug mode.
+    REQUEST_PROFILING = False
+    REQUEST_PROFILE_INTERVAL = 0.001  # seconds between stack samples
+
+    BATCH_MAX_QUERIES = 100  # sub-queries per POST /batch/query
+    EXPORT_BLOCK_ROWS = 1024  # rows serialized per chunk by the NDJSON /export endpoints
+
+    # Dataset registry: how often (seconds) a cached artifact re-checks its file's mtime,
+    # and whether a changed mtime must also change the content hash to trigger a reload
+    DATASET_RECHECK_SECONDS = 1.0
+    DATASET_VERIFY_HASH = False
+
+    # Vector index behind /image_query/find_similar ('exact' or 'ivf'), persisted beside X_test.npy
+    VECTOR_INDEX_BACKEND = 'exact'
+    VECTOR_INDEX_BLOCK_SIZE = 65536
+    IVF_N_LISTS = None  # None -> sqrt(number of rows)
+    IVF_N_PROBE = 8
+    SIMILAR_IMAGES_K = 8
+
+    # Uncompressed memory-mapped copy of X_test_image.npz (python -m web_model.image_store);
+    # with auto-convert, create_app builds it at startup when it is missing or the archive has changed
+    IMAGE_STORE_PREFIX = 'X_test_image'
+    IMAGE_STORE_AUTO_CONVERT = True
+
+    # Offline CNN prediction of X_test_image into y_pred_image.npy (imageRL.predict_and_save)
+    IMAGE_INFERENCE_BATCH_SIZE = 32
+    # DataLoader worker processes. Runs inside the server (a startup thread, possibly in a gunicorn master
+    # before fork), so 0 loads in-process; workers > 0 are started with 'spawn', never fork
+    IMAGE_INFERENCE_NUM_WORKERS = 0
+    IMAGE_INFERENCE_NUM_THREADS = None  # torch.set_num_threads; None keeps torch's default
+    IMAGE_INFERENCE_CHECKPOINT_BATCHES = 10  # flush predictions + progress every N batches
+
+    # Which CNN5Layer build the prediction paths use: 'fp32' (eager), 'fused' (TorchScript, frozen and
+    # optimized), 'int8' (static quantization) or 'int8_dynamic' (python -m web_model.model_export)
+    IMAGE_MODEL_VARIANT = 'fp32'
+    IMAGE_QUANT_ENGINE = 'x86'
+    IMAGE_QUANT_CALIBRATION_IMAGES = 256
+
+    # Online /image_query/predict: concurrent uploads are micro-batched into one forward pass
+    IMAGE_PREDICT_MAX_BATCH_SIZE = 16
+    IMAGE_PREDICT_MAX_WAIT_MS = 10
+    IMAGE_PREDICT_MAX_UPLOADS = 32  # images per request
+    IMAGE_PREDICT_MAX_PIXELS = 4096 * 4096  # larger uploads get 413 before being decoded
+    IMAGE_PREDICT_TIMEOUT = 30.0  # seconds a request waits for its predictions before answering 504
+    IMAGE_PREDICT_THRESHOLD = 0.5  # score at which a label is reported as predicted
+
+    # Encoded images served by /image_query/image/<index> are kept in memory (LRU, byte budget)
+    IMAGE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+    IMAGE_CACHE_MAX_AGE = 3600  # Cache-Control max-age (seconds) for image responses
+    IMAGE_QUALITY = 85
+    IMAGE_PREWARM = True  # encode the images of each result page in the background
+    MAX_SIMILAR_IMAGES_K = 100
+
+    # Encoded query responses cached per (endpoint, normalized params, dataset versions):
+    # 'memory' (per process), 'sqlite' (one file shared by all worker processes) or None to disable
+    RESULT_CACHE_BACKEND = 'memory'
+    RESULT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+    RESULT_CACHE_TTL = 300  # seconds
+    RESULT_CACHE_SQLITE_PATH = 'result_cache.sqlite3'
 
 class LoggerConfig:
     foldername = "logs/experiment" if Config.EXPERIMENT_GROUP else "logs/control"
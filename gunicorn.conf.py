@@ -0,0 +1,39 @@
+import time
+
+from config import Config
+
+# gunicorn -c gunicorn.conf.py wsgi:app
+bind = Config.SERVE_BIND
+workers = Config.SERVE_WORKERS
+threads = Config.SERVE_THREADS
+worker_class = "gthread"
+preload_app = Config.SERVE_PRELOAD_APP
+timeout = Config.SERVE_TIMEOUT
+
+_preload_deadline = None
+
+
+def pre_fork(server, worker):
+    # With preload_app the master has already imported wsgi:app. Let its startup loaders finish,
+    # so every worker inherits the loaded datasets and models instead of loading its own copy.
+    # The wait is bounded (SERVE_PRELOAD_WAIT for all forks together): a hung loader must not
+    # stop the master from starting workers
+    global _preload_deadline
+    if preload_app:
+        from web_model.lifecycle import lifecycle
+        if lifecycle.started:
+            lifecycle.request()  # also with STARTUP_WARMUP = 'on_demand'
+            if _preload_deadline is None:
+                _preload_deadline = time.monotonic() + Config.SERVE_PRELOAD_WAIT
+            if not lifecycle.wait(timeout=max(0.0, _preload_deadline - time.monotonic())):
+                states = {name: info["state"] for name, info in lifecycle.snapshot().items()}
+                server.log.warning("Startup loaders not ready after %ss, forking worker anyway: %s",
+                                   Config.SERVE_PRELOAD_WAIT, states)
+
+
+def post_fork(server, worker):
+    # Locks held by the master's loader threads are replaced, and loaders still running in the
+    # master are rerun in the worker (no-op once everything is ready)
+    if preload_app:
+        from web_model import after_fork
+        after_fork()
@@ -0,0 +1,55 @@
+import asyncio
+import importlib
+import sys
+import types
+
+import pytest
+from flask import Flask, request
+
+pytest.importorskip("asgiref")
+
+
+@pytest.fixture
+def apps(monkeypatch):
+    # asgi.py wraps wsgi.app; a small stand-in keeps create_app's loaders out of the test
+    flask_app = Flask(__name__)
+
+    @flask_app.route("/echo", methods=["GET", "POST"])
+    def echo():
+        return {"method": request.method, "args": request.args.to_dict(), "body": request.get_data(as_text=True)}, \
+            201, {"X-Test": "yes"}
+
+    monkeypatch.setitem(sys.modules, "wsgi", types.SimpleNamespace(app=flask_app))
+    monkeypatch.delitem(sys.modules, "asgi", raising=False)
+    return flask_app, importlib.import_module("asgi").app
+
+
+def call_asgi(app, method, path, query=b"", body=b""):
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method,
+             "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": query,
+             "root_path": "", "headers": [(b"host", b"testserver"), (b"content-length", str(len(body)).encode())],
+             "client": ("127.0.0.1", 1234), "server": ("testserver", 80)}
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    start = next(m for m in messages if m["type"] == "http.response.start")
+    headers = {key.decode().lower(): value.decode() for key, value in start["headers"]}
+    return start["status"], headers, b"".join(m.get("body", b"") for m in messages if m["type"] == "http.response.body")
+
+
+@pytest.mark.parametrize("method, query, body", [("GET", b"a=1&b=x", b""), ("POST", b"", b'{"k": 2}')])
+def test_asgi_app_answers_like_the_wsgi_app(apps, method, query, body):
+    flask_app, asgi_app = apps
+    expected = flask_app.test_client().open("/echo", method=method, query_string=query.decode(), data=body)
+
+    status, headers, content = call_asgi(asgi_app, method, "/echo", query, body)
+
+    assert status == expected.status_code == 201
+    assert content == expected.data
+    assert headers["x-test"] == "yes" and headers["content-type"] == expected.headers["Content-Type"]
@@ -0,0 +1,84 @@
+import importlib
+
+import numpy as np
+import pytest
+from flask import Flask
+
+from web_model.batch import batch_bp
+
+views = importlib.import_module("web_model.batch.views")
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # Stand-ins for the dataset-backed lookups: every valid sub-query answers 200
+    monkeypatch.setattr(views, "query_page",
+                        lambda category, per_page, layout, params: ({"category": category, "per_page": per_page}, 200))
+    monkeypatch.setattr(views, "similar_images",
+                        lambda queries, backend: [({"query_index": index, "k": k}, 200) for index, k in queries])
+    monkeypatch.setattr(views, "similar_texts",
+                        lambda queries, layout: [({"query_index": index}, 200) for index, _, _ in queries])
+    monkeypatch.setattr(views, "load_images", lambda: (np.zeros((2, 8, 8, 3), dtype=np.uint8), "v1"))
+    app = Flask(__name__)
+    app.register_blueprint(batch_bp, url_prefix="/batch")
+    return app.test_client()
+
+
+def statuses(response):
+    return [result["status"] for result in response.json["results"]]
+
+
+def test_invalid_sub_queries_fail_alone(client):
+    response = client.post("/batch/query", json={"queries": [
+        {"type": "image_similar", "index": 0},
+        {"type": "image_similar"},                          # missing index
+        {"type": "image_similar", "index": "x"},
+        {"type": "image_similar", "index": 1, "backend": "nope"},
+        {"type": "tabular_query", "class_value": 1, "per_page": 0},
+        {"type": "tabular_query", "class_value": 1, "per_page": 2},
+        {"type": "text_similar"},
+        {"type": "text_similar", "index": 5, "per_page": "abc"},
+        {"type": "text_similar", "index": 5},
+        {"type": "image"},
+        {"type": "unknown"},
+        "not an object",
+    ]})
+
+    assert response.status_code == 200
+    assert statuses(response) == [200, 400, 400, 400, 400, 200, 400, 400, 200, 400, 400, 400]
+    results = response.json["results"]
+    assert results[1]["body"]["error"] == "Missing parameter 'index'."
+    assert results[0]["body"] == {"query_index": 0, "k": views.Config.SIMILAR_IMAGES_K}
+
+
+def test_invalid_image_queries_do_not_load_the_images(client, monkeypatch):
+    def missing():
+        raise FileNotFoundError("X_test_image.npz")
+    monkeypatch.setattr(views, "load_images", missing)
+
+    response = client.post("/batch/query", json={"queries": [
+        {"type": "image"},
+        {"type": "image", "index": 0, "format": "bmp"},
+    ]})
+
+    assert statuses(response) == [400, 400]
+
+
+def test_a_failing_group_does_not_fail_the_others(client, monkeypatch):
+    def broken(queries, layout):
+        raise RuntimeError("boom")
+    monkeypatch.setitem(views.RUNNERS, "text_similar", broken)
+
+    response = client.post("/batch/query", json={"queries": [
+        {"type": "text_similar", "index": 1},
+        {"type": "tabular_query", "class_value": 2},
+    ]})
+
+    assert statuses(response) == [500, 200]
+    assert response.json["results"][0]["body"]["error"] == "Unexpected error: boom"
+
+
+@pytest.mark.parametrize("payload", [{}, {"queries": []}, {"queries": {"type": "image"}},
+                                     {"queries": [{"type": "image", "index": 0}], "layout": "xml"}])
+def test_malformed_batches_are_400(client, payload):
+    assert client.post("/batch/query", json=payload).status_code == 400
@@ -0,0 +1,46 @@
+import numpy as np
+
+from web_model.class_index import ClassIndex
+
+
+def test_rows_are_ascending_per_class():
+    labels = np.array([2, 0, 2, 1, 0, 2])
+    index = ClassIndex.from_labels(labels, n_classes=3)
+
+    for category in range(3):
+        assert index.rows(category).tolist() == np.flatnonzero(labels == category).tolist()
+        assert index.count(category) == int((labels == category).sum())
+
+
+def test_page_matches_slicing_the_full_match_list():
+    rng = np.random.default_rng(0)
+    labels = rng.integers(0, 5, size=200)
+    index = ClassIndex.from_labels(labels, n_classes=5)
+
+    matches = np.flatnonzero(labels == 3)
+    for start, end in [(0, 10), (10, 20), (len(matches) - 3, len(matches) + 7), (len(matches) + 5, len(matches) + 10)]:
+        assert index.page(3, start, end).tolist() == matches[start:end].tolist()
+
+
+def test_unknown_labels_and_categories_are_empty():
+    index = ClassIndex.from_labels([-1, 0, 5, 1], n_classes=3)
+
+    assert index.rows(0).tolist() == [1]
+    assert index.rows(1).tolist() == [3]
+    assert index.count(2) == 0
+    assert index.count(-1) == 0 and index.count(3) == 0
+    assert index.rows(7).tolist() == []
+
+
+def test_n_classes_defaults_to_largest_label():
+    index = ClassIndex.from_labels([0, 3, 3])
+
+    assert index.n_classes == 4
+    assert [index.count(k) for k in range(4)] == [1, 0, 0, 2]
+
+
+def test_arrays_are_read_only():
+    index = ClassIndex.from_labels([0, 1, 1])
+
+    assert not index.indices.flags.writeable
+    assert not index.offsets.flags.writeable
@@ -0,0 +1,90 @@
+import os
+
+import numpy as np
+import pytest
+
+from web_model.data_registry import DatasetRegistry
+
+
+def _save(path, array, mtime_ns):
+    np.save(path, array)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_file_entry_loads_once_and_is_read_only(tmp_path):
+    path = str(tmp_path / "a.npy")
+    _save(path, np.arange(3), 1_000_000_000)
+    registry = DatasetRegistry()
+    registry.register("a", path)
+
+    first = registry.get("a")
+    assert registry.get("a") is first
+    assert registry.stats()["a"]["requests"] == 2
+    assert registry.stats()["a"]["loads"] == 1
+    with pytest.raises(ValueError):
+        first[0] = 5
+
+
+def test_changed_file_is_reloaded_with_new_version(tmp_path):
+    path = str(tmp_path / "a.npy")
+    _save(path, np.arange(3), 1_000_000_000)
+    registry = DatasetRegistry()
+    registry.register("a", path)
+    old_version = registry.version("a")
+
+    _save(path, np.arange(4), 2_000_000_000)
+
+    assert registry.get("a").tolist() == [0, 1, 2, 3]
+    assert registry.version("a") != old_version
+
+
+def test_derived_entry_rebuilds_when_a_source_changes(tmp_path):
+    path = str(tmp_path / "a.npy")
+    _save(path, np.arange(3), 1_000_000_000)
+    registry = DatasetRegistry()
+    registry.register("a", path)
+    builds = []
+    registry.derive("total", ["a"], lambda a: builds.append(1) or np.array(a.sum()))
+
+    assert registry.get("total") == 3
+    assert registry.get("total") == 3
+    _save(path, np.arange(5), 2_000_000_000)
+    assert registry.get("total") == 10
+    assert len(builds) == 2
+
+
+def test_preload_skips_missing_and_on_demand_entries(tmp_path):
+    path = str(tmp_path / "a.npy")
+    _save(path, np.arange(3), 1_000_000_000)
+    registry = DatasetRegistry()
+    registry.register("a", path)
+    registry.register("missing", str(tmp_path / "missing.npy"))
+    registry.register("lazy", path, preload=False)
+
+    assert registry.preload() == ["a"]
+    with pytest.raises(FileNotFoundError):
+        registry.get("missing")
+    with pytest.raises(KeyError):
+        registry.get("unknown")
+
+
+def test_frames_are_read_only_and_column_changes_do_not_leak(tmp_path):
+    import pandas as pd
+
+    path = str(tmp_path / "frame.csv")
+    pd.DataFrame({"text": ["a", "b"], "score": [1.0, 2.0]}).to_csv(path, index=False)
+    registry = DatasetRegistry()
+    registry.register("frame", path, pd.read_csv)
+
+    frame = registry.get("frame")
+    with pytest.raises(ValueError):
+        frame.loc[0, "score"] = 5.0
+    with pytest.raises(ValueError):
+        frame.iloc[1, 0] = "z"
+    frame["extra"] = 1
+    frame["score"] = [7.0, 8.0]
+
+    again = registry.get("frame")
+    assert list(again.columns) == ["text", "score"]
+    assert again["score"].tolist() == [1.0, 2.0] and again["text"].tolist() == ["a", "b"]
+    assert registry.stats()["frame"]["loads"] == 1
@@ -0,0 +1,119 @@
+import gzip
+import json
+import sqlite3
+import threading
+import time
+
+from config import Config
+from web_model.event_log import (EventWriter, LineSink, NDJSONSink, SQLiteSink, click_line, create_sink,
+                                 feedback_row)
+
+
+class RecordingSink:
+    def __init__(self, block=None):
+        self.batches = []
+        self.closed = False
+        self.block = block
+
+    def write(self, events):
+        if self.block is not None:
+            self.block.wait()
+        self.batches.append(list(events))
+
+    def close(self):
+        self.closed = True
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_events_are_written_in_groups():
+    sink = RecordingSink()
+    writer = EventWriter(sink, batch_size=3, flush_interval=5.0)
+    for i in range(7):
+        assert writer.submit({"i": i})
+
+    # Two full batches go out at once; the last event waits for close() (or flush_interval)
+    assert wait_for(lambda: len(sink.batches) == 2)
+    writer.close()
+
+    assert [len(batch) for batch in sink.batches] == [3, 3, 1]
+    assert [event["i"] for batch in sink.batches for event in batch] == list(range(7))
+    assert sink.closed
+    assert writer.stats()["written"] == 7
+
+
+def test_partial_batch_is_flushed_after_the_interval():
+    sink = RecordingSink()
+    writer = EventWriter(sink, batch_size=100, flush_interval=0.05)
+    writer.submit({"i": 1})
+
+    assert wait_for(lambda: sink.batches == [[{"i": 1}]])
+    writer.close()
+
+
+def test_full_queue_rejects_instead_of_blocking():
+    release = threading.Event()
+    writer = EventWriter(RecordingSink(block=release), max_queue=2, batch_size=1, flush_interval=0.0,
+                         put_timeout=0.01)
+    accepted = [writer.submit({"i": i}) for i in range(5)]
+    release.set()
+    writer.close()
+
+    assert accepted.count(False) >= 1
+    assert writer.stats()["rejected"] == accepted.count(False)
+
+
+def test_ndjson_rotation_compresses_off_the_writer_thread(tmp_path):
+    writer = EventWriter(NDJSONSink(str(tmp_path), "clicks", rotate_bytes=10), batch_size=2, flush_interval=0.01)
+    for i in range(6):
+        writer.submit({"i": i})
+    writer.close()
+
+    # Every 2-event batch (16 bytes) passes rotate_bytes, so each ends up in its own .gz
+    assert wait_for(lambda: len(list(tmp_path.glob("*.gz"))) == 3)
+    events = []
+    for path in sorted(tmp_path.glob("clicks-*.ndjson.gz")):
+        events += [json.loads(line) for line in gzip.open(path).read().splitlines()]
+    assert events == [{"i": i} for i in range(6)]
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_legacy_lines_keep_the_original_formats(tmp_path):
+    clicks, feedback = tmp_path / "logs" / "run.log", tmp_path / "feedback.csv"
+    for path, format_line, events in [(clicks, click_line, [{"a": 1}, {"b": [2]}]),
+                                      (feedback, feedback_row, [{"timestamp": "t1", "feedback": 'fine, "ok"'}])]:
+        writer = EventWriter(LineSink(str(path), format_line, fsync=False), flush_interval=0.01)
+        for event in events:
+            writer.submit(event)
+        writer.close()
+
+    assert clicks.read_bytes() == b'{"a": 1}\n{"b": [2]}\n'
+    assert feedback.read_bytes() == b't1,"fine, ""ok"""\r\n'
+
+
+def test_sqlite_sink(tmp_path):
+    path = str(tmp_path / "events.sqlite3")
+    writer = EventWriter(SQLiteSink(path, "feedback"), flush_interval=0.01)
+    writer.submit({"feedback": "x"})
+    writer.close()
+
+    with sqlite3.connect(path) as conn:
+        rows = conn.execute("SELECT stream, payload FROM events").fetchall()
+    assert rows == [("feedback", '{"feedback": "x"}')]
+
+
+def test_legacy_feedback_appends_to_the_existing_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "DATA_DIR", str(tmp_path))
+    existing = tmp_path / "feedback.csv"
+    existing.write_bytes(b"t0,earlier\r\n")
+
+    writer = EventWriter(create_sink("feedback", backend="legacy"), flush_interval=0.01)
+    writer.submit({"timestamp": "t1", "feedback": "later"})
+    writer.close()
+
+    assert existing.read_bytes() == b"t0,earlier\r\nt1,later\r\n"
@@ -0,0 +1,83 @@
+import io
+import threading
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from web_model.image_cache import ImageCache, encode_image
+from web_model.offload import HeavyPool, PoolBusy, offload
+
+
+def test_lru_eviction_keeps_the_byte_budget():
+    cache = ImageCache(max_bytes=10)
+    cache.put("a", b"1234")
+    cache.put("b", b"1234")
+    assert cache.get("a") == b"1234"  # "b" is now the least recently used
+
+    cache.put("c", b"1234")
+
+    assert "b" not in cache and "a" in cache and "c" in cache
+    assert cache.stats()["bytes"] == 8 and cache.stats()["evictions"] == 1
+
+
+def test_items_larger_than_the_budget_are_not_cached():
+    cache = ImageCache(max_bytes=4)
+    cache.put("small", b"12")
+    cache.put("big", b"12345")
+    assert "big" not in cache and cache.get("small") == b"12"
+
+
+def test_replacing_a_key_updates_the_byte_count():
+    cache = ImageCache(max_bytes=10)
+    cache.put("a", b"12345678")
+    cache.put("a", b"12")
+    assert cache.stats()["bytes"] == 2 and cache.stats()["entries"] == 1
+
+
+def test_get_or_encode_encodes_once():
+    cache = ImageCache(max_bytes=100)
+    calls = []
+    encode = lambda: calls.append(1) or b"jpeg"
+    assert cache.get_or_encode("k", encode) == cache.get_or_encode("k", encode) == b"jpeg"
+    assert len(calls) == 1
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_encode_image_downscales_float_images():
+    data = encode_image(np.random.default_rng(0).random((40, 20)), size=10, fmt="jpeg")
+    image = Image.open(io.BytesIO(data))
+    assert image.format == "JPEG" and image.mode == "RGB" and max(image.size) == 10
+
+
+def test_heavy_pool_runs_jobs_on_its_threads_and_propagates_errors():
+    pool = HeavyPool(max_workers=2, max_pending=0, queue_timeout=1.0, name="heavy-test")
+    assert pool.run(lambda: threading.current_thread().name).startswith("heavy-test")
+
+    def fail():
+        raise KeyError("missing")
+    with pytest.raises(KeyError, match="missing"):
+        pool.run(fail)
+
+
+def test_heavy_pool_rejects_work_beyond_its_backlog():
+    pool = HeavyPool(max_workers=1, max_pending=0, queue_timeout=0.05)
+    started, release = threading.Event(), threading.Event()
+    worker = threading.Thread(target=pool.run, args=(lambda: started.set() or release.wait(5),))
+    worker.start()
+    try:
+        assert started.wait(5)
+        with pytest.raises(PoolBusy):
+            pool.run(lambda: None)
+        assert pool.stats()["rejected"] == 1
+    finally:
+        release.set()
+        worker.join()
+    assert pool.run(lambda: "free again") == "free again"
+
+
+def test_offload_runs_inline_without_workers(monkeypatch):
+    monkeypatch.setattr("config.Config.HEAVY_POOL_WORKERS", 0)
+    assert offload(lambda: threading.current_thread()) is threading.current_thread()
+    with pytest.raises(ValueError):
+        offload(int, "x")
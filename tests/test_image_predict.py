@@ -0,0 +1,71 @@
+import importlib
+import io
+import threading
+
+import numpy as np
+import pytest
+from flask import Flask
+from PIL import Image
+
+from web_model.image_query import image_query_bp
+from web_model.micro_batcher import MicroBatcher
+
+views = importlib.import_module("web_model.image_query.views")
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    weights = tmp_path / "model.pth"
+    weights.write_bytes(b"")
+    monkeypatch.setattr(views, "MODEL_PATH", str(weights))
+    app = Flask(__name__)
+    app.register_blueprint(image_query_bp, url_prefix="/image_query")
+    return app.test_client()
+
+
+def png(width=8, height=8):
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), "red").save(buffer, format="PNG")
+    buffer.seek(0)
+    return buffer
+
+
+def upload(client, *images):
+    return client.post("/image_query/predict", content_type="multipart/form-data",
+                       data={"images": [(image, f"{i}.png") for i, image in enumerate(images)]})
+
+
+def use_batcher(monkeypatch, batch_fn):
+    batcher = MicroBatcher(batch_fn, max_wait_ms=1)
+    monkeypatch.setattr(views, "get_batcher", lambda: batcher)
+    return batcher
+
+
+def test_predictions_per_upload(client, monkeypatch):
+    batcher = use_batcher(monkeypatch, lambda images: [np.array([0.1, 0.9, 0.6]) for _ in images])
+    try:
+        response = upload(client, png(), png())
+    finally:
+        batcher.close()
+
+    assert response.status_code == 200
+    assert [p["labels"] for p in response.json["predictions"]] == [[1, 2], [1, 2]]
+
+
+def test_a_stuck_prediction_times_out(client, monkeypatch):
+    release = threading.Event()
+    batcher = use_batcher(monkeypatch, lambda images: release.wait(5) and [np.zeros(3) for _ in images])
+    monkeypatch.setattr(views.Config, "IMAGE_PREDICT_TIMEOUT", 0.05)
+    try:
+        response = upload(client, png())
+    finally:
+        release.set()
+        batcher.close()
+
+    assert response.status_code == 504
+
+
+def test_oversized_and_invalid_uploads(client, monkeypatch):
+    monkeypatch.setattr(views.Config, "IMAGE_PREDICT_MAX_PIXELS", 100)
+    assert upload(client, png(20, 20)).status_code == 413
+    assert upload(client, io.BytesIO(b"not an image")).status_code == 400
@@ -0,0 +1,74 @@
+import os
+
+import numpy as np
+import pytest
+
+from web_model.image_store import ImageStore, convert_npz, is_current, open_images
+
+
+def images(n=5, seed=0):
+    return np.random.default_rng(seed).integers(0, 256, size=(n, 8, 6, 3), dtype=np.uint8)
+
+
+def write_npz(tmp_path, array, mtime_ns=None):
+    npz_path = str(tmp_path / "images.npz")
+    np.savez_compressed(npz_path, x=array)
+    if mtime_ns is not None:
+        os.utime(npz_path, ns=(mtime_ns, mtime_ns))
+    return npz_path, str(tmp_path / "images")
+
+
+def test_fixed_shape_store_round_trips(tmp_path):
+    expected = images()
+    npz_path, prefix = write_npz(tmp_path, expected, mtime_ns=1_000_000_000)
+
+    convert_npz(npz_path, prefix, chunk_bytes=100)  # several chunks per image
+    store = ImageStore.open(prefix)
+
+    assert len(store) == 5 and store.dtype == np.uint8
+    assert isinstance(store.array, np.memmap)
+    assert store[2].shape == (8, 6, 3) and store[2].dtype == np.uint8
+    np.testing.assert_array_equal(store.array, expected)
+
+
+def test_ragged_store_round_trips(tmp_path):
+    expected = np.empty(3, dtype=object)
+    expected[:] = [np.full((4, 5, 3), 1, dtype=np.uint8), np.full((2, 2), 2, dtype=np.uint8),
+                   np.arange(12, dtype=np.uint8).reshape(3, 4)]
+    npz_path, prefix = write_npz(tmp_path, expected)
+
+    convert_npz(npz_path, prefix)
+    store = ImageStore.open(prefix)
+
+    assert len(store) == 3 and store.meta["layout"] == "ragged"
+    for i in range(3):
+        assert store[i].shape == expected[i].shape and store[i].dtype == np.uint8
+        np.testing.assert_array_equal(store[i], expected[i])
+    np.testing.assert_array_equal(store[-1], expected[2])
+    with pytest.raises(IndexError):
+        store[3]
+
+
+def test_store_older_than_the_archive_is_stale(tmp_path):
+    npz_path, prefix = write_npz(tmp_path, images(), mtime_ns=1_000_000_000)
+    assert not is_current(prefix, npz_path)
+    convert_npz(npz_path, prefix)
+    assert is_current(prefix, npz_path)
+    assert isinstance(open_images(npz_path), ImageStore)
+
+    # A newer archive: readers use it directly until the store is converted again
+    newer = images(seed=1)
+    write_npz(tmp_path, newer, mtime_ns=os.stat(prefix + "_meta.json").st_mtime_ns + 1_000_000_000)
+    assert not is_current(prefix, npz_path)
+    np.testing.assert_array_equal(open_images(npz_path), newer)
+
+    convert_npz(npz_path, prefix)
+    np.testing.assert_array_equal(open_images(npz_path).array, newer)
+
+
+def test_archive_replaced_by_an_older_one_is_detected(tmp_path):
+    npz_path, prefix = write_npz(tmp_path, images(), mtime_ns=2_000_000_000)
+    convert_npz(npz_path, prefix)
+
+    write_npz(tmp_path, images(n=3, seed=1), mtime_ns=1_000_000_000)  # e.g. restored from a backup
+    assert not is_current(prefix, npz_path)
@@ -0,0 +1,154 @@
+import importlib
+import os
+import threading
+import time
+
+import pytest
+from flask import Flask
+
+import web_model
+from web_model.data_registry import DatasetRegistry
+from web_model.lifecycle import LifecycleManager
+
+lifecycle_module = importlib.import_module("web_model.lifecycle")
+
+
+def fail():
+    raise RuntimeError("no data")
+
+
+def test_dependents_run_after_their_dependencies():
+    order = []
+    manager = LifecycleManager()
+    manager.add("store", lambda: order.append("store"))
+    manager.add("image", lambda: order.append("image"), depends_on=["store"])
+    manager.start(max_workers=2)
+
+    assert manager.wait(timeout=5)
+    assert order == ["store", "image"]
+
+
+def test_failure_propagates_to_dependents_only():
+    ran = []
+    manager = LifecycleManager()
+    manager.add("store", fail)
+    manager.add("image", lambda: ran.append("image"), depends_on=["store"])
+    manager.add("thumbnails", lambda: ran.append("thumbnails"), depends_on=["image"])
+    manager.add("text", lambda: ran.append("text"))
+    manager.start(max_workers=2)
+
+    assert not manager.wait(timeout=5)
+    snapshot = manager.snapshot()
+    assert {name: info["state"] for name, info in snapshot.items()} == {
+        "store": "failed", "image": "failed", "thumbnails": "failed", "text": "ready"}
+    assert snapshot["store"]["error"] == "no data"
+    assert snapshot["image"]["error"] == "Dependency store failed."
+    assert ran == ["text"]
+
+
+def test_unknown_dependency_is_rejected():
+    manager = LifecycleManager()
+    manager.add("image", lambda: None, depends_on=["store"])
+
+    with pytest.raises(ValueError):
+        manager.start()
+
+
+def test_on_demand_runs_only_what_is_requested():
+    ran = []
+    manager = LifecycleManager()
+    manager.add("store", lambda: ran.append("store"))
+    manager.add("image", lambda: ran.append("image"), depends_on=["store"])
+    manager.add("text", lambda: ran.append("text"))
+    manager.start(run_all=False)
+
+    assert not manager.wait(["image"], timeout=0.1)
+    manager.request(["image"])
+
+    assert manager.wait(["image"], timeout=5)
+    assert sorted(ran) == ["image", "store"] and manager.state("text") == "pending"
+
+
+def test_wait_times_out_while_loading():
+    release = threading.Event()
+    manager = LifecycleManager()
+    manager.add("slow", release.wait)
+    manager.start()
+
+    assert not manager.wait(timeout=0.05)
+    assert manager.state("slow") == "loading"
+    release.set()
+    assert manager.wait(timeout=5)
+
+
+def test_requires_ready_answers_503_until_ready(monkeypatch):
+    release = threading.Event()
+    manager = LifecycleManager()
+    manager.add("text", release.wait)
+    manager.add("broken", fail)
+    manager.start()
+    monkeypatch.setattr(lifecycle_module, "lifecycle", manager)
+    monkeypatch.setattr(lifecycle_module.Config, "STARTUP_REQUEST_WAIT", 0.05)
+
+    app = Flask(__name__)
+    app.add_url_rule("/text", "text", lifecycle_module.requires_ready("text")(lambda: "ok"))
+    app.add_url_rule("/broken", "broken", lifecycle_module.requires_ready("broken")(lambda: "ok"))
+    client = app.test_client()
+
+    loading = client.get("/text")
+    assert loading.status_code == 503 and "Retry-After" in loading.headers
+    failed = client.get("/broken")
+    assert failed.status_code == 503 and failed.json["failed"] == {"broken": "no data"}
+
+    release.set()
+    assert manager.wait(["text"], timeout=5)
+    assert client.get("/text").data == b"ok"
+
+
+def wait_for_child(pid, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        done, status = os.waitpid(pid, os.WNOHANG)
+        if done:
+            return os.waitstatus_to_exitcode(status)
+        time.sleep(0.02)
+    os.kill(pid, 9)
+    os.waitpid(pid, 0)
+    return None
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+def test_after_fork_releases_locks_held_by_loader_threads(tmp_path, monkeypatch):
+    # Fork while a loader thread is inside registry.get (holding the registry entry's lock)
+    # and the startup task is still loading; the child must load both itself instead of hanging
+    parent = os.getpid()
+    release = threading.Event()
+    loading = threading.Event()
+
+    def slow_loader(path):
+        if os.getpid() == parent:
+            loading.set()
+            release.wait(10)
+        return path
+
+    registry = DatasetRegistry()
+    registry.register("data", str(tmp_path), slow_loader)
+    manager = LifecycleManager()
+    manager.add("data", lambda: registry.get("data"))
+    monkeypatch.setattr(web_model, "registry", registry)
+    monkeypatch.setattr(web_model, "lifecycle", manager)
+    manager.start(max_workers=1)
+    assert loading.wait(5)
+
+    pid = os.fork()
+    if pid == 0:
+        try:
+            web_model.after_fork()
+            os._exit(0 if manager.wait(timeout=5) and registry.get("data") == str(tmp_path) else 1)
+        finally:
+            os._exit(2)
+    try:
+        assert wait_for_child(pid) == 0
+    finally:
+        release.set()
+    assert manager.wait(timeout=5)
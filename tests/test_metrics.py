@@ -0,0 +1,93 @@
+import re
+import threading
+import time
+
+import pytest
+from flask import Flask
+
+from web_model import metrics
+from web_model.index import index_bp
+from web_model.metrics import SamplingProfiler, span
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    metrics.init_app(app)
+    app.register_blueprint(index_bp, url_prefix="/")
+
+    @app.route("/work/<int:n>")
+    def work(n):
+        with span("load"):
+            total = sum(range(n))
+        with span("format"):
+            busy_until = time.perf_counter() + n / 1e6
+            while time.perf_counter() < busy_until:
+                pass
+        return {"total": total}
+
+    return app.test_client()
+
+
+def sample(text, name, **labels):
+    # Value of one sample line of the exposition, None when absent
+    for line in text.splitlines():
+        if line.startswith(name + "{") or line.startswith(name + " "):
+            found = dict(re.findall(r'(\w+)="([^"]*)"', line))
+            if all(found.get(key) == value for key, value in labels.items()):
+                return float(line.rsplit(" ", 1)[1])
+    return None
+
+
+def test_metrics_after_a_request(client):
+    response = client.get("/work/1000")
+    assert response.status_code == 200
+    assert "load;dur=" in response.headers["Server-Timing"] and "total;dur=" in response.headers["Server-Timing"]
+
+    text = client.get("/metrics").get_data(as_text=True)
+
+    assert "# TYPE web_model_request_duration_seconds histogram" in text
+    assert "# TYPE web_model_requests_started_total counter" in text
+    assert sample(text, "web_model_requests_started_total", endpoint="work") >= 1
+    assert sample(text, "web_model_request_duration_seconds_count", endpoint="work", method="GET", status="200") >= 1
+    assert sample(text, "web_model_request_duration_seconds_bucket",
+                  endpoint="work", method="GET", status="200", le="+Inf") >= 1
+    for stage in ("load", "format"):
+        assert sample(text, "web_model_stage_duration_seconds_count", endpoint="work", stage=stage) >= 1
+    assert "# TYPE web_model_cache_hits_total counter" in text
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = metrics.Histogram("test_seconds", "Test.", ["stage"], buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value, "x")
+    text = "\n".join(histogram.expose())
+
+    assert [sample(text, "test_seconds_bucket", le=le) for le in ("0.1", "1.0", "+Inf")] == [1, 2, 3]
+    assert sample(text, "test_seconds_sum") == pytest.approx(5.55)
+
+
+def profiler_threads():
+    return [thread for thread in threading.enumerate() if thread.name == "request-profiler"]
+
+
+def test_profiler_samples_and_stops_its_thread():
+    profiler = SamplingProfiler(threading.get_ident(), interval=0.001).start()
+    busy_until = time.perf_counter() + 0.1
+    while time.perf_counter() < busy_until:
+        pass
+    profiler.stop()
+
+    assert sum(profiler.samples.values()) > 0
+    assert "test_profiler_samples_and_stops_its_thread" in profiler.folded()
+    assert not profiler_threads()
+
+
+def test_profile_query_returns_folded_stacks(client, monkeypatch):
+    monkeypatch.setattr(metrics.Config, "REQUEST_PROFILING", True)
+    response = client.get("/work/50000?profile=1")
+
+    assert response.status_code == 200 and response.mimetype == "text/plain"
+    assert int(response.headers["X-Profile-Samples"]) > 0
+    assert "work (test_metrics.py" in response.get_data(as_text=True)
+    assert not profiler_threads()
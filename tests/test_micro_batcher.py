@@ -0,0 +1,62 @@
+import threading
+
+import pytest
+
+from web_model.micro_batcher import MicroBatcher
+
+
+def test_concurrent_requests_are_grouped_and_answered_in_order():
+    started = threading.Event()
+    release = threading.Event()
+
+    def batch_fn(items):
+        started.set()
+        release.wait(5)
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(batch_fn, max_batch_size=4, max_wait_ms=50)
+    try:
+        blocker = batcher.submit(0)
+        assert started.wait(5)
+        futures = [batcher.submit(i) for i in range(1, 5)]
+        release.set()
+
+        assert blocker.result(5) == 0
+        assert [f.result(5) for f in futures] == [2, 4, 6, 8]
+        assert batcher.stats()["batches"] == 2
+        assert batcher.stats()["items"] == 5
+    finally:
+        batcher.close()
+
+
+def test_batch_failure_is_raised_for_every_item_in_the_batch():
+    def batch_fn(items):
+        raise RuntimeError("model failed")
+
+    batcher = MicroBatcher(batch_fn, max_batch_size=2, max_wait_ms=1000)
+    try:
+        futures = [batcher.submit(i) for i in range(2)]
+        for future in futures:
+            with pytest.raises(RuntimeError, match="model failed"):
+                future.result(5)
+    finally:
+        batcher.close()
+
+
+def test_submit_after_close_raises():
+    batcher = MicroBatcher(lambda items: items)
+    assert batcher(7, timeout=5) == 7
+    batcher.close()
+    with pytest.raises(RuntimeError):
+        batcher.submit(1)
+
+
+def test_a_short_result_list_fails_the_whole_batch():
+    batcher = MicroBatcher(lambda items: items[:-1], max_batch_size=2, max_wait_ms=1000)
+    try:
+        futures = [batcher.submit(i) for i in range(2)]
+        for future in futures:
+            with pytest.raises(RuntimeError, match="1 results for 2 items"):
+                future.result(5)
+    finally:
+        batcher.close()
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from config import Config
+from web_model import imageRL
+from web_model.inference_status import InferenceStatus
+
+
+@pytest.fixture
+def model_files(tmp_path, monkeypatch):
+    # Seeded random weights and a few calibration images, instead of the real model and archive
+    torch.manual_seed(0)
+    model_path = str(tmp_path / "cnn.pth")
+    torch.save(imageRL.CNN5Layer().state_dict(), model_path)
+    npz_path = str(tmp_path / "images.npz")
+    np.savez(npz_path, x=np.random.default_rng(0).random((4, 224, 224, 3), dtype=np.float32))
+    monkeypatch.setattr(Config, "IMAGE_QUANT_CALIBRATION_IMAGES", 4)
+    return model_path, npz_path
+
+
+# Largest logit difference allowed, relative to the largest eager logit
+@pytest.mark.parametrize("variant, tolerance", [("fused", 1e-4), ("int8_dynamic", 0.05), ("int8", 0.1)])
+def test_exported_model_matches_the_eager_model(model_files, variant, tolerance):
+    from web_model import model_export
+
+    model_path, npz_path = model_files
+    path = model_export.export_variant(variant, model_path=model_path, npz_path=npz_path)
+    exported = torch.jit.load(path)
+    eager = imageRL.load_model(model_path)
+
+    images = torch.stack([imageRL.NPZImageDataset(npz_path, transform=imageRL.default_transform)[i]
+                          for i in range(4)])
+    with torch.inference_mode():
+        expected = eager(images)
+        logits = exported(images)
+    assert logits.shape == expected.shape
+    assert (logits - expected).abs().max() <= tolerance * expected.abs().max()
+
+
+def test_prediction_of_an_empty_archive_fails_clearly(model_files, tmp_path):
+    model_path, _ = model_files
+    empty = str(tmp_path / "empty.npz")
+    np.savez(empty, x=np.zeros((0, 224, 224, 3), dtype=np.float32))
+    status = InferenceStatus()
+
+    with pytest.raises(ValueError, match="no images"):
+        imageRL.predict_and_save(empty, model_path, str(tmp_path / "y_pred.npy"), status=status)
+    assert status.snapshot()["state"] == "failed"
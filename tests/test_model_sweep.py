@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from web_model.model_sweep import MODELS, expand_candidates, run_sweep
+
+CANDIDATES = [
+    {"model": "LogisticRegression", "params": {"max_iter": 500}, "grid": {"C": [0.001, 1.0]}},
+    {"model": "RandomForestClassifier", "params": {"random_state": 0}, "grid": {"n_estimators": [3, 20]}},
+]
+
+
+def split(seed=0):
+    rng = np.random.default_rng(seed)
+    y = rng.integers(0, 3, 300)
+    X = rng.normal(size=(300, 5)) + y[:, None]
+    return X[:200], y[:200], X[200:], y[200:]
+
+
+def test_expand_candidates():
+    assert expand_candidates(CANDIDATES)[0] == ("LogisticRegression", {"max_iter": 500, "C": 0.001})
+    assert len(expand_candidates(CANDIDATES)) == 4
+    with pytest.raises(ValueError):
+        expand_candidates([{"model": "Nope"}])
+
+
+def test_loky_sweep_picks_the_sequential_best():
+    X_train, y_train, X_val, y_val = split()
+
+    model, results = run_sweep(X_train, y_train, X_val, y_val, CANDIDATES, n_jobs=2)
+
+    # The same candidates fitted one after the other in this process
+    scores = [MODELS[name](**params).fit(X_train, y_train).score(X_val, y_val)
+              for name, params in expand_candidates(CANDIDATES)]
+    best = int(np.argmax(scores))
+    assert [result["val_score"] for result in results] == pytest.approx(scores)
+    assert [result["best"] for result in results] == [i == best for i in range(len(scores))]
+    assert type(model).__name__ == results[best]["model"]
+    assert {key: model.get_params()[key] for key in results[best]["params"]} == results[best]["params"]
+    assert model.score(X_val, y_val) == pytest.approx(scores[best])
@@ -0,0 +1,54 @@
+import pytest
+
+from config import Config
+from web_model.pagination import (CursorError, PaginationError, StaleCursorError, cursor_error, decode_cursor,
+                                  encode_cursor, paginate, parse_per_page)
+
+SCOPE = ("tabular", 1)
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor(SCOPE, "v1", 30)
+
+    assert decode_cursor(cursor, SCOPE, "v1") == 30
+
+
+def test_stale_cursor_is_410():
+    cursor = encode_cursor(SCOPE, "v1", 30)
+
+    with pytest.raises(StaleCursorError) as error:
+        decode_cursor(cursor, SCOPE, "v2")
+    assert cursor_error(error.value)[1] == 410
+
+
+@pytest.mark.parametrize("cursor", [encode_cursor(("tabular", 2), "v1", 30),  # another query's cursor
+                                    encode_cursor(SCOPE, "v1", -5),
+                                    "not-a-cursor", "", "e30"])  # "e30" is base64 of {}
+def test_foreign_or_malformed_cursor_is_400(cursor):
+    with pytest.raises(CursorError) as error:
+        decode_cursor(cursor, SCOPE, "v1")
+    assert not isinstance(error.value, StaleCursorError)
+    assert cursor_error(error.value)[1] == 400
+
+
+def test_pages_and_next_cursor():
+    start, end, info = paginate(25, 10, SCOPE, "v1", {"page": 2})
+
+    assert (start, end) == (10, 20)
+    assert info == {"total_results": 25, "total_pages": 3, "current_page": 2, "per_page": 10,
+                    "next_cursor": encode_cursor(SCOPE, "v1", 20)}
+
+    start, end, info = paginate(25, 10, SCOPE, "v1", {"cursor": info["next_cursor"]})
+    assert (start, end, info["current_page"], info["next_cursor"]) == (20, 30, 3, None)
+
+
+@pytest.mark.parametrize("per_page, page", [(0, 1), (-3, 1), ("abc", 1), (None, 1), (10, 0), (10, -1), (10, "x")])
+def test_invalid_page_or_per_page_is_400(per_page, page):
+    with pytest.raises(PaginationError) as error:
+        paginate(25, per_page, SCOPE, "v1", {"page": page})
+    assert cursor_error(error.value)[1] == 400
+
+
+def test_per_page_is_parsed_and_capped():
+    assert parse_per_page("7") == 7
+    assert parse_per_page(Config.MAX_PER_PAGE + 1) == Config.MAX_PER_PAGE
@@ -0,0 +1,96 @@
+import importlib
+import os
+import time
+
+import numpy as np
+import pytest
+from flask import Flask, jsonify, request
+
+from web_model.data_registry import DatasetRegistry
+
+result_cache = importlib.import_module("web_model.result_cache")
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def cache(request, tmp_path):
+    if request.param == "memory":
+        return result_cache.MemoryResultCache(max_bytes=100, ttl=60)
+    return result_cache.SQLiteResultCache(str(tmp_path / "cache.sqlite3"), max_bytes=100, ttl=60)
+
+
+def test_key_depends_on_endpoint_params_and_versions():
+    key = result_cache.make_key("query", ["GET", [("page", "1")], None], ["v1"])
+
+    assert key == result_cache.make_key("query", ["GET", [("page", "1")], None], ["v1"])
+    assert key != result_cache.make_key("query", ["GET", [("page", "1")], None], ["v2"])
+    assert key != result_cache.make_key("query", ["GET", [("page", "2")], None], ["v1"])
+    assert key != result_cache.make_key("export", ["GET", [("page", "1")], None], ["v1"])
+
+
+def test_get_put_and_lru_eviction(cache):
+    cache.put("a", b"x" * 40)
+    cache.put("b", b"y" * 40)
+    time.sleep(0.01)  # distinct access times for the SQLite backend
+    assert cache.get("a") == b"x" * 40  # a is now the most recently used
+
+    cache.put("c", b"z" * 40)  # over the 100-byte budget: b goes
+
+    assert cache.get("b") is None
+    assert cache.get("a") == b"x" * 40 and cache.get("c") == b"z" * 40
+    assert cache.stats()["evictions"] == 1
+    cache.put("huge", b"h" * 101)
+    assert cache.get("huge") is None
+
+
+def test_entries_expire(cache):
+    cache.ttl = 0.0
+    cache.put("a", b"x")
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    registry = DatasetRegistry()
+    path = str(tmp_path / "data.npy")
+    np.save(path, np.arange(3))
+    registry.register("data", path)
+    monkeypatch.setattr(result_cache, "registry", registry)
+    monkeypatch.setattr(result_cache, "result_cache", result_cache.MemoryResultCache(1 << 20, 60))
+
+    app = Flask(__name__)
+    calls = []
+
+    @app.route("/sum")
+    @result_cache.cached_response(["data"])
+    def total():
+        calls.append(request.args.get("page"))
+        if request.args.get("page") == "0":
+            return jsonify({"error": "bad page"}), 400
+        return jsonify({"sum": int(registry.get("data").sum())})
+
+    app.calls, app.data_path = calls, path
+    return app
+
+
+def test_cached_until_the_dataset_version_changes(app):
+    client = app.test_client()
+
+    first = client.get("/sum?page=1&per_page=2")
+    second = client.get("/sum?per_page=2&page=1")  # same query, other parameter order
+    assert (first.headers["X-Cache"], second.headers["X-Cache"]) == ("MISS", "HIT")
+    assert second.json == {"sum": 3} and len(app.calls) == 1
+
+    np.save(app.data_path, np.arange(5))
+    os.utime(app.data_path, ns=(time.time_ns(), time.time_ns() + 10**9))
+    third = client.get("/sum?page=1&per_page=2")
+    assert third.headers["X-Cache"] == "MISS"
+    assert third.json == {"sum": 10}
+
+
+def test_errors_are_not_cached(app):
+    client = app.test_client()
+
+    assert client.get("/sum?page=0").status_code == 400
+    assert client.get("/sum?page=0").headers["X-Cache"] == "MISS"
+    assert len(app.calls) == 2
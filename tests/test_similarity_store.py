@@ -0,0 +1,65 @@
+import os
+
+import numpy as np
+
+from web_model.similarity_store import TopKSimilarityStore, build_topk_store, is_current, load_mmap
+
+
+def similarity_matrix(n=50, seed=0):
+    vectors = np.random.default_rng(seed).normal(size=(n, 8)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors @ vectors.T
+
+
+def build(tmp_path, matrix, k, block_size=7):
+    matrix_path = str(tmp_path / "sim.npy")
+    np.save(matrix_path, matrix)
+    prefix = str(tmp_path / "sim_topk")
+    neighbors_path, scores_path = build_topk_store(matrix_path, prefix, k=k, block_size=block_size)
+    return matrix_path, prefix, TopKSimilarityStore(load_mmap(neighbors_path), load_mmap(scores_path))
+
+
+def test_store_matches_brute_force_top_k(tmp_path):
+    matrix = similarity_matrix()
+    _, _, store = build(tmp_path, matrix, k=5)
+
+    # Brute force: every other row by descending similarity
+    masked = matrix.copy()
+    np.fill_diagonal(masked, -np.inf)
+    expected = np.argsort(-masked, axis=1, kind="stable")[:, :5]
+
+    assert store.neighbors.dtype == np.int32 and store.scores.dtype == np.float16
+    assert store.neighbors.tolist() == expected.tolist()
+    np.testing.assert_allclose(store.scores, np.take_along_axis(matrix, expected, axis=1), atol=1e-3)
+    assert not (store.neighbors == np.arange(len(matrix))[:, None]).any()
+
+
+def test_threshold_and_limit(tmp_path):
+    matrix = similarity_matrix()
+    _, _, store = build(tmp_path, matrix, k=10)
+
+    neighbors, scores = store.find_similar(3, threshold=0.2, limit=4)
+    assert len(neighbors) <= 4 and (scores > 0.2).all()
+    assert neighbors.tolist() == store.neighbors[3][:len(neighbors)].tolist()
+    assert [n.tolist() for n, _ in store.find_similar_many([1, 2])] == store.neighbors[[1, 2]].tolist()
+
+
+def test_k_is_capped_by_the_number_of_rows(tmp_path):
+    _, _, store = build(tmp_path, similarity_matrix(n=4), k=10)
+    assert store.neighbors.shape == (4, 3)
+
+
+def test_store_is_stale_when_the_matrix_or_k_changes(tmp_path):
+    matrix_path, prefix, _ = build(tmp_path, similarity_matrix(), k=5)
+    assert is_current(prefix, matrix_path, 5)
+    assert not is_current(prefix, matrix_path, 6)
+
+    np.save(matrix_path, similarity_matrix(seed=1))
+    stat = os.stat(matrix_path)
+    os.utime(matrix_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert not is_current(prefix, matrix_path, 5)
+
+    build_topk_store(matrix_path, prefix, k=5)
+    assert is_current(prefix, matrix_path, 5)
+    os.remove(prefix + "_meta.json")
+    assert not is_current(prefix, matrix_path, 5)
@@ -0,0 +1,52 @@
+import numpy as np
+
+from web_model.text_embeddings import EmbeddingSimilarityIndex, normalize, save_embeddings
+
+
+def embeddings(n=40, seed=0):
+    vectors = np.random.default_rng(seed).normal(size=(n, 6)).astype(np.float32)
+    vectors[7] = vectors[3]  # duplicate of row 3: exact ties for every query
+    return vectors
+
+
+def brute_force(vectors, row, threshold=None, limit=None):
+    unit = normalize(vectors)
+    scores = unit @ unit[row]
+    order = [i for i in np.argsort(-scores, kind="stable") if i != row]
+    if threshold is not None:
+        order = [i for i in order if scores[i] > threshold]
+    return order[:limit], scores
+
+
+def test_find_similar_many_matches_brute_force_cosine(tmp_path):
+    vectors = embeddings()
+    path = save_embeddings(vectors, str(tmp_path / "embeddings.npy"), dtype=np.float32)
+    index = EmbeddingSimilarityIndex.open(path)
+
+    for (neighbors, scores), row in zip(index.find_similar_many([0, 5, 12], limit=6), [0, 5, 12]):
+        expected, expected_scores = brute_force(vectors, row, limit=6)
+        assert neighbors.tolist() == expected
+        np.testing.assert_allclose(scores, expected_scores[expected], atol=1e-5)
+
+
+def test_threshold_and_self_exclusion_with_ties():
+    vectors = embeddings()
+    index = EmbeddingSimilarityIndex(normalize(vectors), block_size=8)
+
+    # Rows 3 and 7 are duplicates: each is the other's best match, never its own
+    neighbors, scores = index.find_similar(3, limit=3)
+    assert neighbors[0] == 7 and 3 not in neighbors.tolist()
+    np.testing.assert_allclose(scores[0], 1.0, atol=1e-5)
+    assert index.find_similar(7, limit=1)[0].tolist() == [3]
+
+    # Equal scores come back by row id, as in a stable brute-force sort
+    for row in range(len(vectors)):
+        if row not in (3, 7):
+            neighbors = index.find_similar(row)[0].tolist()
+            assert neighbors.index(3) + 1 == neighbors.index(7)
+            assert neighbors == brute_force(vectors, row)[0]
+
+    neighbors, scores = index.find_similar(12, threshold=0.3)
+    expected, _ = brute_force(vectors, 12, threshold=0.3)
+    assert neighbors.tolist() == expected and (scores > 0.3).all()
+    assert 12 not in neighbors.tolist()
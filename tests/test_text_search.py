@@ -0,0 +1,75 @@
+import numpy as np
+
+from web_model.text_search import InvertedIndex, tokenize
+
+TEXTS = [
+    "play some music",                 # 0
+    "add this song to my playlist",    # 1
+    "play the playlist",               # 2
+    "what is the weather today",       # 3
+    "add to playlist my favourite",    # 4
+    "Don't play music play music",     # 5
+]
+
+
+def search(query, **kwargs):
+    docs, _ = InvertedIndex.build(TEXTS).search(query, **kwargs)
+    return docs.tolist()
+
+
+def test_tokenize_lowercases_words():
+    assert tokenize("Don't PLAY, music!") == ["don", "t", "play", "music"]
+
+
+def test_terms_are_anded():
+    assert sorted(search("play music")) == [0, 5]
+    assert search("play weather") == []
+
+
+def test_or_and_precedence():
+    # AND binds tighter than OR: (weather) OR (play AND some)
+    assert sorted(search("weather OR play some")) == [0, 3]
+    assert sorted(search("weather OR song")) == [1, 3]
+
+
+def test_prefix():
+    assert sorted(search("playl*")) == [1, 2, 4]
+    assert sorted(search("pla*")) == [0, 1, 2, 4, 5]
+
+
+def test_prefix_scores_sum_the_matching_terms():
+    # "pla*" is "play OR playlist": the same docs with the same BM25 scores
+    index = InvertedIndex.build(TEXTS)
+    prefix_docs, prefix_scores = index.search("pla*")
+    or_docs, or_scores = index.search("play OR playlist")
+    np.testing.assert_array_equal(prefix_docs, or_docs)
+    np.testing.assert_allclose(prefix_scores, or_scores)
+
+
+def test_phrase_requires_consecutive_positions():
+    assert sorted(search('"add to playlist"')) == [4]
+    assert sorted(search("add to playlist")) == [1, 4]
+    assert search('"music play"') == [5]
+
+
+def test_apostrophe_word_is_a_phrase():
+    assert search("don't") == [5]
+
+
+def test_bm25_ranks_higher_term_frequency_first():
+    # Doc 5 has "play" twice; doc 2 and 0 once in shorter texts
+    assert search("play")[0] == 5
+
+
+def test_prefix_last_only_expands_the_final_bare_word():
+    assert search("pla") == []
+    assert sorted(search("pla", prefix_last=True)) == [0, 1, 2, 4, 5]
+    assert sorted(search("add playl", prefix_last=True)) == [1, 4]
+    assert search('"add to"', prefix_last=True) == [4]  # phrases are left alone
+    assert sorted(search("weather OR", prefix_last=True)) == [3]
+
+
+def test_empty_and_unknown_queries():
+    assert search("") == []
+    assert search("zebra") == []
+    assert search("OR") == []
@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+
+from web_model.text_store import build_text_store, is_current, load_text_data, open_text_store, rank_text_data
+
+
+def write_csv(tmp_path):
+    frame = pd.DataFrame({
+        "utterance": ["play jazz", "book a table", "café ☕ near me", None, "rate this"],
+        "human-assigned label": ["PlayMusic", "BookRestaurant", "BookRestaurant", "RateBook", "RateBook"],
+        "score": [0.5, 1.5, 2.5, 3.5, 4.5],
+        "count": [1, 2, 3, 4, 5],
+    }, index=[10, 11, 12, 13, 14])
+    path = str(tmp_path / "texts.csv")
+    frame.to_csv(path)
+    return path
+
+
+def test_every_column_round_trips(tmp_path):
+    csv_path, prefix = write_csv(tmp_path), str(tmp_path / "texts")
+    expected = rank_text_data(pd.read_csv(csv_path, index_col=0), [12, 10])
+
+    build_text_store(csv_path, prefix, [12, 10])
+    loaded = open_text_store(prefix)
+
+    pd.testing.assert_frame_equal(loaded, expected, check_dtype=False)
+    assert loaded.index.tolist() == [12, 10, 11, 13, 14]
+    assert loaded["count"].dtype == np.int64 and loaded["score"].dtype == np.float64
+    assert loaded.loc[12, "utterance"] == "café ☕ near me" and pd.isna(loaded.loc[13, "utterance"])
+    assert loaded["featured"].tolist()[:2] == [True, True] and loaded["featured"].isna().sum() == 3
+
+
+def test_store_is_rebuilt_when_the_csv_or_ranking_changes(tmp_path):
+    csv_path, prefix = write_csv(tmp_path), str(tmp_path / "texts")
+    load_text_data(csv_path, prefix, [12])
+    assert is_current(prefix, csv_path, [12])
+    assert not is_current(prefix, csv_path, [11])
+
+    with open(csv_path, "a") as f:
+        f.write("15,new text,PlayMusic,5.5,6\n")
+    assert not is_current(prefix, csv_path, [12])
+    assert load_text_data(csv_path, prefix, [12]).index.tolist()[-1] == 15
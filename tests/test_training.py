@@ -0,0 +1,133 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from config import Config
+from web_model import trainingRL
+from web_model.artifact_store import ArtifactStore
+
+
+def make_rows(n, seed):
+    # Three well separated blobs in four features
+    rng = np.random.default_rng(seed)
+    y = rng.integers(0, 3, n)
+    X = rng.normal(size=(n, 4)) + y[:, None] * 3.0
+    return pd.DataFrame({**{f"f{i}": X[:, i] for i in range(4)}, "Class": y})
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    # Artifacts and published arrays under tmp_path instead of web_model/
+    monkeypatch.setattr(trainingRL, "artifact_store", ArtifactStore(str(tmp_path / "artifacts")))
+    monkeypatch.setattr(trainingRL, "X_TEST_NPY", str(tmp_path / "X_test.npy"))
+    monkeypatch.setattr(trainingRL, "Y_PRED_NPY", str(tmp_path / "y_pred.npy"))
+    monkeypatch.setattr(Config, "TABULAR_TRAINING_MODE", "batch")
+    monkeypatch.setattr(Config, "TABULAR_SWEEP_CANDIDATES", None)
+    fits = []
+    fit = trainingRL._fit
+    monkeypatch.setattr(trainingRL, "_fit", lambda *args: fits.append(args) or fit(*args))
+    return fits
+
+
+def only_manifest():
+    (entry,) = trainingRL.artifact_store.entries(trainingRL.current_params())
+    return entry
+
+
+def test_appended_rows_are_scored_without_refitting(tmp_path, store):
+    csv_path = str(tmp_path / "data.csv")
+    make_rows(200, seed=0).to_csv(csv_path, index=False)
+    trainingRL.train_model(csv_path)
+    X_before, y_before = np.load(trainingRL.X_TEST_NPY), np.load(trainingRL.Y_PRED_NPY)
+
+    new_rows = make_rows(30, seed=1)
+    new_rows.to_csv(csv_path, mode="a", header=False, index=False)
+    trainingRL.train_model(csv_path)
+
+    assert len(store) == 1
+    key, manifest = only_manifest()
+    assert manifest["n_rows"] == 230 and manifest["n_scored"] == len(X_before) + 30
+    assert manifest["csv_bytes"] == os.path.getsize(csv_path)
+
+    # Cached rows are kept as they were, the new rows match scoring them from scratch
+    X_after, y_after = np.load(trainingRL.X_TEST_NPY), np.load(trainingRL.Y_PRED_NPY)
+    np.testing.assert_array_equal(X_after[:len(X_before)], X_before)
+    np.testing.assert_array_equal(y_after[:len(y_before)], y_before)
+    scaler = trainingRL.artifact_store.load_object(key, "scaler")
+    model = trainingRL.artifact_store.load_object(key, "model")
+    X_new = scaler.transform(new_rows.drop(columns=["Class"]).values)
+    np.testing.assert_allclose(X_after[len(X_before):], X_new)
+    np.testing.assert_array_equal(y_after[len(y_before):], model.predict(X_new))
+
+
+def test_rewritten_rows_are_refitted(tmp_path, store):
+    csv_path = str(tmp_path / "data.csv")
+    rows = make_rows(200, seed=0)
+    rows.to_csv(csv_path, index=False)
+    trainingRL.train_model(csv_path)
+
+    # Same length, different first row: the old bytes are no longer a prefix of the file
+    rows.loc[0, "f0"] += 1.0
+    rows.to_csv(csv_path, index=False)
+    trainingRL.train_model(csv_path)
+
+    assert len(store) == 2
+
+
+def test_unchanged_csv_reuses_the_artifacts(tmp_path, store):
+    csv_path = str(tmp_path / "data.csv")
+    make_rows(200, seed=0).to_csv(csv_path, index=False)
+    trainingRL.train_model(csv_path)
+    published = os.stat(trainingRL.X_TEST_NPY).st_mtime_ns
+
+    trainingRL.train_model(csv_path)
+    assert len(store) == 1
+    assert os.stat(trainingRL.X_TEST_NPY).st_mtime_ns == published
+
+    # A published file that went missing is copied again from the artifact store
+    os.remove(trainingRL.Y_PRED_NPY)
+    trainingRL.train_model(csv_path)
+    assert len(store) == 1
+    _, manifest = only_manifest()
+    assert manifest["published"]["y_pred"] == trainingRL._file_signature(trainingRL.Y_PRED_NPY)
+
+
+def test_current_params_follow_the_training_mode(monkeypatch):
+    monkeypatch.setattr(Config, "TABULAR_SWEEP_CANDIDATES", None)
+    monkeypatch.setattr(Config, "TABULAR_TRAINING_MODE", "batch")
+    assert trainingRL.current_params() == trainingRL.TABULAR_MODEL_PARAMS
+
+    monkeypatch.setattr(Config, "TABULAR_TRAINING_MODE", "streaming")
+    assert trainingRL.current_params()["chunk_rows"] == Config.TABULAR_STREAMING_CHUNK_ROWS
+
+    monkeypatch.setattr(Config, "TABULAR_TRAINING_MODE", "online")
+    with pytest.raises(ValueError):
+        trainingRL.current_params()
+
+
+def test_streaming_fit_matches_the_in_memory_fit(tmp_path):
+    csv_path = str(tmp_path / "data.csv")
+    rows = make_rows(600, seed=2)
+    rows.to_csv(csv_path, index=False)
+    params = dict(trainingRL.STREAMING_MODEL_PARAMS, epochs=5, chunk_rows=64)
+
+    objects, info = trainingRL._fit_streaming(csv_path, str(tmp_path), params)
+
+    X_out = np.load(tmp_path / "X_test.npy", mmap_mode="r")
+    y_out = np.load(tmp_path / "y_pred.npy", mmap_mode="r")
+    assert X_out.dtype == np.float32 and X_out.shape == (info["n_scored"], 4)
+    assert y_out.dtype == rows["Class"].dtype and y_out.shape == (info["n_scored"],)
+    assert info["n_rows"] == 600 and 0 < info["n_scored"] < 600
+
+    # Same split, all in memory: chunked scaler statistics and predictions agree
+    is_test = np.concatenate([test for _, _, test in trainingRL._stream_chunks(csv_path, list(rows.columns), params)])
+    X = rows.drop(columns=["Class"]).to_numpy(dtype=np.float32)
+    y = rows["Class"].to_numpy()
+    scaler = trainingRL.StandardScaler().fit(X[~is_test])
+    np.testing.assert_allclose(X_out, scaler.transform(X[is_test]), rtol=1e-4, atol=1e-4)
+
+    in_memory = trainingRL.LogisticRegression(max_iter=1000).fit(scaler.transform(X[~is_test]), y[~is_test])
+    in_memory_accuracy = in_memory.score(scaler.transform(X[is_test]), y[is_test])
+    assert np.mean(y_out == y[is_test]) >= in_memory_accuracy - 0.05
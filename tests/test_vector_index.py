@@ -0,0 +1,70 @@
+import numpy as np
+
+from web_model.vector_index import ExactIndex, IVFIndex, load_or_build_index
+
+
+def clustered(n=2000, dim=16, centers=20, seed=0):
+    rng = np.random.default_rng(seed)
+    means = rng.normal(scale=10.0, size=(centers, dim))
+    return (means[rng.integers(0, centers, size=n)] + rng.normal(size=(n, dim))).astype(np.float32)
+
+
+def brute_force(vectors, queries, k):
+    distances = ((queries[:, None, :] - vectors[None, :, :]) ** 2).sum(axis=2)
+    return np.argsort(distances, axis=1, kind="stable")[:, :k]
+
+
+def test_exact_matches_brute_force_across_blocks():
+    vectors = clustered(n=500)
+    queries = vectors[:20] + 0.01
+    index = ExactIndex(vectors, block_size=64)
+
+    ids, distances = index.search(queries, 5)
+
+    assert ids.tolist() == brute_force(vectors, queries, 5).tolist()
+    assert np.all(np.diff(distances, axis=1) >= 0)
+
+
+def test_ip_metric_ranks_by_inner_product():
+    vectors = clustered(n=300)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    ids, _ = ExactIndex(vectors, metric="ip").search(vectors[:10], 3)
+
+    expected = np.argsort(-(vectors[:10] @ vectors.T), axis=1, kind="stable")[:, :3]
+    assert ids.tolist() == expected.tolist()
+
+
+def test_ivf_recall_against_exact():
+    vectors = clustered()
+    exact = ExactIndex(vectors)
+    ivf = IVFIndex.build(vectors, n_lists=32)
+    ivf.n_probe = 8
+
+    recall = ivf.measure_recall(exact, k=10, n_queries=200)
+
+    assert recall >= 0.9
+    # Probing every list is an exhaustive search
+    ids, _ = ivf.search(vectors[:50], 10, n_probe=32)
+    exact_ids, _ = exact.search(vectors[:50], 10)
+    assert all(set(a) == set(e) for a, e in zip(ids.tolist(), exact_ids.tolist()))
+
+
+def test_k_larger_than_the_data():
+    vectors = clustered(n=6)
+    ids, distances = IVFIndex.build(vectors, n_lists=2).search(vectors[:1], 10, n_probe=2)
+
+    assert sorted(ids[0][ids[0] >= 0].tolist()) == list(range(6))
+    assert np.isinf(distances[0][ids[0] < 0]).all()
+
+
+def test_persisted_index_is_reused_per_version(tmp_path):
+    vectors = clustered(n=400)
+    data_file = str(tmp_path / "X_test.npy")
+
+    built = load_or_build_index("ivf", vectors, data_file, "v1")
+    loaded = load_or_build_index("ivf", vectors, data_file, "v1")
+    assert loaded.list_ids.tolist() == built.list_ids.tolist()
+    assert loaded.recall_at_10 == built.recall_at_10 is not None
+
+    rebuilt = load_or_build_index("ivf", vectors[::-1].copy(), data_file, "v2")
+    assert rebuilt.list_ids.tolist() != built.list_ids.tolist()
@@ -1,42 +1,111 @@
 from flask import Flask
-from web_model.query import query_bp
-from web_model.image_query import image_query_bp  # 加入圖像分類查詢
-from web_model.text_query import text_query_bp
-from web_model.index import index_bp 
-from .trainingRL import train_model  # 改為載入模型
-from .imageRL import predict_and_save  # 改為載入圖像模型
-import threading
-import time
-from config import Config
+from .data_registry import registry, data_path
+from .lifecycle import lifecycle, startup_stage
+from .inference_status import inference_status
+from . import metrics
+from .event_log import experiment_log_path
+import logging
+import os
+import sys
+from config import Config, LoggerConfig
+
+_logging_configured = False
+
+def configure_logging():
+  # 實驗紀錄檔 (logs/<group>/<timestamp>.log); 第一筆紀錄寫入時才開檔
+  global _logging_configured
+  if _logging_configured:
+    return
+  os.makedirs(LoggerConfig.basepath, exist_ok=True)
+  handler = logging.FileHandler(experiment_log_path(), mode=LoggerConfig.filemode,
+                                encoding=LoggerConfig.encoding, delay=True)
+  logging.basicConfig(handlers=[handler], format=LoggerConfig.format, style=LoggerConfig.style,
+                      datefmt=LoggerConfig.datefmt, level=LoggerConfig.level)
+  _logging_configured = True
+
+def after_fork():
+  # 在 fork 出的 worker 中: 父行程的載入執行緒沒有跟著 fork, 它們持有的鎖會永遠鎖住, 所以全部換新,
+  # 再由 lifecycle 重跑尚未完成的載入工作
+  from .image_cache import after_fork as image_cache_after_fork
+  from .image_query.views import after_fork as image_query_after_fork
+  from .text_query.views import after_fork as text_query_after_fork
+  registry.after_fork()
+  inference_status.after_fork()
+  image_cache_after_fork()
+  image_query_after_fork()
+  text_query_after_fork()
+  if "web_model.model_export" in sys.modules:  # torch 只在用到時才匯入
+    sys.modules["web_model.model_export"].after_fork()
+  lifecycle.after_fork()
 
 def create_app(config_class=Config,debug=False):
 
+  with startup_stage("configure_logging"):
+    configure_logging()
+
   app = Flask(__name__)
   app.config.from_prefixed_env("FLASK_")
   app.config.from_object(config_class)
   app.debug = debug
 
+  # 匯入 views (註冊資料集); 重量級套件 (torch, sklearn, pandas, PIL) 只在需要它們的載入工作或請求中才匯入
+  with startup_stage("import:blueprints"):
+    from web_model.query import query_bp
+    from web_model.image_query import image_query_bp  # 加入圖像分類查詢
+    from web_model.text_query import text_query_bp
+    from web_model.text_query.views import load_similarity_store
+    from web_model.index import index_bp
+    from web_model.batch import batch_bp
+
   def load_tabular_data():
     # 模擬載入表格數據
+    with startup_stage("import:trainingRL"):
+      from .trainingRL import train_model
     train_model()        # 載入數據分類模型
+    registry.preload(["X_test", "y_pred", "y_pred_class_index"])
+
+  def convert_image_store():
+    # 將 X_test_image.npz 轉成可 memory-map 的影像檔 (只在缺少或過期時)
+    from .image_store import convert_npz, is_current
+    npz_path = data_path("X_test_image.npz")
+    store_prefix = data_path(config_class.IMAGE_STORE_PREFIX)
+    if config_class.IMAGE_STORE_AUTO_CONVERT and os.path.exists(npz_path) and not is_current(store_prefix, npz_path):
+      convert_npz(npz_path, store_prefix)
 
   def load_image_data():
     # 模擬載入影像數據
+    with startup_stage("import:imageRL"):
+      from .imageRL import predict_and_save
     predict_and_save()  # 載入圖像分類模型
+    registry.preload(["y_pred_image", "y_pred_image_class_index"])
 
   def load_text_data():
-    # 模擬載入文本數據
-    time.delay(5)
+    # 預先載入文字資料集 (ranked text frame, indexes, similarity store)
+    with startup_stage("import:text_store"):
+      from . import text_store  # pandas; timed here instead of inside the first text_data load
+    registry.preload(["text_data", "text_class_index", "text_search_index"])
+    try:
+      load_similarity_store()  # 必要時重建 top-k store
+    except FileNotFoundError:
+      pass
+
+  # 依相依順序載入數據: STARTUP_WARMUP 'background' 於啟動時在背景執行, 'on_demand' 等第一個需要它的請求;
+  # 載入中的資料集由 requires_ready 擋下 (503 + Retry-After)
+  if not lifecycle.started:
+    lifecycle.add("tabular", load_tabular_data)
+    lifecycle.add("image_store", convert_image_store)
+    lifecycle.add("image", load_image_data, depends_on=["image_store"], progress=inference_status.snapshot)
+    lifecycle.add("text", load_text_data)
+    lifecycle.start(run_all=config_class.STARTUP_WARMUP == "background")
 
-  # 伺服器啟動時自動載入數據
-  threading.Thread(target=load_tabular_data, daemon=True).start()
-  threading.Thread(target=load_image_data, daemon=True).start()
-  #threading.Thread(target=load_text_data, daemon=True).start()
+  # 每個請求的耗時 (/metrics, Server-Timing) 與 ?profile=1
+  metrics.init_app(app)
 
   # 註冊 Blueprint
   app.register_blueprint(index_bp, url_prefix='/')
   app.register_blueprint(query_bp, url_prefix='/query')
   app.register_blueprint(image_query_bp, url_prefix='/image_query')
   app.register_blueprint(text_query_bp, url_prefix='/text_query')
+  app.register_blueprint(batch_bp, url_prefix='/batch')
 
-  return app
\ No newline at end of file
+  return app
@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+import shutil
+
+import joblib
+import numpy as np
+
+
+def file_hash(path, offsets=(), chunk_size=1 << 20):
+    """Content hash of a file, plus the hash of each prefix ending at one of ``offsets``,
+    all computed in a single pass."""
+    digest = hashlib.blake2b(digest_size=16)
+    prefix_hashes = {}
+    position = 0
+    with open(path, "rb") as f:
+        for offset in sorted(set(offsets)) + [None]:
+            # Hash up to the next checkpoint, snapshot the digest there, then carry on
+            while offset is None or position < offset:
+                chunk = f.read(chunk_size if offset is None else min(chunk_size, offset - position))
+                if not chunk:
+                    break
+                digest.update(chunk)
+                position += len(chunk)
+            if offset is not None and position == offset:
+                prefix_hashes[offset] = digest.hexdigest()
+    return digest.hexdigest(), prefix_hashes
+
+
+def params_hash(params):
+    return hashlib.blake2b(json.dumps(params, sort_keys=True).encode(), digest_size=8).hexdigest()
+
+
+class ArtifactStore:
+    """Directory of fitted artifacts, one sub-directory per (hyperparameters, training data) key.
+
+    Each entry holds joblib-pickled objects, .npy arrays and a manifest.json
+    describing what the artifacts were computed from.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    @staticmethod
+    def make_key(params, data_hash):
+        return f"{params_hash(params)}-{data_hash[:16]}"
+
+    def entry_dir(self, key):
+        return os.path.join(self.root, key)
+
+    def entries(self, params=None):
+        # (key, manifest) of every complete entry, optionally only those fitted with ``params``
+        if not os.path.isdir(self.root):
+            return
+        for key in sorted(os.listdir(self.root)):
+            manifest_path = os.path.join(self.root, key, "manifest.json")
+            if not os.path.exists(manifest_path):
+                continue
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            if params is None or manifest.get("params") == params:
+                yield key, manifest
+
+    def begin(self, key):
+        # Fresh temp directory for a new entry; large arrays can be written into it directly
+        tmp_dir = self.entry_dir(key) + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        return tmp_dir
+
+    def commit(self, key, objects, manifest):
+        # Add the pickled objects and manifest to the temp directory and swap it in,
+        # so a crash never leaves a half-written entry
+        final_dir = self.entry_dir(key)
+        tmp_dir = final_dir + ".tmp"
+        for name, obj in objects.items():
+            joblib.dump(obj, os.path.join(tmp_dir, f"{name}.pkl"))
+        with open(os.path.join(tmp_dir, "manifest.json"), "w") as f:
+            json.dump(manifest, f, indent=2)
+        shutil.rmtree(final_dir, ignore_errors=True)
+        os.replace(tmp_dir, final_dir)
+
+    def save(self, key, objects, arrays, manifest):
+        tmp_dir = self.begin(key)
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), array)
+        self.commit(key, objects, manifest)
+
+    def prune(self, params, keep):
+        # Drop all but the ``keep`` most recently written entries fitted with ``params``
+        entries = sorted(self.entries(params),
+                         key=lambda entry: os.stat(os.path.join(self.entry_dir(entry[0]), "manifest.json")).st_mtime_ns,
+                         reverse=True)
+        for key, _ in entries[keep:]:
+            shutil.rmtree(self.entry_dir(key), ignore_errors=True)
+
+    def update_manifest(self, key, manifest):
+        path = os.path.join(self.entry_dir(key), "manifest.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(path + ".tmp", path)
+
+    def load_object(self, key, name):
+        return joblib.load(os.path.join(self.entry_dir(key), f"{name}.pkl"))
+
+    def array_path(self, key, name):
+        return os.path.join(self.entry_dir(key), f"{name}.npy")
@@ -0,0 +1,6 @@
+from flask import Blueprint
+
+batch_bp = Blueprint("batch_bp",
+                    __name__)
+
+from . import views
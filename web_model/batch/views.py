@@ -0,0 +1,161 @@
+import base64
+from collections import defaultdict
+
+from flask import request, jsonify
+from . import batch_bp
+from config import Config
+from ..image_cache import FORMATS, image_cache, make_etag
+from ..lifecycle import lifecycle, not_ready_response
+from ..offload import PoolBusy, busy_response, offload
+from ..pagination import parse_per_page
+from ..image_query.views import _image_encoder, image_cache_key, load_images, similar_images
+from ..query.views import query_page
+from ..serialization import LAYOUTS, json_response
+from ..text_query.views import similar_texts
+from ..vector_index import BACKENDS
+
+
+def _parse_each(queries, parse):
+    # parse(query) for every sub-query; bad or missing parameters become that sub-query's 400
+    parsed, errors = {}, {}
+    for i, query in enumerate(queries):
+        try:
+            parsed[i] = parse(query)
+        except KeyError as e:
+            errors[i] = {"error": f"Missing parameter {e}."}, 400
+        except (LookupError, TypeError, ValueError) as e:
+            errors[i] = {"error": f"Invalid parameters: {e}"}, 400
+    return parsed, errors
+
+
+def _merge(n, errors, answered):
+    results = [None] * n
+    for i, result in list(errors.items()) + list(answered.items()):
+        results[i] = result
+    return results
+
+
+def run_tabular_query(queries, layout):
+    parsed, errors = _parse_each(queries, lambda query: parse_per_page(query.get("per_page", 10)))
+    answered = {i: query_page(queries[i].get("class_value"), per_page, layout, queries[i])
+                for i, per_page in parsed.items()}
+    return _merge(len(queries), errors, answered)
+
+
+def run_image_similar(queries, layout):
+    parsed, errors = _parse_each(queries, lambda query: (int(query["index"]),
+                                                        int(query.get("k", Config.SIMILAR_IMAGES_K)),
+                                                        query.get("backend", Config.VECTOR_INDEX_BACKEND)))
+    # One search per backend answers all of its sub-queries
+    by_backend = defaultdict(list)
+    for i, (image_index, k, backend) in parsed.items():
+        if backend not in BACKENDS:
+            errors[i] = {"error": f"Unknown backend '{backend}'. Choose from {sorted(BACKENDS)}."}, 400
+        else:
+            by_backend[backend].append(i)
+
+    answered = {}
+    for backend, positions in by_backend.items():
+        results = similar_images([parsed[i][:2] for i in positions], backend)
+        answered.update(zip(positions, results))
+    return _merge(len(queries), errors, answered)
+
+
+def run_text_similar(queries, layout):
+    parsed, errors = _parse_each(queries, lambda query: (int(query["index"]),
+                                                        parse_per_page(query.get("per_page", Config.DEFAULT_PER_PAGE)),
+                                                        query))
+    positions = sorted(parsed)
+    answered = dict(zip(positions, similar_texts([parsed[i] for i in positions], layout))) if positions else {}
+    return _merge(len(queries), errors, answered)
+
+
+def run_image(queries, layout):
+    def parse(query):
+        size = None if query.get("size") is None else int(query["size"])
+        quality = int(query.get("quality", Config.IMAGE_QUALITY))
+        fmt = str(query.get("format", "jpeg")).lower()
+        if fmt not in FORMATS:
+            raise ValueError(f"unsupported format '{fmt}', choose from {sorted(FORMATS)}")
+        if not 1 <= quality <= 100 or (size is not None and size < 1):
+            raise ValueError("invalid size or quality")
+        return int(query["index"]), size, quality, fmt
+
+    parsed, errors = _parse_each(queries, parse)
+    if not parsed:
+        # Nothing valid to answer: don't load (or fail on) the image store
+        return _merge(len(queries), errors, {})
+    X_test_loaded, version = load_images()
+
+    # Encoded bytes come from the shared image cache, inlined as base64
+    answered = {}
+    for i, (index, size, quality, fmt) in parsed.items():
+        if index < 0 or index >= len(X_test_loaded):
+            answered[i] = {"error": "Image index out of range."}, 404
+            continue
+        key = image_cache_key(version, index, size, quality, fmt)
+        encoder = _image_encoder(X_test_loaded, index, size, quality, fmt)
+        data = image_cache.get_or_encode(key, lambda: offload(encoder))
+        answered[i] = {"Index": index, "mimetype": FORMATS[fmt][1], "etag": make_etag(key),
+                       "data": base64.b64encode(data).decode("ascii")}, 200
+    return _merge(len(queries), errors, answered)
+
+
+# Sub-query type -> runner over all sub-queries of that type (so similar-item lookups are vectorized)
+RUNNERS = {
+    "tabular_query": run_tabular_query,
+    "image_similar": run_image_similar,
+    "image": run_image,
+    "text_similar": run_text_similar,
+}
+
+# Startup tasks each sub-query type reads from
+REQUIRES = {
+    "tabular_query": ["tabular"],
+    "image_similar": ["tabular"],
+    "image": ["image_store"],
+    "text_similar": ["text"],
+}
+
+
+# Batch API: {"queries": [{"type": ..., <parameters of that endpoint>}, ...], "layout": "records"|"columns"}
+@batch_bp.route('/query', methods=['POST'])
+def batch_query():
+    payload = request.get_json(silent=True) or {}
+    queries = payload.get("queries")
+    if not isinstance(queries, list) or not queries:
+        return jsonify({"error": "Send a non-empty 'queries' list."}), 400
+    if len(queries) > Config.BATCH_MAX_QUERIES:
+        return jsonify({"error": f"At most {Config.BATCH_MAX_QUERIES} queries per batch."}), 400
+    layout = payload.get("layout", "records")
+    if layout not in LAYOUTS:
+        return jsonify({"error": f"layout must be one of {list(LAYOUTS)}."}), 400
+
+    results = [None] * len(queries)
+    groups = defaultdict(list)
+    for i, query in enumerate(queries):
+        if not isinstance(query, dict) or query.get("type") not in RUNNERS:
+            results[i] = {"error": f"Each query needs a 'type' from {sorted(RUNNERS)}."}, 400
+        else:
+            groups[query["type"]].append(i)
+
+    for query_type, positions in groups.items():
+        if lifecycle.started:
+            lifecycle.request(REQUIRES[query_type])
+        if lifecycle.started and not lifecycle.wait(REQUIRES[query_type], Config.STARTUP_REQUEST_WAIT):
+            body, status, _ = not_ready_response(REQUIRES[query_type])
+            for i in positions:
+                results[i] = body, status
+            continue
+        try:
+            answered = RUNNERS[query_type]([queries[i] for i in positions], layout)
+        except PoolBusy as e:
+            answered = [busy_response(e)[:2]] * len(positions)
+        except FileNotFoundError as e:
+            answered = [({"error": f"File not found: {str(e)}"}, 500)] * len(positions)
+        except Exception as e:
+            answered = [({"error": f"Unexpected error: {str(e)}"}, 500)] * len(positions)
+        for i, result in zip(positions, answered):
+            results[i] = result
+
+    return json_response({"results": [{"status": status, "body": body} for body, status in results]})
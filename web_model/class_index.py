@@ -0,0 +1,49 @@
+import numpy as np
+
+
+class ClassIndex:
+    """Class -> sorted row positions, stored CSR-style.
+
+    ``indices[offsets[k]:offsets[k + 1]]`` are the rows predicted as class ``k``
+    in ascending order, so a page of a class is a slice and its size is a
+    subtraction. Built once per dataset version through the dataset registry.
+    """
+
+    def __init__(self, offsets, indices):
+        self.offsets = offsets
+        self.indices = indices
+        self.offsets.flags.writeable = False
+        self.indices.flags.writeable = False
+
+    @classmethod
+    def from_labels(cls, labels, n_classes=None):
+        labels = np.asarray(labels).ravel().astype(np.int64, copy=False)
+        if n_classes is None:
+            n_classes = int(labels.max()) + 1 if len(labels) else 0
+
+        # Rows with a label outside 0..n_classes-1 (e.g. -1 for unknown) are left out
+        valid = (labels >= 0) & (labels < n_classes)
+        rows = np.flatnonzero(valid)
+        order = np.argsort(labels[rows], kind="stable")  # stable keeps rows ascending within a class
+
+        offsets = np.zeros(n_classes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(labels[rows], minlength=n_classes), out=offsets[1:])
+        return cls(offsets, rows[order].astype(np.int64, copy=False))
+
+    @property
+    def n_classes(self):
+        return len(self.offsets) - 1
+
+    def count(self, category):
+        if not 0 <= category < self.n_classes:
+            return 0
+        return int(self.offsets[category + 1] - self.offsets[category])
+
+    def rows(self, category):
+        if not 0 <= category < self.n_classes:
+            return self.indices[:0]
+        return self.indices[self.offsets[category]:self.offsets[category + 1]]
+
+    def page(self, category, start_idx, end_idx):
+        # Same semantics as slicing the full match list, without building it
+        return self.rows(category)[start_idx:end_idx]
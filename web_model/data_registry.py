@@ -0,0 +1,228 @@
+import hashlib
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+from config import Config
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def data_path(filename):
+    # Every artifact lives in DATA_DIR, by default beside the package (web_model/<filename>)
+    return os.path.join(Config.DATA_DIR or BASE_DIR, filename)
+
+
+def _is_pandas(value):
+    # Without importing pandas: if it was never imported, value is not one of its objects
+    pd = sys.modules.get("pandas")
+    return pd is not None and isinstance(value, (pd.DataFrame, pd.Series))
+
+
+def _read_only(array):
+    # Views share their base's buffer, so the base is the one to lock
+    while isinstance(array.base, np.ndarray):
+        array = array.base
+    array.flags.writeable = False
+
+
+def _freeze(value):
+    # Arrays are shared by every request, so nobody is allowed to write into them.
+    # For DataFrames/Series that means their NumPy-backed columns: setting a value raises
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+    elif _is_pandas(value):
+        columns = value.items() if hasattr(value, "columns") else [(value.name, value)]
+        for _, column in columns:
+            array = column.to_numpy(copy=False)
+            if isinstance(array, np.ndarray):
+                _read_only(array)
+    return value
+
+
+def _share(value):
+    # Each caller gets its own shallow copy of a frame: the data is shared (and read-only),
+    # but adding, dropping or replacing columns only changes the caller's copy
+    return value.copy(deep=False) if _is_pandas(value) else value
+
+
+def load_npy(path):
+    return np.load(path)
+
+
+def load_npz_member(key):
+    # .npz archives hold several arrays; return a loader for a single member
+    def loader(path):
+        with np.load(path, allow_pickle=True) as data:
+            return data[key]
+    return loader
+
+
+def file_digest(path, chunk_size=1 << 20):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class _Entry:
+    def __init__(self, name, loader, path=None, sources=(), pass_version=False, preload=True):
+        self.name = name
+        self.preload = preload
+        self.loader = loader
+        self.path = path
+        self.sources = tuple(sources)
+        self.pass_version = pass_version
+        self.value = None
+        self.version = None
+        self.signature = None
+        self.checked_at = 0.0
+        self.requests = self.loads = 0
+        self.load_seconds = 0.0
+        self.lock = threading.RLock()
+
+
+class DatasetRegistry:
+    """Process-wide store of the datasets served by the blueprints.
+
+    Each artifact is loaded once (at startup or on first use) and handed out
+    read-only to every request; DataFrames as a shallow copy per caller over
+    read-only columns. File entries are reloaded when the file's mtime/size
+    changes (or its content hash, if ``verify_hash`` is set); derived entries
+    are rebuilt when any of their sources changes version.
+    """
+
+    def __init__(self, verify_hash=False, recheck_interval=0.0):
+        self.verify_hash = verify_hash
+        self.recheck_interval = recheck_interval
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, path, loader=load_npy, preload=True):
+        # Register a file-backed artifact; loader(path) returns the value.
+        # preload=False keeps it out of preload() (fallbacks that are only loaded on demand)
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None or entry.path != path or entry.loader is not loader:
+                self._entries[name] = _Entry(name, loader, path=path, preload=preload)
+
+    def derive(self, name, sources, builder, pass_version=False):
+        # Register an artifact computed from other entries: builder(*values),
+        # or builder(*values, version=...) to let it persist itself per version
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None or entry.sources != tuple(sources) or entry.loader is not builder:
+                self._entries[name] = _Entry(name, builder, sources=sources, pass_version=pass_version)
+
+    def after_fork(self):
+        # In a forked child, locks held by the parent's loader threads would stay locked forever.
+        # A value such a thread had not finished loading was never stored and is loaded on first use
+        self._lock = threading.Lock()
+        for entry in self._entries.values():
+            entry.lock = threading.RLock()
+
+    def __contains__(self, name):
+        return name in self._entries
+
+    def get(self, name):
+        entry = self._entry(name)
+        with entry.lock:
+            entry.requests += 1
+            self._refresh(entry)
+            return _share(entry.value)
+
+    def version(self, name):
+        entry = self._entry(name)
+        with entry.lock:
+            self._refresh(entry)
+            return entry.version
+
+    def get_with_version(self, name):
+        entry = self._entry(name)
+        with entry.lock:
+            entry.requests += 1
+            self._refresh(entry)
+            return _share(entry.value), entry.version
+
+    def invalidate(self, name=None):
+        # Drop cached values so that the next get() reloads them
+        entries = self._entries.values() if name is None else [self._entry(name)]
+        for entry in entries:
+            with entry.lock:
+                entry.value = entry.version = entry.signature = None
+                entry.checked_at = 0.0
+
+    def stats(self):
+        # Per entry: lookups, loads/builds (a lookup that had to call the loader) and time spent loading
+        return {name: {"requests": entry.requests, "loads": entry.loads, "load_seconds": round(entry.load_seconds, 6)}
+                for name, entry in self._entries.items()}
+
+    def preload(self, names=None):
+        # Warm the registry; missing files are skipped and loaded on first use instead
+        loaded = []
+        if names is None:
+            names = [name for name, entry in self._entries.items() if entry.preload]
+        for name in names:
+            try:
+                self.get(name)
+                loaded.append(name)
+            except FileNotFoundError:
+                pass
+        return loaded
+
+    def _entry(self, name):
+        try:
+            return self._entries[name]
+        except KeyError:
+            raise KeyError(f"Dataset '{name}' is not registered.") from None
+
+    def _refresh(self, entry):
+        if entry.path is not None:
+            self._refresh_file(entry)
+        else:
+            self._refresh_derived(entry)
+
+    def _refresh_file(self, entry):
+        now = time.monotonic()
+        if entry.value is not None and now - entry.checked_at < self.recheck_interval:
+            return
+
+        stat = os.stat(entry.path)  # raises FileNotFoundError like np.load would
+        signature = (stat.st_mtime_ns, stat.st_size)
+        entry.checked_at = now
+        if entry.value is not None and signature == entry.signature:
+            return
+
+        version = file_digest(entry.path) if self.verify_hash else f"{signature[0]:x}-{signature[1]:x}"
+        if entry.value is None or version != entry.version:
+            entry.value = self._load(entry, entry.path)
+            entry.version = version
+        entry.signature = signature
+
+    def _refresh_derived(self, entry):
+        values, versions = [], []
+        for source in entry.sources:
+            value, version = self.get_with_version(source)
+            values.append(value)
+            versions.append(version)
+
+        version = "+".join(versions)
+        if entry.value is None or version != entry.version:
+            kwargs = {"version": version} if entry.pass_version else {}
+            entry.value = self._load(entry, *values, **kwargs)
+            entry.version = version
+
+    def _load(self, entry, *args, **kwargs):
+        started = time.perf_counter()
+        value = _freeze(entry.loader(*args, **kwargs))
+        entry.loads += 1
+        entry.load_seconds += time.perf_counter() - started
+        return value
+
+
+registry = DatasetRegistry(verify_hash=Config.DATASET_VERIFY_HASH,
+                           recheck_interval=Config.DATASET_RECHECK_SECONDS)
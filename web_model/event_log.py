@@ -0,0 +1,285 @@
+import atexit
+import csv
+import datetime
+import gzip
+import io
+import json
+import logging
+import os
+import queue
+import shutil
+import sqlite3
+import threading
+import time
+
+from config import Config, LoggerConfig
+from .data_registry import data_path
+from .serialization import dumps
+
+_STOP = object()
+
+_log_path = None
+_log_path_lock = threading.Lock()
+
+
+def experiment_log_path():
+    """logs/<group>/<start timestamp>.log: the experiment log, shared by logging and the click events."""
+    global _log_path
+    with _log_path_lock:
+        if _log_path is None:
+            filename = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S") + ".log"
+            _log_path = os.path.join(LoggerConfig.basepath, filename)
+        return _log_path
+
+
+def feedback_csv_path():
+    # web_model/feedback.csv (or DATA_DIR/feedback.csv), where the feedback view has always appended its rows
+    return data_path("feedback.csv")
+
+
+def click_line(event):
+    # One JSON object per line, as in the experiment log
+    return json.dumps(event) + "\n"
+
+
+def feedback_row(event):
+    # [timestamp, feedback] CSV row, as in feedback.csv
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow([event.get("timestamp"), event.get("feedback")])
+    return buffer.getvalue()
+
+
+class LineSink:
+    """Appends one formatted line per event to a fixed file, one write + flush (+ fsync) per batch.
+
+    Keeps the files and formats used before events were batched: clicks as JSON lines in the
+    experiment log, feedback as CSV rows in feedback.csv. Appends from several processes do not
+    interleave within a batch (O_APPEND).
+    """
+
+    def __init__(self, path, format_line, fsync=True):
+        self.path = path
+        self.format_line = format_line
+        self.fsync = fsync
+        self._file = None
+
+    def write(self, events):
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._file = open(self.path, "ab")
+        self._file.write("".join(self.format_line(event) for event in events).encode("utf-8"))
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def _compress(path):
+    # Gzip a rotated file next to it; the .gz only appears once complete
+    try:
+        with open(path, "rb") as src, gzip.open(path + ".gz.tmp", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(path + ".gz.tmp", path + ".gz")
+        os.remove(path)
+    except OSError:
+        logging.exception("Failed to compress %s", path)
+
+
+class NDJSONSink:
+    """Append-only NDJSON files, one per (stream, process), rotated at ``rotate_bytes``.
+
+    Every process writes its own file, so concurrent workers never interleave lines.
+    Rotated files are gzip-compressed when ``compress`` is set, on a separate thread so the
+    writer keeps draining the queue meanwhile.
+    """
+
+    def __init__(self, directory, stream, rotate_bytes, compress=True, fsync=True):
+        self.directory = directory
+        self.stream = stream
+        self.rotate_bytes = rotate_bytes
+        self.compress = compress
+        self.fsync = fsync
+        self._file = None
+
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S-%f")
+        self.path = os.path.join(self.directory, f"{self.stream}-{stamp}-{os.getpid()}.ndjson")
+        self._file = open(self.path, "ab")
+
+    def write(self, events):
+        if self._file is None:
+            self._open()
+        # One write + flush (+ fsync) per batch: the group commit
+        self._file.write(b"".join(dumps(event) for event in events))
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        if self._file.tell() >= self.rotate_bytes:
+            self._rotate()
+
+    def _rotate(self):
+        self.close()
+        if self.compress:
+            # Not a daemon: an exiting process finishes the compression first
+            threading.Thread(target=_compress, args=(self.path,), name=f"compress-{self.stream}").start()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class SQLiteSink:
+    """All streams in one SQLite database in WAL mode; safe for several writer processes."""
+
+    def __init__(self, path, stream):
+        self.path = path
+        self.stream = stream
+        self._conn = None
+
+    def write(self, events):
+        if self._conn is None:
+            # Opened in the writer thread, which is the only thread using it
+            self._conn = sqlite3.connect(self.path, timeout=30.0)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS events (id INTEGER PRIMARY KEY, stream TEXT NOT NULL, "
+                               "received_at REAL NOT NULL, payload TEXT NOT NULL)")
+        now = time.time()
+        with self._conn:
+            self._conn.executemany("INSERT INTO events (stream, received_at, payload) VALUES (?, ?, ?)",
+                                   [(self.stream, now, json.dumps(event)) for event in events])
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class EventWriter:
+    """Bounded in-process queue drained by a background thread that writes in groups.
+
+    ``submit`` never touches the disk. A batch is written when ``batch_size`` events are
+    waiting or ``flush_interval`` seconds after its first event. When the queue is full,
+    ``submit`` waits at most ``put_timeout`` and then returns False so the caller can push back.
+    """
+
+    def __init__(self, sink, max_queue=10000, batch_size=256, flush_interval=1.0, put_timeout=0.05,
+                 name="event-writer"):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.written = self.rejected = self.failed = self.batches = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, event):
+        if self._closed:
+            raise RuntimeError("EventWriter is closed.")
+        try:
+            self._queue.put(event, timeout=self.put_timeout)
+            return True
+        except queue.Full:
+            self.rejected += 1
+            return False
+
+    def close(self):
+        # Write everything still queued, then stop
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def stats(self):
+        return {"queued": self._queue.qsize(), "written": self.written, "rejected": self.rejected,
+                "failed": self.failed, "batches": self.batches}
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is _STOP:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                pending = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if pending is _STOP:
+                self._queue.put(_STOP)  # stop after writing this batch
+                break
+            batch.append(pending)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                self.sink.close()  # in the writer thread, which owns the sink
+                return
+            try:
+                self.sink.write(batch)
+                self.written += len(batch)
+            except Exception:
+                self.failed += len(batch)
+                logging.exception("Failed to write %d events", len(batch))
+            self.batches += 1
+
+
+def create_sink(stream, backend=None):
+    backend = backend or Config.EVENT_LOG_BACKEND
+    directory = Config.EVENT_LOG_DIR or LoggerConfig.basepath
+    if backend == "legacy":
+        if stream == "feedback":
+            return LineSink(feedback_csv_path(), feedback_row, fsync=Config.EVENT_LOG_FSYNC)
+        return LineSink(experiment_log_path(), click_line, fsync=Config.EVENT_LOG_FSYNC)
+    if backend == "ndjson":
+        return NDJSONSink(directory, stream, Config.EVENT_LOG_ROTATE_BYTES, compress=Config.EVENT_LOG_COMPRESS,
+                          fsync=Config.EVENT_LOG_FSYNC)
+    if backend == "sqlite":
+        os.makedirs(directory, exist_ok=True)
+        return SQLiteSink(os.path.join(directory, Config.EVENT_LOG_SQLITE_FILENAME), stream)
+    raise ValueError(f"Unknown EVENT_LOG_BACKEND '{backend}'. Choose from 'legacy', 'ndjson' or 'sqlite'.")
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_event_writer(stream):
+    """Shared writer of one event stream ("clicks", "feedback"), created on first use in each process."""
+    with _writers_lock:
+        writer = _writers.get(stream)
+        if writer is None or writer.pid != os.getpid():
+            writer = EventWriter(create_sink(stream), max_queue=Config.EVENT_QUEUE_SIZE,
+                                 batch_size=Config.EVENT_BATCH_SIZE, flush_interval=Config.EVENT_FLUSH_SECONDS,
+                                 put_timeout=Config.EVENT_PUT_TIMEOUT, name=f"event-writer-{stream}")
+            writer.pid = os.getpid()
+            _writers[stream] = writer
+        return writer
+
+
+def writer_stats():
+    # stream -> EventWriter.stats() for this process's writers
+    with _writers_lock:
+        return {stream: writer.stats() for stream, writer in _writers.items() if writer.pid == os.getpid()}
+
+
+@atexit.register
+def close_event_writers():
+    with _writers_lock:
+        for writer in _writers.values():
+            if writer.pid == os.getpid():
+                writer.close()
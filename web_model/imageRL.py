@@ -1,13 +1,22 @@
 import os
+import json
+import logging
 import numpy as np
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
+from torch.utils.data import DataLoader, Subset
+from .data_registry import data_path
+from .image_store import open_images
+from .inference_status import inference_status
+from config import Config
 
-# 取得當前檔案的絕對路徑
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-MODEL_PATH = os.path.join(BASE_DIR, "cnn5layer_multi_label.pth")
-TEST_NPZ = os.path.join(BASE_DIR, "X_test_image.npz")
-image_prediction_done = False
+# 資料檔路徑 (Config.DATA_DIR, 預設為本套件目錄)
+MODEL_PATH = data_path("cnn5layer_multi_label.pth")
+TEST_NPZ = data_path("X_test_image.npz")
+PRED_NPY = data_path("y_pred_image.npy")
+
+logger = logging.getLogger(__name__)
 
 # Custom CNN Model
 class CNN5Layer(nn.Module):
@@ -32,7 +41,7 @@ class CNN5Layer(nn.Module):
         x = self.pool(self.relu(self.conv4(x)))
         x = self.pool(self.relu(self.conv5(x)))
 
-        x = x.view(x.size(0), -1)
+        x = torch.flatten(x, 1)  # reshape-safe for channels-last (quantized) activations
         x = self.dropout(x)
         x = self.fc(x)  # No activation (raw logits for multi-label classification)
         return x
@@ -40,61 +49,150 @@ class CNN5Layer(nn.Module):
 # Custom Dataset Class
 class NPZImageDataset(torch.utils.data.Dataset):
     def __init__(self, npz_path, transform=None):
-        data = np.load(npz_path, allow_pickle=True)  # 確保預先加載
-        self.images = data['x']
+        # Memory-mapped image store beside the archive when available (see image_store.py),
+        # otherwise the decompressed 'x' member
+        self.npz_path = npz_path
+        self.images = open_images(npz_path)
         self.transform = transform
 
+    def __getstate__(self):
+        # Spawned DataLoader workers reopen the memory map instead of receiving a pickled copy
+        state = self.__dict__.copy()
+        state["images"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.images = open_images(self.npz_path)
+
     def __len__(self):
         return len(self.images)
 
     def __getitem__(self, idx):
-        image = torch.tensor(self.images[idx], dtype=torch.float32) # 減少 I/O 操作
-        
-        if len(image.shape) == 2:  # Grayscale to 3 channels
-            image = image.unsqueeze(0).repeat(3, 1, 1)
-        else:
-            image = image.permute(2, 0, 1)  # (H, W, C) -> (C, H, W)
+        image = image_to_tensor(self.images[idx])
 
         if self.transform:
             image = self.transform(image)
         return image
 
 
-def predict_and_save():
-    
-    '''transform = transforms.Compose([
-        transforms.Resize((224, 224)),
-        transforms.Normalize(mean=[0.5, 0.5, 0.5], std=[0.5, 0.5, 0.5])
-    ])
+def image_to_tensor(image_array):
+    image = torch.tensor(np.asarray(image_array), dtype=torch.float32) # 減少 I/O 操作
 
-    test_dataset = NPZImageDataset(TEST_NPZ, transform=transform)
-    test_loader = DataLoader(test_dataset, batch_size=32, shuffle=False)
+    if len(image.shape) == 2:  # Grayscale to 3 channels
+        image = image.unsqueeze(0).repeat(3, 1, 1)
+    else:
+        image = image.permute(2, 0, 1)  # (H, W, C) -> (C, H, W)
+    return image
 
-    device = torch.device("cpu")
-    model.load_state_dict(torch.load(MODEL_PATH, map_location=device))
-    model.to(device)
-    model.eval()
 
-    # 開始預測
-    total_batches = len(test_loader)  # 計算總 batch 數
+def default_transform(image):
+    # Same preprocessing as training: Resize((224, 224)) + Normalize(mean=0.5, std=0.5)
+    if image.shape[-2:] != (224, 224):
+        image = F.interpolate(image.unsqueeze(0), size=(224, 224), mode="bilinear", align_corners=False).squeeze(0)
+    return (image - 0.5) / 0.5
 
-    # Perform predictions and save results
-    predictions = []
-    with torch.no_grad():
-        for batch_idx, images in enumerate(test_loader, start=1):
-            images = images.to(device)
-            outputs = model(images)
-            predictions.append(torch.sigmoid(outputs)) 
-            if batch_idx % 5 == 0 or batch_idx == total_batches:
-                print(f"Processing batch {batch_idx}/{total_batches}... ({(batch_idx / total_batches) * 100:.2f}%)")
 
-    # Convert to numpy array and save
-    predictions = torch.cat(predictions, dim=0).cpu().numpy()  # 最後一次轉 NumPy
+def predict_batch(model, images):
+    # Sigmoid multi-label scores for a list of preprocessed (C, H, W) tensors
+    with torch.inference_mode():
+        return torch.sigmoid(model(torch.stack(images))).numpy()
 
-    np.save(os.path.join(BASE_DIR, "y_pred_image.npy"), predictions)'''
 
-    global image_prediction_done
-    image_prediction_done = True
-    print(f"image Prediction done: {image_prediction_done}")
+def _source_signature(*paths):
+    return [[os.stat(path).st_mtime_ns, os.stat(path).st_size] for path in paths]
 
 
+def _is_up_to_date(output_path, *sources):
+    if not os.path.exists(output_path):
+        return False
+    output_mtime = os.stat(output_path).st_mtime_ns
+    return all(os.stat(source).st_mtime_ns <= output_mtime for source in sources)
+
+
+def load_model(model_path=MODEL_PATH, device=torch.device("cpu")):
+    model = CNN5Layer()
+    model.load_state_dict(torch.load(model_path, map_location=device, weights_only=True))
+    model.to(device)
+    model.eval()
+    return model
+
+
+def predict_and_save(npz_path=TEST_NPZ, model_path=MODEL_PATH, output_path=PRED_NPY,
+                     batch_size=Config.IMAGE_INFERENCE_BATCH_SIZE, num_workers=Config.IMAGE_INFERENCE_NUM_WORKERS,
+                     num_threads=Config.IMAGE_INFERENCE_NUM_THREADS, status=inference_status):
+    """Batched CPU prediction of every image into y_pred_image.npy.
+
+    Sigmoid scores are written chunk by chunk into a memory-mapped
+    ``<output>.partial.npy``; a progress sidecar records how many rows are
+    final, so an interrupted run resumes where it stopped. The finished file
+    replaces the output atomically.
+    """
+    partial_path = output_path[:-len(".npy")] + ".partial.npy"
+    progress_path = output_path[:-len(".npy")] + ".progress.json"
+
+    try:
+        if not os.path.exists(model_path):
+            status.finish("skipped", message=f"Model weights {model_path} not found; serving existing predictions.")
+        elif _is_up_to_date(output_path, npz_path, model_path):
+            status.finish("skipped", message="Predictions are up to date.")
+        else:
+            if num_threads:
+                torch.set_num_threads(num_threads)
+
+            from .model_export import load_inference_model  # fp32 / fused / int8 per Config.IMAGE_MODEL_VARIANT
+
+            dataset = NPZImageDataset(npz_path, transform=default_transform)
+            if len(dataset) == 0:
+                raise ValueError(f"{npz_path} holds no images to predict.")
+            model = load_inference_model(model_path=model_path)
+            with torch.inference_mode():
+                n_classes = model(dataset[0].unsqueeze(0)).shape[1]
+
+            # Resume from the progress sidecar when it belongs to the same inputs
+            signature = _source_signature(npz_path, model_path)
+            start_row = 0
+            if os.path.exists(partial_path) and os.path.exists(progress_path):
+                with open(progress_path) as f:
+                    progress = json.load(f)
+                if progress.get("signature") == signature and progress.get("n_rows") == len(dataset):
+                    start_row = progress["rows_done"]
+            if start_row == 0:
+                predictions = np.lib.format.open_memmap(partial_path, mode="w+", dtype=np.float32,
+                                                        shape=(len(dataset), n_classes))
+            else:
+                predictions = np.load(partial_path, mmap_mode="r+")
+
+            remaining = Subset(dataset, range(start_row, len(dataset)))
+            # Worker processes are spawned: forking this threaded server process is unsafe
+            loader = DataLoader(remaining, batch_size=batch_size, shuffle=False, num_workers=num_workers,
+                                multiprocessing_context="spawn" if num_workers else None)
+            status.start(len(dataset), len(loader), images_done=start_row)
+
+            row = start_row
+            with torch.inference_mode():
+                for batch_idx, images in enumerate(loader, start=1):
+                    outputs = torch.sigmoid(model(images))
+                    predictions[row:row + len(outputs)] = outputs.numpy()
+                    row += len(outputs)
+                    status.advance(len(outputs))
+
+                    # Persist a checkpoint every few batches
+                    if batch_idx % Config.IMAGE_INFERENCE_CHECKPOINT_BATCHES == 0 or row == len(dataset):
+                        predictions.flush()
+                        with open(progress_path, "w") as f:
+                            json.dump({"signature": signature, "n_rows": len(dataset), "rows_done": row}, f)
+                        snapshot = status.snapshot()
+                        logger.info("Processing batch %d/%d... (%s images/s)", snapshot["batches_done"],
+                                    snapshot["total_batches"], snapshot["images_per_sec"])
+
+            predictions.flush()
+            del predictions
+            os.replace(partial_path, output_path)
+            os.remove(progress_path)
+            status.finish("done", message=f"Predicted {len(dataset)} images.")
+    except Exception as e:
+        # Recorded for /image_query/check_status, then re-raised so the "image" startup task fails
+        status.finish("failed", error=str(e))
+        logger.exception("Image prediction failed")
+        raise
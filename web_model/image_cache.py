@@ -0,0 +1,112 @@
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from config import Config
+
+FORMATS = {"jpeg": ("JPEG", "image/jpeg"), "webp": ("WEBP", "image/webp")}
+
+
+def encode_image(image_array, size=None, quality=85, fmt="jpeg"):
+    """Encode one image array (H, W[, C]) to JPEG/WebP bytes, optionally downscaled so max(H, W) <= size."""
+    from PIL import Image  # imported with the first encode, not with the app
+
+    # Make sure the data range is 0-255 and is uint8
+    if image_array.dtype != np.uint8:
+        image_array = (image_array * 255).astype(np.uint8)
+
+    # Make sure the dimensions are (H, W, 3)
+    if len(image_array.shape) == 2:  # If grayscale, convert to RGB
+        image_array = np.stack([image_array] * 3, axis=-1)
+
+    image = Image.fromarray(np.ascontiguousarray(image_array)).convert("RGB")
+    if size is not None:
+        image.thumbnail((size, size))
+
+    buffer = io.BytesIO()
+    image.save(buffer, FORMATS[fmt][0], quality=quality)
+    return buffer.getvalue()
+
+
+def make_etag(key):
+    return hashlib.blake2b(repr(key).encode(), digest_size=12).hexdigest()
+
+
+class ImageCache:
+    """LRU cache of encoded image bytes bounded by a total byte budget."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = self.misses = self.evictions = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def after_fork(self):
+        # The parent's request or pre-warm threads may have held the lock when it forked
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._items.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.current_bytes -= len(old)
+            self._items[key] = data
+            self.current_bytes += len(data)
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.current_bytes -= len(evicted)
+                self.evictions += 1
+
+    def get_or_encode(self, key, encode):
+        data = self.get(key)
+        if data is None:
+            data = encode()
+            self.put(key, data)
+        return data
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._items
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._items), "bytes": self.current_bytes, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+image_cache = ImageCache(Config.IMAGE_CACHE_MAX_BYTES)
+
+# Single background worker so pre-warming never competes with request threads for more than one core
+_prewarm_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="image-prewarm")
+
+
+def after_fork():
+    global _prewarm_executor
+    image_cache.after_fork()
+    _prewarm_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="image-prewarm")
+
+
+def prewarm(keys_and_encoders):
+    """Encode (key, encode) pairs that are not cached yet, in the background."""
+    def run():
+        for key, encode in keys_and_encoders:
+            if key not in image_cache:
+                image_cache.put(key, encode())
+    return _prewarm_executor.submit(run)
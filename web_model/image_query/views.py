@@ -1,17 +1,61 @@
-from flask import render_template, request, jsonify, send_file
-import numpy as np
+from flask import render_template, request, jsonify, Response
+from . import image_query_bp
+from ..data_registry import registry, data_path, load_npz_member
+from ..image_store import ImageStore, is_current, store_paths
+from ..class_index import ClassIndex
+from ..vector_index import BACKENDS, load_or_build_index
+from ..image_cache import FORMATS, encode_image, image_cache, make_etag, prewarm
+from ..micro_batcher import MicroBatcher
+from ..offload import PoolBusy, busy_response, offload
+from ..pagination import (PaginationError, cursor_error, dataset_version, ndjson_response, paginate,
+                          request_value, row_blocks)
+from ..inference_status import inference_status
+from ..lifecycle import lifecycle, requires_ready
+from ..metrics import span
+from ..result_cache import cached_response
+from ..serialization import encode_rows, json_response
+import logging
 import os
-import time
 import threading
-from PIL import Image
-from . import image_query_bp
-from .. import imageRL
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+X_test_image_path = data_path("X_test_image.npz")
+y_pred_image_path = data_path("y_pred_image.npy")
+IMAGE_STORE_PREFIX = data_path(Config.IMAGE_STORE_PREFIX)
+MODEL_PATH = data_path("cnn5layer_multi_label.pth")  # imageRL.MODEL_PATH, without importing torch
+# Prefer the uncompressed memory-mapped store; decompressing the .npz is the fallback
+registry.register("X_test_image_store", store_paths(IMAGE_STORE_PREFIX)["meta"], ImageStore.open_meta)
+registry.register("X_test_image", X_test_image_path, load_npz_member("x"), preload=False)
+registry.register("y_pred_image", y_pred_image_path)
+X_test_path = data_path("X_test.npy")
+registry.register("X_test", X_test_path)
+registry.derive("y_pred_image_class_index", ["y_pred_image"],
+                lambda y_pred: ClassIndex.from_labels(y_pred.argmax(axis=1), n_classes=y_pred.shape[1]))
+
+def load_images():
+    # (images, version) from the memory-mapped store when it is current, else from X_test_image.npz
+    if is_current(IMAGE_STORE_PREFIX, X_test_image_path):
+        return registry.get_with_version("X_test_image_store")
+    return registry.get_with_version("X_test_image")
+
+def _vector_index_builder(backend):
+    def build(X_test, version):
+        return load_or_build_index(backend, X_test, X_test_path, version)
+    return build
+
+# One index per backend, built (or loaded from disk) once per version of X_test.npy
+for _backend in BACKENDS:
+    registry.derive(f"X_test_index:{_backend}", ["X_test"], _vector_index_builder(_backend), pass_version=True)
 
 @image_query_bp.route('/check_status', methods=['GET'])
 def check_image_status():
     """Returns whether the image data has been loaded."""
-    print(f"return image_prediction_done: {imageRL.image_prediction_done}")
-    return jsonify({"prediction_done": imageRL.image_prediction_done})
+    return jsonify({"prediction_done": lifecycle.is_ready("image"), "state": lifecycle.state("image"),
+                    "progress": inference_status.snapshot()})
 
 @image_query_bp.route('/image_data', methods=['GET'])
 def index():
@@ -19,16 +63,12 @@ def index():
 
 # Query API (supports GET & POST)
 @image_query_bp.route('/image_data/query', methods=['GET', 'POST'])
+@requires_ready("image")
+@cached_response(["y_pred_image"])
 def query():
-    # Get category value
-    if request.method == "POST":
-        category = request.json.get("class_value")
-        page = request.json.get("page", 1)  # Default is Page 1
-        per_page = 8  # Modified to display 8 pictures per page
-    else:
-        category = request.args.get("class_value")
-        page = int(request.args.get("page", 1))  # Default is Page 1
-        per_page = 8  # Modified to display 8 pictures per page
+    # Get category value (JSON body for POST, query string for GET)
+    category = request_value("class_value")
+    per_page = 8  # Modified to display 8 pictures per page
 
     try:
         category = int(category)
@@ -38,110 +78,113 @@ def query():
         return jsonify({"error": "The class value must be a number."}), 400
 
     try:
-        # Get the file path
-        base_path = os.path.dirname(os.path.abspath(__file__))
-        X_test_path = os.path.join(base_path, "..", "X_test_image.npz")
-        y_pred_path = os.path.join(base_path, "..", "y_pred_image.npy")
-
-        # Load X_test_image.npz
-        with np.load(X_test_path) as data:
-            print("X_test_image.npz keys:", list(data.keys()))  # Make sure to include 'x'
-            X_test_loaded = data["x"]  # Reading image data
-
-        # Loading File
-        y_pred_loaded = np.load(y_pred_path)
-
-        y_pred_labels = y_pred_loaded.argmax(axis=1)
-
-        # Get the index that meets the conditions
-        matched_indices = np.where(y_pred_labels == category)[0]
+        # Class -> image index, built once per version of y_pred_image.npy
+        with span("load"):
+            version = dataset_version(["y_pred_image"])
+            class_index = registry.get("y_pred_image_class_index")
 
         # Query Filter
-        total_results = len(matched_indices)
+        with span("filter"):
+            total_results = class_index.count(category)
 
         if total_results == 0:
             return jsonify({"error": f"No data found for class {category}."}), 404
         
-        # Calculate the paging range
-        start_idx = (page - 1) * per_page
-        end_idx = start_idx + per_page
-        #paginated_results = filtered_results[start_idx:end_idx]
-        paginated_indices = matched_indices[start_idx:end_idx]  # Get the corresponding index
+        # Calculate the paging range (?page= or the opaque ?cursor= of the previous page)
+        with span("slice"):
+            start_idx, end_idx, page_info = paginate(total_results, per_page, ("image", category), version)
+            #paginated_results = filtered_results[start_idx:end_idx]
+            paginated_indices = class_index.page(category, start_idx, end_idx)  # Get the corresponding index
 
         # Formatting data (image index)
-        formatted_results = [{"Index": int(idx)} for idx in paginated_indices]
+        with span("format"):
+            formatted_results = [{"Index": int(idx)} for idx in paginated_indices]
+
+        if Config.IMAGE_PREWARM:
+            try:
+                with span("prewarm"):
+                    prewarm_images(paginated_indices)
+            except FileNotFoundError:
+                pass  # get_image reports the missing archive
 
-        return jsonify({
+        return json_response({
             "category": category,
-            "total_results": total_results,
-            "total_pages": (total_results // per_page) + (1 if total_results % per_page > 0 else 0),
-            "current_page": page,
-            "per_page": per_page,
+            **page_info,
             "results": formatted_results
         })
 
+    except PaginationError as e:
+        return cursor_error(e)
+    except FileNotFoundError as e:
+        return jsonify({"error": f"File not found: {str(e)}. Please confirm that the file exists at {y_pred_image_path}."}), 500
+
+# Export API: every image index of a class as NDJSON, streamed block by block
+@image_query_bp.route('/image_data/export', methods=['GET'])
+@requires_ready("image")
+def export():
+    try:
+        category = int(request.args.get("class_value"))
+        if category not in range(0, 5):  # Limit 0~4
+            return jsonify({"error": "Please enter a valid class value (0 to 4)."}), 400
+    except (TypeError, ValueError):
+        return jsonify({"error": "The class value must be a number."}), 400
+
+    try:
+        version = dataset_version(["y_pred_image"])
+        class_index = registry.get("y_pred_image_class_index")
     except FileNotFoundError as e:
-        return jsonify({"error": f"File not found: {str(e)}. Please confirm that the file exists at {X_test_path}."}), 500
+        return jsonify({"error": f"File not found: {str(e)}. Please confirm that the file exists at {y_pred_image_path}."}), 500
+
+    blocks = (encode_rows(["Index"], [indices]) for indices in row_blocks(class_index.rows(category)))
+    return ndjson_response(blocks, version)
+
+def image_cache_key(version, index, size, quality, fmt):
+    return (version, index, size, quality, fmt)
+
+def _image_encoder(X_test_loaded, index, size, quality, fmt):
+    return lambda: encode_image(X_test_loaded[index], size=size, quality=quality, fmt=fmt)
 
 @image_query_bp.route('/image/<int:index>', methods=['GET'])
+@requires_ready("image_store")
 def get_image(index):
     try:
-        # Get the base path of the current archive
-        base_path = os.path.dirname(os.path.abspath(__file__))
-        X_test_image_path = os.path.join(base_path, "..", "X_test_image.npz")
-
-        # Loading .npz files
-        with np.load(X_test_image_path) as data:
-            print("X_test_image_path exists, keys:", list(data.keys()))
-            X_test_loaded = data["x"]
+        size = request.args.get("size", type=int)  # Optional thumbnail size (max side in px)
+        quality = request.args.get("quality", Config.IMAGE_QUALITY, type=int)
+        fmt = request.args.get("format", "jpeg").lower()
+        if fmt not in FORMATS:
+            return jsonify({"error": f"Unsupported format '{fmt}'. Choose from {sorted(FORMATS)}."}), 400
+        if not 1 <= quality <= 100 or (size is not None and size < 1):
+            return jsonify({"error": "Invalid size or quality."}), 400
+
+        # Memory-mapped image store (or shared decompressed copy of X_test_image.npz['x'])
+        with span("load"):
+            X_test_loaded, version = load_images()
 
         # Make sure the index is valid
         if index < 0 or index >= len(X_test_loaded):
             return jsonify({"error": "Image index out of range."}), 404
 
-        # Reading image data
-        image_array = X_test_loaded[index]
-        print(f"image_array shape: {image_array.shape}, dtype: {image_array.dtype}")
-
-        # Make sure the data range is 0-255 and is uint8
-        if image_array.dtype != np.uint8:
-            image_array = (image_array * 255).astype(np.uint8)
-
-        # Make sure the dimensions are (H, W, 3)
-        if len(image_array.shape) == 2:  # If grayscale, convert to RGB
-            image_array = np.stack([image_array] * 3, axis=-1)
-
-        # Try creating a PIL image
-        try:
-            print(f"Creating image from array with shape: {image_array.shape}, dtype: {image_array.dtype}")
-            image = Image.fromarray(image_array)
-        except Exception as e:
-            print(f"Error creating image: {e}")
-            return jsonify({"error": f"Failed to create image: {str(e)}"}), 500
-
-        # Get the current directory of views.py
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        # Save to the Flask static/images directory
-        img_dir = os.path.join(base_dir, "static", "images")
-        os.makedirs(img_dir, exist_ok=True)  # Make sure the directory exists
-
-        #img_path = os.path.join(img_dir, f"temp_{index}.png")
-        #image.save(img_path)
-        img_path = os.path.join(img_dir, f"temp_{index}.jpg")
-        image = image.convert("RGB")  # Make sure it is not a PNG (transparent background)
-        image.save(img_path, "JPEG", quality=85)  # Compress images
-
-        print(f"Image saved at: {img_path}")
-
-        # Make sure the image is saved
-        if not os.path.exists(img_path):
-            raise FileNotFoundError(f"Image file {img_path} not found after saving.")
-        
-        # Send the image first, then delete it after 5 seconds
-        delayed_remove(img_path, delay=5)
-
-        # Return image file
-        return send_file(img_path, mimetype='image/jpeg')
+        key = image_cache_key(version, index, size, quality, fmt)
+        etag = make_etag(key)
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            # Encoded bytes are served from memory; only a cache miss runs PIL (on the heavy pool)
+            encoder = _image_encoder(X_test_loaded, index, size, quality, fmt)
+            try:
+                with span("encode"):
+                    data = image_cache.get_or_encode(key, lambda: offload(encoder))
+            except PoolBusy as e:
+                body, status, headers = busy_response(e)
+                return jsonify(body), status, headers
+            except Exception as e:
+                logger.exception("Error creating image %d", index)
+                return jsonify({"error": f"Failed to create image: {str(e)}"}), 500
+            response = Response(data, mimetype=FORMATS[fmt][1])
+
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = f"public, max-age={Config.IMAGE_CACHE_MAX_AGE}"
+        return response
 
     except FileNotFoundError:
         return jsonify({"error": "File X_test_image.npz not found."}), 500
@@ -149,20 +192,53 @@ def get_image(index):
         return jsonify({"error": "Invalid .npz file structure. Expected 'x' as key."}), 500
     except Exception as e:
         return jsonify({"error": f"Unexpected error: {str(e)}"}), 500
-    
-def delayed_remove(file_path, delay=5):
-    # Delay the file deletion to ensure that Flask has successfully sent the image
-    def remove():
-        time.sleep(delay)  # Delay deletion to ensure transfer is complete
-        try:
-            os.remove(file_path)
-            print(f"Deleted temp file: {file_path}")
-        except Exception as e:
-            print(f"Failed to delete {file_path}: {e}")
-
-    threading.Thread(target=remove, daemon=True).start()  # Background execution removal
+
+def prewarm_images(indices):
+    # Encode the images of the page being returned so that the browser's <img> requests hit the cache
+    X_test_loaded, version = load_images()
+    quality = Config.IMAGE_QUALITY
+    prewarm([(image_cache_key(version, int(idx), None, quality, "jpeg"),
+              _image_encoder(X_test_loaded, int(idx), None, quality, "jpeg"))
+             for idx in indices if 0 <= idx < len(X_test_loaded)])
+
+def similar_images(queries, backend):
+    """(body, status) for each (image_index, k) query; one search over all query vectors answers them."""
+    # Read X_test.npy (image features) and its nearest-neighbour index
+    with span("load"):
+        X_test_loaded = registry.get("X_test")  # shape: (num_samples, feature_dim)
+    results, valid = [None] * len(queries), []
+    for i, (image_index, k) in enumerate(queries):
+        if not 1 <= k <= Config.MAX_SIMILAR_IMAGES_K:
+            results[i] = {"error": f"k must be between 1 and {Config.MAX_SIMILAR_IMAGES_K}."}, 400
+        elif image_index < 0 or image_index >= len(X_test_loaded):
+            results[i] = {"error": "Image index out of range"}, 404
+        else:
+            valid.append(i)
+    if not valid:
+        return results
+
+    with span("load"):
+        vector_index = registry.get(f"X_test_index:{backend}")
+
+    # Get the k most similar images of every query (excluding itself)
+    rows = [queries[i][0] for i in valid]
+    with span("search"):
+        neighbor_ids, _ = offload(vector_index.search, X_test_loaded[rows], max(queries[i][1] for i in valid) + 1)
+    for i, ids in zip(valid, neighbor_ids):
+        image_index, k = queries[i]
+        similar_indices = [int(idx) for idx in ids if idx != image_index and idx >= 0][:k]
+        results[i] = {
+            "query_index": image_index,
+            "backend": backend,
+            "k": k,
+            "recall_at_10": vector_index.recall_at_10,
+            "similar_images": [{"Index": idx} for idx in similar_indices]
+        }, 200
+    return results
 
 @image_query_bp.route('/find_similar', methods=['GET'])
+@requires_ready("tabular")
+@cached_response(["X_test"])
 def find_similar_images():
     try:
         image_index = request.args.get("index")
@@ -170,34 +246,107 @@ def find_similar_images():
             return jsonify({"error": "Missing image index parameter"}), 400
 
         image_index = int(image_index)
+        k = int(request.args.get("k", Config.SIMILAR_IMAGES_K))
+        backend = request.args.get("backend", Config.VECTOR_INDEX_BACKEND)
 
-        # Read X_test.npy (image features)
-        base_path = os.path.dirname(os.path.abspath(__file__))
-        X_test_path = os.path.join(base_path, "..", "X_test.npy")
-
-        X_test_loaded = np.load(X_test_path)  # shape: (num_samples, feature_dim)
+        if backend not in BACKENDS:
+            return jsonify({"error": f"Unknown backend '{backend}'. Choose from {sorted(BACKENDS)}."}), 400
 
-        if image_index < 0 or image_index >= len(X_test_loaded):
-            return jsonify({"error": "Image index out of range"}), 404
-
-        # Get the feature vector of the specified image
-        query_image_feature = X_test_loaded[image_index]
-
-        # Calculate Euclidean distance
-        distances = np.linalg.norm(X_test_loaded - query_image_feature, axis=1)
-
-        # Get the 8 most similar images (excluding yourself)
-        sorted_indices = np.argsort(distances)
-        similar_indices = [int(idx) for idx in sorted_indices if idx != image_index][:8]
-
-        return jsonify({
-            "query_index": image_index,
-            "similar_images": [{"Index": idx} for idx in similar_indices]
-        })
+        (body, status), = similar_images([(image_index, k)], backend)
+        return jsonify(body), status
 
+    except PoolBusy as e:
+        body, status, headers = busy_response(e)
+        return jsonify(body), status, headers
     except ValueError:
         return jsonify({"error": "Invalid image index"}), 400
     except FileNotFoundError:
         return jsonify({"error": "X_test.npy not found"}), 500
     except Exception as e:
         return jsonify({"error": f"Unexpected error: {str(e)}"}), 500
+
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+class ImageTooLarge(ValueError):
+    """Upload with more pixels than IMAGE_PREDICT_MAX_PIXELS."""
+
+def get_batcher():
+    # Load CNN5Layer once and share one micro-batcher between all request threads
+    global _batcher
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                # torch is only imported by the first prediction
+                from .. import imageRL
+                from ..model_export import load_inference_model
+                model = load_inference_model()
+                _batcher = MicroBatcher(lambda images: imageRL.predict_batch(model, images),
+                                        max_batch_size=Config.IMAGE_PREDICT_MAX_BATCH_SIZE,
+                                        max_wait_ms=Config.IMAGE_PREDICT_MAX_WAIT_MS,
+                                        name="image-predict")
+    return _batcher
+
+def after_fork():
+    # The batcher's thread did not survive the fork; the first prediction starts a new one
+    global _batcher, _batcher_lock
+    _batcher, _batcher_lock = None, threading.Lock()
+
+@image_query_bp.route('/predict', methods=['POST'])
+def predict_uploaded_images():
+    uploads = request.files.getlist("images") or request.files.getlist("image")
+    if not uploads:
+        return jsonify({"error": "Upload one or more image files in the 'images' field."}), 400
+    if len(uploads) > Config.IMAGE_PREDICT_MAX_UPLOADS:
+        return jsonify({"error": f"At most {Config.IMAGE_PREDICT_MAX_UPLOADS} images per request."}), 400
+
+    from PIL import Image, UnidentifiedImageError
+    from .. import imageRL
+
+    def decode(upload):
+        # Image.open only reads the header: check the size before decoding any pixels
+        image = Image.open(upload.stream)
+        width, height = image.size
+        if width * height > Config.IMAGE_PREDICT_MAX_PIXELS:
+            raise ImageTooLarge(f"Image '{upload.filename}' is {width}x{height}; "
+                                f"at most {Config.IMAGE_PREDICT_MAX_PIXELS} pixels are accepted.")
+        return imageRL.default_transform(imageRL.image_to_tensor(image.convert("RGB")))
+
+    try:
+        tensors = []
+        for upload in uploads:
+            tensors.append(offload(decode, upload))
+    except PoolBusy as e:
+        body, status, headers = busy_response(e)
+        return jsonify(body), status, headers
+    except ImageTooLarge as e:
+        return jsonify({"error": str(e)}), 413
+    except (Image.DecompressionBombError, UnidentifiedImageError, OSError):
+        return jsonify({"error": f"Invalid image file '{upload.filename}'."}), 400
+
+    if not os.path.exists(MODEL_PATH):
+        return jsonify({"error": "Image model weights not found."}), 503
+
+    try:
+        batcher = get_batcher()
+        # Each image is queued separately so it can share a forward pass with other requests
+        futures = [batcher.submit(tensor) for tensor in tensors]
+        deadline = time.monotonic() + Config.IMAGE_PREDICT_TIMEOUT
+        scores = [future.result(timeout=max(deadline - time.monotonic(), 0)) for future in futures]
+    except FutureTimeoutError:
+        for future in futures:
+            future.cancel()
+        return jsonify({"error": "Prediction timed out, retry shortly."}), 504
+    except Exception as e:
+        return jsonify({"error": f"Unexpected error: {str(e)}"}), 500
+
+    return jsonify({
+        "predictions": [
+            {"filename": upload.filename,
+             "scores": [float(score) for score in row],
+             "labels": [int(label) for label in (row >= Config.IMAGE_PREDICT_THRESHOLD).nonzero()[0]],
+             "top_label": int(row.argmax())}
+            for upload, row in zip(uploads, scores)
+        ]
+    })
@@ -0,0 +1,167 @@
+import argparse
+import json
+import os
+import zipfile
+
+import numpy as np
+
+from .data_registry import data_path
+
+
+def store_paths(prefix):
+    """Files of an image store: fixed-shape images go to <prefix>.npy; variable-size
+    images go to <prefix>.bin (flat) + <prefix>_offsets.npy + <prefix>_shapes.npy.
+    <prefix>_meta.json is written last and marks the store as complete."""
+    return {"meta": f"{prefix}_meta.json", "array": f"{prefix}.npy", "flat": f"{prefix}.bin",
+            "offsets": f"{prefix}_offsets.npy", "shapes": f"{prefix}_shapes.npy"}
+
+
+def _write_meta(prefix, meta):
+    meta_path = store_paths(prefix)["meta"]
+    with open(meta_path + ".tmp", "w") as f:
+        json.dump(meta, f)
+    os.replace(meta_path + ".tmp", meta_path)
+
+
+def _convert_fixed(member, header_reader, out_path, chunk_bytes):
+    # Stream the raw .npy payload out of the zip member; never holds more than one chunk
+    shape, fortran_order, dtype = header_reader(member)
+    out = np.lib.format.open_memmap(out_path + ".tmp.npy", mode="w+", dtype=dtype, shape=shape,
+                                    fortran_order=fortran_order)
+    flat = out.reshape(-1, order="F" if fortran_order else "C")
+    rows = max(1, chunk_bytes // dtype.itemsize)
+    for start in range(0, flat.size, rows):
+        count = min(rows, flat.size - start)
+        flat[start:start + count] = np.frombuffer(member.read(count * dtype.itemsize), dtype=dtype)
+    out.flush()
+    del flat, out
+    os.replace(out_path + ".tmp.npy", out_path)
+    return {"layout": "fixed", "count": int(shape[0]) if shape else 0, "dtype": dtype.str}
+
+
+def _convert_ragged(images, paths):
+    # Object arrays of differently sized images: one flat buffer plus offsets/shapes
+    sizes = np.array([np.asarray(image).size for image in images], dtype=np.int64)
+    offsets = np.zeros(len(images) + 1, dtype=np.int64)
+    np.cumsum(sizes, out=offsets[1:])
+    shapes = np.zeros((len(images), 3), dtype=np.int32)  # grayscale images keep a 0 channel count
+    dtype = np.result_type(*[np.asarray(image).dtype for image in images]) if len(images) else np.uint8
+
+    flat = np.memmap(paths["flat"], mode="w+", dtype=dtype, shape=(max(int(offsets[-1]), 1),))
+    for i, image in enumerate(images):
+        image = np.asarray(image)
+        shapes[i, :image.ndim] = image.shape
+        flat[offsets[i]:offsets[i + 1]] = image.ravel()
+    flat.flush()
+    del flat
+    np.save(paths["offsets"], offsets)
+    np.save(paths["shapes"], shapes)
+    return {"layout": "ragged", "count": len(images), "dtype": np.dtype(dtype).str}
+
+
+def convert_npz(npz_path, prefix, key="x", chunk_bytes=64 << 20):
+    """Convert one member of an .npz archive into an uncompressed, memory-mappable image store."""
+    paths = store_paths(prefix)
+    source = os.stat(npz_path)
+    if os.path.exists(paths["meta"]):
+        os.remove(paths["meta"])  # readers fall back to the archive until the new store is complete
+
+    with zipfile.ZipFile(npz_path) as archive:
+        with archive.open(f"{key}.npy") as member:
+            version = np.lib.format.read_magic(member)
+            header_reader = {(1, 0): np.lib.format.read_array_header_1_0,
+                             (2, 0): np.lib.format.read_array_header_2_0}[version]
+            _, _, dtype = header_reader(member)
+
+    if dtype.hasobject:
+        with np.load(npz_path, allow_pickle=True) as data:
+            meta = _convert_ragged(data[key], paths)
+    else:
+        with zipfile.ZipFile(npz_path) as archive:
+            with archive.open(f"{key}.npy") as member:
+                np.lib.format.read_magic(member)
+                meta = _convert_fixed(member, header_reader, paths["array"], chunk_bytes)
+
+    meta["source"] = {"size": source.st_size, "mtime_ns": source.st_mtime_ns}
+    _write_meta(prefix, meta)
+    return paths["meta"]
+
+
+def is_current(prefix, npz_path):
+    # The store is usable when it is complete and was converted from the archive as it is now
+    meta_path = store_paths(prefix)["meta"]
+    if not os.path.exists(meta_path):
+        return False
+    if not os.path.exists(npz_path):
+        return True
+    with open(meta_path) as f:
+        source = json.load(f).get("source")
+    stat = os.stat(npz_path)
+    if source is None:  # stores converted before the source was recorded
+        return os.stat(meta_path).st_mtime_ns >= stat.st_mtime_ns
+    return (source["size"], source["mtime_ns"]) == (stat.st_size, stat.st_mtime_ns)
+
+
+class ImageStore:
+    """Random access to single images; only the pages of the requested image are touched."""
+
+    def __init__(self, meta, array=None, flat=None, offsets=None, shapes=None):
+        self.meta = meta
+        self.array = array
+        self.flat = flat
+        self.offsets = offsets
+        self.shapes = shapes
+        self.dtype = np.dtype(meta["dtype"])
+
+    @classmethod
+    def open(cls, prefix):
+        paths = store_paths(prefix)
+        with open(paths["meta"]) as f:
+            meta = json.load(f)
+        if meta["layout"] == "fixed":
+            return cls(meta, array=np.load(paths["array"], mmap_mode="r"))
+        return cls(meta,
+                   flat=np.memmap(paths["flat"], mode="r", dtype=np.dtype(meta["dtype"])),
+                   offsets=np.load(paths["offsets"]),
+                   shapes=np.load(paths["shapes"]))
+
+    @classmethod
+    def open_meta(cls, meta_path):
+        return cls.open(meta_path[:-len("_meta.json")])
+
+    def __len__(self):
+        return self.meta["count"]
+
+    def __getitem__(self, index):
+        if self.array is not None:
+            return self.array[index]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f"Image index {index} out of range.")
+        shape = tuple(int(dim) for dim in self.shapes[index] if dim > 0)
+        return self.flat[self.offsets[index]:self.offsets[index + 1]].reshape(shape)
+
+
+def open_images(npz_path, key="x"):
+    """Images behind an .npz path: the converted store beside it if current, else the decompressed member."""
+    prefix = os.path.splitext(npz_path)[0]
+    if is_current(prefix, npz_path):
+        return ImageStore.open(prefix)
+    with np.load(npz_path, allow_pickle=True) as data:
+        return data[key]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert an image .npz archive into a memory-mappable image store.")
+    parser.add_argument("--npz", default=data_path("X_test_image.npz"), help="source archive")
+    parser.add_argument("--prefix", default=None, help="output prefix (default: archive path without .npz)")
+    parser.add_argument("--key", default="x", help="archive member holding the images")
+    args = parser.parse_args()
+
+    meta_path = convert_npz(args.npz, args.prefix or os.path.splitext(args.npz)[0], key=args.key)
+    print(f"Wrote image store {meta_path}")
+
+
+if __name__ == "__main__":
+    main()
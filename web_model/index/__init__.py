@@ -1,7 +1,38 @@
-from flask import Blueprint, render_template
+from flask import Blueprint, jsonify, render_template
+from ..lifecycle import lifecycle, requested_tasks, startup_report, status_stream
+from ..metrics import metrics_response
 
 index_bp = Blueprint("index_bp", __name__, template_folder="templates")
 
 @index_bp.route('/')
 def index():
     return render_template('index.html')  # 確保 `index.html` 存在
+
+
+# Prometheus metrics of this process
+@index_bp.route('/metrics')
+def metrics():
+    return metrics_response()
+
+# Startup status: a snapshot, or Server-Sent Events until the requested datasets are loaded
+@index_bp.route('/status')
+def status():
+    try:
+        return jsonify(lifecycle.snapshot(requested_tasks()))
+    except KeyError as e:
+        return jsonify({"error": e.args[0]}), 400
+
+@index_bp.route('/status/stream')
+def status_events():
+    try:
+        lifecycle.snapshot(requested_tasks())
+    except KeyError as e:
+        return jsonify({"error": e.args[0]}), 400
+    # Watching a dataset starts loading it (STARTUP_WARMUP = 'on_demand')
+    lifecycle.request(requested_tasks())
+    return status_stream(requested_tasks())
+
+# Where startup time went: create_app stages, heavy imports and each loader
+@index_bp.route('/status/startup')
+def startup():
+    return jsonify(startup_report())
@@ -0,0 +1,55 @@
+import threading
+import time
+
+
+class InferenceStatus:
+    """Progress of the offline image prediction run, reported by /image_query/check_status."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.state = "pending"  # pending / running / done / skipped / failed
+        self.batches_done = self.total_batches = 0
+        self.images_done = self.total_images = 0
+        self.images_per_sec = 0.0
+        self.eta_seconds = None
+        self.error = None
+        self.message = None
+        self._started_at = None
+        self._resumed_from = 0
+
+    def after_fork(self):
+        self._lock = threading.Lock()
+
+    def start(self, total_images, total_batches, images_done=0):
+        with self._lock:
+            self.state = "running"
+            self.total_images, self.total_batches = total_images, total_batches
+            self.images_done, self.batches_done = images_done, 0
+            self._resumed_from = images_done
+            self._started_at = time.perf_counter()
+
+    def advance(self, n_images):
+        with self._lock:
+            self.batches_done += 1
+            self.images_done += n_images
+            elapsed = time.perf_counter() - self._started_at
+            processed = self.images_done - self._resumed_from
+            self.images_per_sec = processed / elapsed if elapsed > 0 else 0.0
+            remaining = self.total_images - self.images_done
+            self.eta_seconds = remaining / self.images_per_sec if self.images_per_sec > 0 else None
+
+    def finish(self, state, message=None, error=None):
+        with self._lock:
+            self.state, self.message, self.error = state, message, error
+            if state == "done":
+                self.eta_seconds = 0.0
+
+    def snapshot(self):
+        with self._lock:
+            return {"state": self.state, "batches_done": self.batches_done, "total_batches": self.total_batches,
+                    "images_done": self.images_done, "total_images": self.total_images,
+                    "images_per_sec": round(self.images_per_sec, 2), "eta_seconds": self.eta_seconds,
+                    "message": self.message, "error": self.error}
+
+
+inference_status = InferenceStatus()
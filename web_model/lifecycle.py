@@ -0,0 +1,269 @@
+import functools
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from flask import Response, jsonify, request, stream_with_context
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# pending -> loading -> ready | failed
+TERMINAL_STATES = ("ready", "failed")
+
+
+class StartupTask:
+    def __init__(self, name, loader, depends_on=(), progress=None):
+        self.name = name
+        self.loader = loader
+        self.depends_on = tuple(depends_on)
+        self.progress = progress  # optional callable returning a JSON-able progress snapshot
+        self.state = "pending"
+        self.requested = False  # scheduled to run once its dependencies are ready
+        self.error = None
+        self.queued_at = time.time()
+        self.started_at = self.finished_at = None
+        self.done = threading.Event()
+
+    def snapshot(self):
+        now = time.time()
+        return {"state": self.state, "requested": self.requested, "depends_on": list(self.depends_on),
+                "error": self.error,
+                "progress": self.progress() if self.progress is not None else None,
+                "wait_seconds": round((self.started_at or now) - self.queued_at, 3),
+                "duration_seconds": round((self.finished_at or now) - self.started_at, 3)
+                                    if self.started_at is not None else None}
+
+
+class LifecycleManager:
+    """Runs the startup loaders on a thread pool, each once its dependencies are ready.
+
+    With ``start(run_all=True)`` every loader is scheduled at once (background warm-up); otherwise
+    a loader and its dependencies are scheduled by the first ``request`` for it (on demand).
+    A loader whose dependency failed fails too, without running. Every state change bumps
+    ``generation`` and wakes the /status/stream listeners.
+    """
+
+    def __init__(self):
+        self._tasks = {}
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self.generation = 0
+        self._executor = None
+        self._max_workers = None
+
+    @property
+    def started(self):
+        return self._executor is not None
+
+    def add(self, name, loader, depends_on=(), progress=None):
+        with self._lock:
+            if self._executor is not None:
+                raise RuntimeError("Startup tasks must be added before start().")
+            self._tasks[name] = StartupTask(name, loader, depends_on, progress)
+
+    def start(self, max_workers=None, run_all=True):
+        with self._lock:
+            for task in self._tasks.values():
+                missing = [dep for dep in task.depends_on if dep not in self._tasks]
+                if missing:
+                    raise ValueError(f"Startup task '{task.name}' depends on unknown tasks {missing}.")
+                task.requested = run_all
+            self._max_workers = max_workers or Config.STARTUP_MAX_WORKERS
+            self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="startup")
+            self._schedule()
+
+    def request(self, names=None):
+        """Schedule ``names`` (default: all) and everything they depend on; no-op for tasks already requested."""
+        with self._lock:
+            pending = list(self._tasks) if names is None else list(names)
+            while pending:
+                task = self._task(pending.pop())
+                if not task.requested:
+                    task.requested = True
+                    task.queued_at = time.time()
+                    pending.extend(task.depends_on)
+            if self._executor is not None:
+                self._schedule()
+
+    def after_fork(self):
+        """In a forked worker: the parent's loader threads did not survive the fork, so rerun the
+        tasks that were still loading (and schedule the requested pending ones) in this process."""
+        if self._executor is None:
+            return
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        with self._lock:
+            for task in self._tasks.values():
+                if task.state == "loading":
+                    task.state, task.started_at = "pending", None
+            self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="startup")
+            self._schedule()
+
+    def _schedule(self):
+        # Called with the lock held: submit every requested task whose dependencies have finished
+        for task in self._tasks.values():
+            if task.state != "pending" or not task.requested:
+                continue
+            states = [self._tasks[dep].state for dep in task.depends_on]
+            if "failed" in states:
+                failed = [dep for dep in task.depends_on if self._tasks[dep].state == "failed"]
+                self._finish(task, "failed", f"Dependency {failed[0]} failed.")
+            elif all(state == "ready" for state in states):
+                task.state = "loading"
+                task.started_at = time.time()
+                self._notify()
+                self._executor.submit(self._run, task)
+
+    def _run(self, task):
+        try:
+            task.loader()
+            state, error = "ready", None
+        except Exception as e:
+            state, error = "failed", str(e)
+            logger.exception("Startup task %s failed", task.name)
+        with self._lock:
+            self._finish(task, state, error)
+            self._schedule()
+            finished = all(other.state in TERMINAL_STATES for other in self._tasks.values())
+        if state == "ready":
+            logger.info("%s ready in %.2fs", task.name, task.finished_at - task.started_at)
+        if finished and self is lifecycle:  # the report describes the app's startup
+            logger.info("Startup finished: %s", json.dumps(startup_report()))
+
+    def _finish(self, task, state, error=None):
+        task.state, task.error = state, error
+        task.finished_at = time.time()
+        if task.started_at is None:
+            task.started_at = task.finished_at
+        task.done.set()
+        self._notify()
+        # A failed task takes down the pending tasks that depend on it
+        if state == "failed":
+            self._schedule()
+
+    def _notify(self):
+        self.generation += 1
+        self._changed.notify_all()
+
+    def state(self, name):
+        return self._task(name).state
+
+    def is_ready(self, *names):
+        return all(self._task(name).state == "ready" for name in names)
+
+    def wait(self, names=None, timeout=None):
+        """Block until every task in ``names`` (default: all) has finished or ``timeout`` seconds pass;
+        True if all are ready."""
+        names = list(self._tasks) if names is None else names
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for name in names:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not self._task(name).done.wait(remaining):
+                return False
+        return self.is_ready(*names)
+
+    def snapshot(self, names=None):
+        with self._lock:
+            names = list(self._tasks) if names is None else names
+            return {name: self._task(name).snapshot() for name in names}
+
+    def wait_for_change(self, generation, timeout):
+        # New generation once the state has moved past ``generation`` (or the same one on timeout)
+        with self._changed:
+            self._changed.wait_for(lambda: self.generation != generation, timeout)
+            return self.generation
+
+    def _task(self, name):
+        try:
+            return self._tasks[name]
+        except KeyError:
+            raise KeyError(f"Startup task '{name}' is not registered.") from None
+
+
+lifecycle = LifecycleManager()
+
+# (stage, seconds) of create_app and of the imports done by the loaders, in completion order
+startup_stages = []
+
+
+@contextmanager
+def startup_stage(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        startup_stages.append((name, time.perf_counter() - started))
+
+
+def startup_report():
+    """Where startup time went: timed stages (imports, logging setup) and each loader's wait and run time."""
+    tasks = lifecycle.snapshot() if lifecycle.started else {}
+    return {"stages": [{"stage": name, "seconds": round(seconds, 4)} for name, seconds in startup_stages],
+            "tasks": {name: {"state": info["state"], "wait_seconds": info["wait_seconds"],
+                             "duration_seconds": info["duration_seconds"]} for name, info in tasks.items()}}
+
+
+def not_ready_response(names):
+    """(body, status, headers) for a request that arrived before ``names`` were ready."""
+    snapshot = lifecycle.snapshot(names)
+    failed = {name: info["error"] for name, info in snapshot.items() if info["state"] == "failed"}
+    if failed:
+        return {"error": "Data failed to load.", "failed": failed}, 503, {}
+    return ({"error": "Data is still loading, retry shortly.", "status": snapshot}, 503,
+            {"Retry-After": str(Config.STARTUP_RETRY_AFTER)})
+
+
+def requires_ready(*names):
+    """Hold a view until the startup tasks ``names`` are ready.
+
+    Schedules them if they have not been requested yet (on-demand warm-up), waits up to
+    STARTUP_REQUEST_WAIT seconds, then answers 503 (with Retry-After while
+    still loading) instead of reading files that are being written.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if lifecycle.started:
+                lifecycle.request(names)
+                if not lifecycle.wait(names, Config.STARTUP_REQUEST_WAIT):
+                    body, status, headers = not_ready_response(names)
+                    return jsonify(body), status, headers
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _event(snapshot):
+    return f"event: status\ndata: {json.dumps(snapshot)}\n\n"
+
+
+def status_stream(names=None):
+    """Server-Sent Events: the status of ``names`` on every change, until all of them have finished."""
+    def generate():
+        generation = None
+        while True:
+            current = lifecycle.generation
+            if current != generation:
+                generation = current
+                snapshot = lifecycle.snapshot(names)
+                yield _event(snapshot)
+                if all(info["state"] in TERMINAL_STATES for info in snapshot.values()):
+                    return
+            elif lifecycle.wait_for_change(generation, Config.STARTUP_SSE_KEEPALIVE) == generation:
+                yield ": keep-alive\n\n"
+
+    response = Response(stream_with_context(generate()), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+def requested_tasks():
+    # ?tasks=tabular,image -> ["tabular", "image"]; all tasks when absent
+    tasks = request.args.get("tasks")
+    return [name for name in tasks.split(",") if name] if tasks else None
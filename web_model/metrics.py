@@ -0,0 +1,240 @@
+import bisect
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter as StackCounter
+from contextlib import contextmanager
+
+from flask import Response, g, has_request_context, request
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets (seconds) shared by every histogram
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in values)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, exposed with Prometheus semantics."""
+
+    def __init__(self, name, help, labelnames, buckets=BUCKETS):
+        self.name, self.help, self.labelnames, self.buckets = name, help, tuple(labelnames), tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect.bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((values, list(counts)) for values, counts in self._series.items())
+        for values, counts in series:
+            cumulative = 0
+            for bound, count in zip([*self.buckets, "+Inf"], counts[:-1]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels((*self.labelnames, 'le'), (*values, bound))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, values)} {counts[-1]}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, values)} {cumulative}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help, labelnames):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def expose(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter",
+                *(f"{self.name}{_labels(self.labelnames, labels)} {value}" for labels, value in values)]
+
+
+request_seconds = Histogram("web_model_request_duration_seconds", "Request latency by endpoint and status.",
+                            ["endpoint", "method", "status"])
+stage_seconds = Histogram("web_model_stage_duration_seconds", "Time spent in each stage of a request.",
+                          ["endpoint", "stage"])
+requests_started = Counter("web_model_requests_started_total", "Requests started, by endpoint.", ["endpoint"])
+
+
+@contextmanager
+def span(stage):
+    """Time a stage of the current request (load, filter, sort, slice, format, serialize...).
+
+    Recorded in the per-endpoint stage histogram and in the response's Server-Timing header.
+    Outside a request it only runs the block.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if has_request_context():
+            elapsed = time.perf_counter() - started
+            stage_seconds.observe(elapsed, request.endpoint or "unknown", stage)
+            spans = g.get("metrics_spans")
+            if spans is not None:
+                spans.append((stage, elapsed))
+
+
+def _gauge(name, help, samples, kind="gauge"):
+    # samples: [(labelnames, labelvalues, value)]
+    return [f"# HELP {name} {help}", f"# TYPE {name} {kind}",
+            *(f"{name}{_labels(names, values)} {value}" for names, values, value in samples)]
+
+
+def _component_metrics():
+    # Counters kept by the caches, dataset registry, heavy pool, event writers and startup tasks
+    from . import event_log, offload
+    from .data_registry import registry
+    from .image_cache import image_cache
+    from .lifecycle import lifecycle
+    from .result_cache import result_cache
+
+    lines = []
+    caches = [("image", image_cache.stats())]
+    if result_cache is not None:
+        caches.append(("result", result_cache.stats()))
+    for key, kind in [("hits", "counter"), ("misses", "counter"), ("evictions", "counter"), ("bytes", "gauge")]:
+        lines += _gauge(f"web_model_cache_{key}" + ("_total" if kind == "counter" else ""), f"Cache {key}.",
+                        [(["cache"], [name], stats.get(key, 0)) for name, stats in caches], kind)
+
+    datasets = registry.stats()
+    for key, help in [("requests", "Dataset lookups (cache hits + loads)."), ("loads", "Dataset (re)loads and index builds."),
+                      ("load_seconds", "Time spent loading datasets and building indexes.")]:
+        lines += _gauge(f"web_model_dataset_{key}_total", help,
+                        [(["dataset"], [name], stats[key]) for name, stats in sorted(datasets.items())], "counter")
+
+    stats = offload.pool_stats()
+    if stats is not None:
+        lines += _gauge("web_model_heavy_pool_completed_total", "Jobs run on the heavy pool.",
+                        [([], [], stats["completed"])], "counter")
+        lines += _gauge("web_model_heavy_pool_rejected_total", "Jobs rejected because the pool was full.",
+                        [([], [], stats["rejected"])], "counter")
+
+    writers = event_log.writer_stats()
+    for key in ["written", "rejected", "failed"]:
+        lines += _gauge(f"web_model_events_{key}_total", f"Events {key}.",
+                        [(["stream"], [stream], stats[key]) for stream, stats in sorted(writers.items())], "counter")
+
+    if lifecycle.started:
+        lines += _gauge("web_model_dataset_ready", "1 once the startup task has loaded its datasets.",
+                        [(["task"], [name], int(info["state"] == "ready"))
+                         for name, info in lifecycle.snapshot().items()])
+    return lines
+
+
+def render_metrics():
+    """Prometheus text exposition (format 0.0.4) of this process's metrics."""
+    lines = [*request_seconds.expose(), *stage_seconds.expose(), *requests_started.expose(),
+             *_component_metrics()]
+    return "\n".join(lines) + "\n"
+
+
+def metrics_response():
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+
+class SamplingProfiler:
+    """Samples one thread's Python stack every ``interval`` seconds.
+
+    ``folded()`` returns collapsed stacks ("outer;inner;leaf count" per line), the input of
+    flamegraph.pl, speedscope and similar tools.
+    """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = StackCounter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def folded(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+def profiling_requested():
+    return has_request_context() and g.get("metrics_profiler") is not None
+
+
+def init_app(app):
+    """Time every request, add a Server-Timing header and serve ?profile=1 stack dumps.
+
+    Profiling is available when REQUEST_PROFILING is set or the app runs in debug mode.
+    """
+    @app.before_request
+    def start_request_timer():
+        g.metrics_started = time.perf_counter()
+        g.metrics_spans = []
+        requests_started.inc(request.endpoint or "unknown")
+        if request.args.get("profile") == "1" and (Config.REQUEST_PROFILING or app.debug):
+            g.metrics_profiler = SamplingProfiler(threading.get_ident(), Config.REQUEST_PROFILE_INTERVAL).start()
+
+    @app.after_request
+    def record_request(response):
+        started = g.get("metrics_started")
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        request_seconds.observe(elapsed, request.endpoint or "unknown", request.method, str(response.status_code))
+
+        timings = [f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in g.get("metrics_spans", [])]
+        response.headers["Server-Timing"] = ", ".join([*timings, f"total;dur={elapsed * 1000:.2f}"])
+
+        profiler = g.pop("metrics_profiler", None)
+        if profiler is not None:
+            profiler.stop()
+            logger.info("Profiled %s: %d samples in %.1f ms", request.path, sum(profiler.samples.values()),
+                        elapsed * 1000)
+            profiled = Response(profiler.folded(), mimetype="text/plain")
+            profiled.headers["X-Profile-Samples"] = str(sum(profiler.samples.values()))
+            profiled.headers["X-Profiled-Status"] = str(response.status_code)
+            profiled.headers["Server-Timing"] = response.headers["Server-Timing"]
+            return profiled
+        return response
+
+    @app.teardown_request
+    def stop_profiler(error=None):
+        # after_request is skipped when the view raised; never leave a sampler running
+        profiler = g.pop("metrics_profiler", None)
+        if profiler is not None:
+            profiler.stop()
@@ -0,0 +1,85 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """Groups concurrent single-item requests into one batched call.
+
+    ``batch_fn`` receives a list of items and returns a list of results in
+    the same order (a batch with any other number of results fails every item in it).
+    A batch is sent as soon as ``max_batch_size`` items are
+    waiting or ``max_wait_ms`` has passed since its first item arrived, so a
+    lone request waits at most ``max_wait_ms`` extra.
+    """
+
+    def __init__(self, batch_fn, max_batch_size=16, max_wait_ms=10, name="micro-batcher"):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.batches = self.items = 0
+        self._queue = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        if self._closed:
+            raise RuntimeError("MicroBatcher is closed.")
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item, timeout=None):
+        return self.submit(item).result(timeout=timeout)
+
+    def close(self):
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    def stats(self):
+        return {"batches": self.batches, "items": self.items,
+                "mean_batch_size": self.items / self.batches if self.batches else 0.0}
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                pending = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if pending is None:
+                self._queue.put(None)  # handle shutdown after this batch
+                break
+            batch.append(pending)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            batch = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                results = list(self.batch_fn([item for item, _ in batch]))
+                if len(results) != len(batch):
+                    # Never leave a caller waiting on a future that no result will resolve
+                    raise RuntimeError(f"batch_fn returned {len(results)} results for {len(batch)} items.")
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+            self.batches += 1
+            self.items += len(batch)
@@ -0,0 +1,163 @@
+import argparse
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import torch
+from torch.ao.quantization import get_default_qconfig_mapping, quantize_dynamic
+from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+from config import Config
+from . import imageRL
+
+VARIANTS = ("fp32", "fused", "int8", "int8_dynamic")
+INPUT_SHAPE = (3, 224, 224)
+
+
+def artifact_path(variant, model_path=imageRL.MODEL_PATH):
+    # cnn5layer_multi_label.pth -> cnn5layer_multi_label.<variant>.pt (TorchScript)
+    return f"{os.path.splitext(model_path)[0]}.{variant}.pt"
+
+
+def calibration_batches(npz_path=imageRL.TEST_NPZ, n_images=None, batch_size=None):
+    """Preprocessed batches from the first n_images of the test archive."""
+    n_images = n_images or Config.IMAGE_QUANT_CALIBRATION_IMAGES
+    batch_size = batch_size or Config.IMAGE_INFERENCE_BATCH_SIZE
+    dataset = imageRL.NPZImageDataset(npz_path, transform=imageRL.default_transform)
+    n_images = min(n_images, len(dataset))
+    for start in range(0, n_images, batch_size):
+        yield torch.stack([dataset[i] for i in range(start, min(start + batch_size, n_images))])
+
+
+def _freeze(model):
+    # Trace + freeze (weights become constants). optimize_for_inference, which fuses conv/relu for
+    # the CPU backend, produces graphs that cannot be serialized, so it runs after loading instead.
+    example = torch.randn(1, *INPUT_SHAPE)
+    with torch.no_grad():
+        return torch.jit.freeze(torch.jit.trace(model, example).eval())
+
+
+def export_variant(variant, model_path=imageRL.MODEL_PATH, npz_path=imageRL.TEST_NPZ):
+    """Build one optimized inference artifact from the fp32 weights and save it as TorchScript."""
+    if variant not in VARIANTS or variant == "fp32":
+        raise ValueError(f"Unknown export variant '{variant}'. Choose from {VARIANTS[1:]}.")
+    model = imageRL.load_model(model_path)
+
+    if variant == "int8":
+        # Static post-training quantization; FX fuses each conv + relu before observing
+        torch.backends.quantized.engine = Config.IMAGE_QUANT_ENGINE
+        example = (torch.randn(1, *INPUT_SHAPE),)
+        prepared = prepare_fx(model, get_default_qconfig_mapping(Config.IMAGE_QUANT_ENGINE), example)
+        with torch.no_grad():
+            for batch in calibration_batches(npz_path):
+                prepared(batch)
+        model = convert_fx(prepared)
+        with torch.no_grad():
+            scripted = torch.jit.freeze(torch.jit.trace(model, example[0]).eval())
+    elif variant == "int8_dynamic":
+        # Dynamic quantization of the 512*7*7 -> num_classes head; convs stay fp32 and fused
+        torch.backends.quantized.engine = Config.IMAGE_QUANT_ENGINE
+        model = quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        with torch.no_grad():
+            scripted = torch.jit.freeze(torch.jit.trace(model, torch.randn(1, *INPUT_SHAPE)).eval())
+    else:
+        scripted = _freeze(model)
+
+    path = artifact_path(variant, model_path)
+    torch.jit.save(scripted, path + ".tmp")
+    os.replace(path + ".tmp", path)
+    return path
+
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+def after_fork():
+    global _models_lock
+    _models_lock = threading.Lock()
+
+
+def load_inference_model(variant=None, model_path=imageRL.MODEL_PATH):
+    """Model used by the prediction paths: eager fp32, or an exported artifact (exported on first use
+    and again whenever the fp32 weights are newer than it). Cached per variant."""
+    variant = variant or Config.IMAGE_MODEL_VARIANT
+    if variant == "fp32":
+        return imageRL.load_model(model_path)
+    if variant not in VARIANTS:
+        raise ValueError(f"Unknown model variant '{variant}'. Choose from {VARIANTS}.")
+
+    with _models_lock:
+        path = artifact_path(variant, model_path)
+        stale = not os.path.exists(path) or os.stat(path).st_mtime_ns < os.stat(model_path).st_mtime_ns
+        if stale:
+            export_variant(variant, model_path)
+        key = (variant, path, os.stat(path).st_mtime_ns)
+        if key not in _models:
+            if variant.startswith("int8"):
+                torch.backends.quantized.engine = Config.IMAGE_QUANT_ENGINE
+            model = torch.jit.load(path, map_location="cpu").eval()
+            if variant == "fused":
+                model = torch.jit.optimize_for_inference(model)
+            _models[key] = model
+        return _models[key]
+
+
+def benchmark(variants=VARIANTS, n_images=None, batch_size=None, repeats=3, model_path=imageRL.MODEL_PATH,
+              npz_path=imageRL.TEST_NPZ):
+    """Latency per batch, throughput and label agreement with fp32 for each variant."""
+    batches = list(calibration_batches(npz_path, n_images=n_images, batch_size=batch_size))
+    n_total = sum(len(batch) for batch in batches)
+    reference = None
+    report = {}
+
+    for variant in ("fp32",) + tuple(v for v in variants if v != "fp32"):
+        model = load_inference_model(variant, model_path)
+        with torch.inference_mode():
+            model(batches[0])  # warm-up (TorchScript profiling runs, oneDNN primitive creation)
+            latencies, outputs = [], []
+            for _ in range(repeats):
+                outputs = []
+                for batch in batches:
+                    start = time.perf_counter()
+                    outputs.append(torch.sigmoid(model(batch)))
+                    latencies.append(time.perf_counter() - start)
+        scores = torch.cat(outputs).numpy()
+        if reference is None:
+            reference = scores
+
+        report[variant] = {
+            "latency_ms_p50": float(np.percentile(latencies, 50) * 1000),
+            "latency_ms_p95": float(np.percentile(latencies, 95) * 1000),
+            "images_per_sec": float(n_total * repeats / sum(latencies)),
+            "top1_agreement": float((scores.argmax(axis=1) == reference.argmax(axis=1)).mean()),
+            "label_agreement": float(((scores >= Config.IMAGE_PREDICT_THRESHOLD)
+                                      == (reference >= Config.IMAGE_PREDICT_THRESHOLD)).mean()),
+            "max_abs_score_diff": float(np.abs(scores - reference).max()),
+        }
+    return {"n_images": n_total, "batch_size": len(batches[0]), "variants": report}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export optimized CNN5Layer inference artifacts and benchmark them.")
+    parser.add_argument("--variants", nargs="+", default=list(VARIANTS[1:]), choices=VARIANTS[1:])
+    parser.add_argument("--benchmark", action="store_true", help="report latency/throughput/agreement vs fp32")
+    parser.add_argument("--images", type=int, default=None, help="images used for the benchmark")
+    parser.add_argument("--output", default=None, help="write the benchmark report as JSON to this path")
+    args = parser.parse_args()
+
+    for variant in args.variants:
+        print(f"Exported {variant}: {export_variant(variant)}")
+
+    if args.benchmark:
+        report = benchmark(args.variants, n_images=args.images)
+        print(json.dumps(report, indent=2))
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import os
+import tempfile
+import time
+
+import numpy as np
+from joblib import Parallel, delayed, parallel_config
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+from sklearn.model_selection import ParameterGrid
+from sklearn.svm import LinearSVC
+
+from config import Config
+
+MODELS = {
+    "LogisticRegression": LogisticRegression,
+    "SGDClassifier": SGDClassifier,
+    "LinearSVC": LinearSVC,
+    "RandomForestClassifier": RandomForestClassifier,
+}
+
+
+def expand_candidates(candidates):
+    """[{"model": name, "params": {...}, "grid": {param: [values]}}, ...] -> [(name, params), ...]"""
+    expanded = []
+    for candidate in candidates:
+        if candidate["model"] not in MODELS:
+            raise ValueError(f"Unknown model '{candidate['model']}'. Choose from {sorted(MODELS)}.")
+        for point in ParameterGrid(candidate.get("grid", {})):
+            expanded.append((candidate["model"], {**candidate.get("params", {}), **point}))
+    return expanded
+
+
+def _fit_candidate(model_name, model_params, X_train_path, y_train, X_val_path, y_val):
+    # Runs in a worker: the matrices are memory-mapped from disk, so they are shared through the
+    # page cache instead of being pickled to every process
+    X_train = np.load(X_train_path, mmap_mode="r")
+    X_val = np.load(X_val_path, mmap_mode="r")
+    model = MODELS[model_name](**model_params)
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - start
+    return model, {"model": model_name, "params": model_params, "fit_seconds": fit_seconds,
+                   "val_score": float(model.score(X_val, y_val))}
+
+
+def run_sweep(X_train, y_train, X_val, y_val, candidates, n_jobs=None):
+    """Fit every candidate in parallel and return (best_model, results).
+
+    ``results`` has one entry per candidate (model, params, fit_seconds, val_score);
+    the best is the highest validation accuracy, ties going to the earlier candidate.
+    """
+    expanded = expand_candidates(candidates)
+    n_jobs = n_jobs or Config.TABULAR_SWEEP_N_JOBS
+    with tempfile.TemporaryDirectory(prefix="tabular-sweep-") as work_dir:
+        X_train_path = os.path.join(work_dir, "X_train.npy")
+        X_val_path = os.path.join(work_dir, "X_val.npy")
+        np.save(X_train_path, X_train)
+        np.save(X_val_path, X_val)
+
+        # One BLAS/OpenMP thread per worker so n_jobs processes do not oversubscribe the cores
+        with parallel_config(backend="loky", inner_max_num_threads=1):
+            fitted = Parallel(n_jobs=n_jobs)(
+                delayed(_fit_candidate)(name, params, X_train_path, y_train, X_val_path, y_val)
+                for name, params in expanded)
+
+    results = [result for _, result in fitted]
+    best = max(range(len(results)), key=lambda i: (results[i]["val_score"], -i))
+    for i, result in enumerate(results):
+        result["best"] = i == best
+    return fitted[best][0], results
@@ -0,0 +1,81 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from config import Config
+
+
+class PoolBusy(RuntimeError):
+    """Every worker is busy and the backlog is full."""
+
+
+class HeavyPool:
+    """Bounded thread pool for CPU-heavy request work (image encoding, similarity search, decoding).
+
+    At most ``max_workers`` jobs run at once and ``max_pending`` more may wait, so heavy requests
+    cannot take every server thread; beyond that ``run`` waits ``queue_timeout`` seconds for a
+    slot and raises PoolBusy. NumPy, PIL and torch release the GIL, so the jobs run in parallel.
+    """
+
+    def __init__(self, max_workers, max_pending, queue_timeout, name="heavy"):
+        self.max_workers = max_workers
+        self.queue_timeout = queue_timeout
+        self.completed = self.rejected = 0
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+
+    def run(self, fn, *args, **kwargs):
+        # fn(*args, **kwargs) on a pool thread; the calling request thread waits for the result
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            self.rejected += 1
+            raise PoolBusy("The server is busy, retry shortly.")
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(self._done)
+        return future.result()
+
+    def _done(self, future):
+        self.completed += 1
+        self._slots.release()
+
+    def stats(self):
+        return {"workers": self.max_workers, "completed": self.completed, "rejected": self.rejected}
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def heavy_pool():
+    """The process's HeavyPool, or None when HEAVY_POOL_WORKERS is 0; recreated in forked workers."""
+    global _pool
+    if not Config.HEAVY_POOL_WORKERS:
+        return None
+    with _pool_lock:
+        if _pool is None or _pool.pid != os.getpid():
+            _pool = HeavyPool(Config.HEAVY_POOL_WORKERS, Config.HEAVY_POOL_MAX_PENDING,
+                              Config.HEAVY_POOL_QUEUE_TIMEOUT)
+            _pool.pid = os.getpid()
+        return _pool
+
+
+def pool_stats():
+    # Stats of this process's pool, None until it has been created
+    pool = _pool
+    return pool.stats() if pool is not None and pool.pid == os.getpid() else None
+
+
+def offload(fn, *args, **kwargs):
+    """Run ``fn`` on the heavy pool (inline when it is disabled). Raises PoolBusy."""
+    pool = heavy_pool()
+    if pool is None:
+        return fn(*args, **kwargs)
+    return pool.run(fn, *args, **kwargs)
+
+
+def busy_response(error):
+    # (body, status, headers) for PoolBusy
+    return {"error": str(error)}, 503, {"Retry-After": "1"}
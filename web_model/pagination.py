@@ -0,0 +1,121 @@
+import base64
+import hashlib
+import json
+
+from flask import Response, request, stream_with_context
+
+from config import Config
+from .data_registry import registry
+from .serialization import dumps
+
+
+class PaginationError(ValueError):
+    """Paging parameters that cannot be resolved (answered with 400)."""
+
+
+class CursorError(PaginationError):
+    """Malformed cursor, or one issued for a different query."""
+
+
+class StaleCursorError(CursorError):
+    """Cursor issued for an older version of the dataset."""
+
+
+def dataset_version(names):
+    return "+".join(str(registry.version(name)) for name in names)
+
+
+def request_value(name, default=None):
+    # POST requests carry their parameters in the JSON body, with the query string as fallback
+    if request.method == "POST":
+        body = request.get_json(silent=True) or {}
+        if name in body:
+            return body[name]
+    return request.args.get(name, default)
+
+
+def _scope_digest(scope):
+    return hashlib.blake2b(json.dumps(scope, sort_keys=True, default=str).encode(), digest_size=8).hexdigest()
+
+
+def encode_cursor(scope, version, offset):
+    """Opaque token for "continue ``scope`` (the query) at ``offset`` of dataset ``version``"."""
+    payload = json.dumps({"s": _scope_digest(scope), "v": version, "o": int(offset)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, scope, version):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        offset, cursor_scope, cursor_version = int(payload["o"]), payload["s"], payload["v"]
+    except (ValueError, KeyError, TypeError):
+        raise CursorError("Invalid cursor.") from None
+    if cursor_scope != _scope_digest(scope) or offset < 0:
+        raise CursorError("The cursor does not belong to this query.")
+    if cursor_version != version:
+        raise StaleCursorError("The dataset has changed since this cursor was issued; start again from the first page.")
+    return offset
+
+
+def parse_per_page(value):
+    """?per_page= as an int in 1..MAX_PER_PAGE (larger values are capped). Raises PaginationError."""
+    try:
+        per_page = int(value)
+    except (TypeError, ValueError):
+        raise PaginationError("per_page must be a number.") from None
+    if per_page < 1:
+        raise PaginationError("per_page must be at least 1.")
+    return min(per_page, Config.MAX_PER_PAGE)
+
+
+def paginate(total, per_page, scope, version, params=None):
+    """Resolve ?cursor= (or ?page=) into (start, end, info).
+
+    ``params`` (a mapping) replaces the request as the source of cursor/page, e.g. for batch sub-queries.
+    ``info`` holds the paging fields of the response: total_results, total_pages,
+    current_page, per_page and next_cursor (None on the last page). ``per_page`` may be the raw
+    parameter. Raises PaginationError (CursorError for a bad cursor).
+    """
+    per_page = parse_per_page(per_page)
+    get = request_value if params is None else params.get
+    cursor = get("cursor")
+    if cursor:
+        start = decode_cursor(cursor, scope, version)
+    else:
+        try:
+            page = int(get("page", 1))
+        except (TypeError, ValueError):
+            raise PaginationError("page must be a number.") from None
+        if page < 1:
+            raise PaginationError("page must be at least 1.")
+        start = (page - 1) * per_page
+    end = start + per_page
+    info = {"total_results": total,
+            "total_pages": (total // per_page) + (1 if total % per_page > 0 else 0),
+            "current_page": start // per_page + 1,
+            "per_page": per_page,
+            "next_cursor": encode_cursor(scope, version, end) if end < total else None}
+    return start, end, info
+
+
+def cursor_error(error):
+    # (body, status) for a PaginationError: 410 Gone once the dataset has moved on, 400 for anything else
+    return {"error": str(error)}, 410 if isinstance(error, StaleCursorError) else 400
+
+
+def row_blocks(rows, block_rows=None):
+    # Consecutive slices of a row-position array, EXPORT_BLOCK_ROWS at a time
+    block_rows = block_rows or Config.EXPORT_BLOCK_ROWS
+    for start in range(0, len(rows), block_rows):
+        yield rows[start:start + block_rows]
+
+
+def ndjson_response(blocks, version):
+    """Stream records as NDJSON. ``blocks`` yields lists of row dicts; only one block is held at a time."""
+    def generate():
+        for records in blocks:
+            yield b"".join(dumps(record) for record in records)
+
+    response = Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+    response.headers["X-Dataset-Version"] = version
+    return response
@@ -1,84 +1,110 @@
 from flask import render_template, request, jsonify
-import numpy as np
-import os
 from . import query_bp
-from .. import trainingRL
+from ..data_registry import registry, data_path
+from ..class_index import ClassIndex
+from ..pagination import (PaginationError, cursor_error, dataset_version, ndjson_response, paginate,
+                          request_value, row_blocks)
+from ..lifecycle import lifecycle, requires_ready
+from ..metrics import span
+from ..result_cache import cached_response
+from ..serialization import LAYOUTS, encode_rows, json_response, request_layout
+
+X_test_path = data_path("X_test.npy")
+y_pred_path = data_path("y_pred.npy")
+registry.register("X_test", X_test_path)
+registry.register("y_pred", y_pred_path)
+registry.derive("y_pred_class_index", ["y_pred"], ClassIndex.from_labels)
 
 @query_bp.route('/check_status', methods=['GET'])
 def check_status():
-    # Returns whether the table data has been loaded.
-    print(f"return prediction_done: {trainingRL.prediction_done}")
-    return jsonify({"prediction_done": trainingRL.prediction_done})
+    # Returns whether the table data has been loaded (prefer the /status/stream events).
+    return jsonify({"prediction_done": lifecycle.is_ready("tabular"), "state": lifecycle.state("tabular")})
 
 # Search screen (Home page)
 @query_bp.route('/tabular_data', methods=['GET'])
 def index():
     return render_template('query_form.html')
 
-# Query API (supports GET & POST)
-@query_bp.route('/tabular_data/query', methods=['GET', 'POST'])
-def query():
-    # Get category value
-    if request.method == "POST":
-        category = request.json.get("class_value")
-        page = request.json.get("page", 1)  # Default is Page 1
-        per_page = request.json.get("per_page", 10)  # Default display is 10 records per page
-    else:
-        category = request.args.get("class_value")
-        page = int(request.args.get("page", 1))  # Default is Page 1
-        per_page = int(request.args.get("per_page", 10))  # Default display is 10 records per page
-
-
+def query_page(category, per_page, layout="records", params=None):
+    # One page of a class as (body, status); shared by query() and the batch API
     try:
         category = int(category)
         if category not in range(0, 5):  # Limit 0~4
-            return jsonify({"error": "Please enter a valid class value (0 to 4)."}), 400
+            return {"error": "Please enter a valid class value (0 to 4)."}, 400
     except (TypeError, ValueError):
-        return jsonify({"error": "The class value must be a number."}), 400
+        return {"error": "The class value must be a number."}, 400
 
     try:
-        # Get the file path
-        base_path = os.path.dirname(os.path.abspath(__file__))
-        X_test_path = os.path.join(base_path, "..", "X_test.npy")
-        y_pred_path = os.path.join(base_path, "..", "y_pred.npy")
-
-        # Loading File
-        X_test_loaded = np.load(X_test_path)
-        y_pred_loaded = np.load(y_pred_path)
+        with span("load"):
+            version = dataset_version(["X_test", "y_pred"])
+            # Shared in-memory copies (loaded once, reloaded when the files change)
+            X_test_loaded = registry.get("X_test")
+            class_index = registry.get("y_pred_class_index")
 
-        # Get the index that meets the conditions
-        matched_indices = np.where(y_pred_loaded == category)[0]
-
-        # Query Filter
-        filtered_results = X_test_loaded[y_pred_loaded == category]
-        total_results = len(filtered_results)  # Total data quantity
+        # Query Filter (precomputed class -> row index)
+        with span("filter"):
+            total_results = class_index.count(category)  # Total data quantity
 
         if total_results == 0:
-            return jsonify({"error": f"No data found for class {category}."}), 404
+            return {"error": f"No data found for class {category}."}, 404
         
-        # Calculate the paging range
-        start_idx = (page - 1) * per_page
-        end_idx = start_idx + per_page
-        paginated_results = filtered_results[start_idx:end_idx]
-        paginated_indices = matched_indices[start_idx:end_idx]  # Get the corresponding index
-
-        # Add index and use OrderedDict to ensure that Feature 1 ~ Feature N are in the correct order
-        from collections import OrderedDict
-        formatted_results = [
-            OrderedDict(
-                {"Index": int(idx), **{f"Feature {i+1}": value for i, value in enumerate(row)}}
-            )
-            for idx, row in zip(paginated_indices, paginated_results)
-        ]
-
-        return jsonify({
+        # Calculate the paging range (?page= or the opaque ?cursor= of the previous page)
+        with span("slice"):
+            start_idx, end_idx, page_info = paginate(total_results, per_page, ("tabular", category), version, params)
+            paginated_indices = class_index.page(category, start_idx, end_idx)  # Get the corresponding index
+            paginated_results = X_test_loaded[paginated_indices]
+
+        # Add index and Feature 1 ~ Feature N, converted column-wise
+        with span("format"):
+            names = ["Index"] + [f"Feature {i+1}" for i in range(X_test_loaded.shape[1])]
+            formatted_results = encode_rows(names, [paginated_indices, *paginated_results.T], layout)
+
+        return {
             "category": category,
-            "total_results": total_results,
-            "total_pages": (total_results // per_page) + (1 if total_results % per_page > 0 else 0),
-            "current_page": page,
-            "per_page": per_page,
+            **page_info,
             "results": formatted_results
-        })
+        }, 200
+
+    except PaginationError as e:
+        return cursor_error(e)
+    except FileNotFoundError as e:
+        return {"error": f"File not found: {str(e)}. Please confirm that the file exists at {X_test_path}."}, 500
 
+# Query API (supports GET & POST)
+@query_bp.route('/tabular_data/query', methods=['GET', 'POST'])
+@requires_ready("tabular")
+@cached_response(["X_test", "y_pred"])
+def query():
+    # Get category value (JSON body for POST, query string for GET)
+    category = request_value("class_value")
+    per_page = request_value("per_page", 10)  # Default display is 10 records per page (checked by paginate)
+
+    layout = request_layout()
+    if layout is None:
+        return jsonify({"error": f"layout must be one of {list(LAYOUTS)}."}), 400
+
+    return json_response(*query_page(category, per_page, layout))
+
+# Export API: every row of a class as NDJSON, streamed block by block
+@query_bp.route('/tabular_data/export', methods=['GET'])
+@requires_ready("tabular")
+def export():
+    try:
+        category = int(request.args.get("class_value"))
+        if category not in range(0, 5):  # Limit 0~4
+            return jsonify({"error": "Please enter a valid class value (0 to 4)."}), 400
+    except (TypeError, ValueError):
+        return jsonify({"error": "The class value must be a number."}), 400
+
+    try:
+        version = dataset_version(["X_test", "y_pred"])
+        X_test_loaded = registry.get("X_test")
+        class_index = registry.get("y_pred_class_index")
     except FileNotFoundError as e:
         return jsonify({"error": f"File not found: {str(e)}. Please confirm that the file exists at {X_test_path}."}), 500
+
+    names = ["Index"] + [f"Feature {i+1}" for i in range(X_test_loaded.shape[1])]
+    def blocks():
+        for indices in row_blocks(class_index.rows(category)):
+            yield encode_rows(names, [indices, *X_test_loaded[indices].T])
+    return ndjson_response(blocks(), version)
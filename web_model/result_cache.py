@@ -0,0 +1,199 @@
+import functools
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask import Response, make_response, request
+
+from config import Config
+from .data_registry import data_path, registry
+from .metrics import profiling_requested
+
+
+def make_key(endpoint, params, versions):
+    return hashlib.blake2b(json.dumps([endpoint, params, versions], sort_keys=True, default=str).encode(),
+                           digest_size=16).hexdigest()
+
+
+class MemoryResultCache:
+    """Per-process LRU of encoded responses, bounded by a byte budget; entries expire after ``ttl`` seconds."""
+
+    def __init__(self, max_bytes, ttl):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.current_bytes = 0
+        self.hits = self.misses = self.evictions = self.expirations = 0
+        self._items = OrderedDict()  # key -> (data, expires_at)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and item[1] <= time.monotonic():
+                del self._items[key]
+                self.current_bytes -= len(item[0])
+                self.expirations += 1
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.current_bytes -= len(old[0])
+            self._items[key] = (data, time.monotonic() + self.ttl)
+            self.current_bytes += len(data)
+            while self.current_bytes > self.max_bytes:
+                _, (evicted, _) = self._items.popitem(last=False)
+                self.current_bytes -= len(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {"backend": "memory", "entries": len(self._items), "bytes": self.current_bytes,
+                    "max_bytes": self.max_bytes, "hits": self.hits, "misses": self.misses,
+                    "evictions": self.evictions, "expirations": self.expirations}
+
+
+class SQLiteResultCache:
+    """The same cache in a local SQLite file (WAL mode), shared by every worker process on the host.
+
+    Recency is the last access time, so the LRU order and the byte budget are global;
+    hit/miss/eviction counters are per process.
+    """
+
+    def __init__(self, path, max_bytes, ttl):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = self.misses = self.evictions = self.expirations = 0
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, data BLOB NOT NULL, "
+                         "size INTEGER NOT NULL, expires_at REAL NOT NULL, used_at REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS results_used_at ON results (used_at)")
+
+    def _connection(self):
+        # One connection per thread (and per process: a forked child opens its own)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, key):
+        conn = self._connection()
+        now = time.time()
+        row = conn.execute("SELECT data, expires_at FROM results WHERE key = ?", (key,)).fetchone()
+        if row is not None and row[1] <= now:
+            conn.execute("DELETE FROM results WHERE key = ?", (key,))
+            self.expirations += 1
+            row = None
+        if row is None:
+            self.misses += 1
+            return None
+        conn.execute("UPDATE results SET used_at = ? WHERE key = ?", (now, key))
+        self.hits += 1
+        return bytes(row[0])
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        conn = self._connection()
+        now = time.time()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("INSERT OR REPLACE INTO results (key, data, size, expires_at, used_at) VALUES (?, ?, ?, ?, ?)",
+                         (key, data, len(data), now + self.ttl, now))
+            excess = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0] - self.max_bytes
+            if excess > 0:
+                # Least recently used first, until the budget holds again
+                evicted = []
+                for evict_key, size in conn.execute("SELECT key, size FROM results ORDER BY used_at"):
+                    if excess <= 0:
+                        break
+                    evicted.append((evict_key,))
+                    excess -= size
+                conn.executemany("DELETE FROM results WHERE key = ?", evicted)
+                self.evictions += len(evicted)
+
+    def clear(self):
+        self._connection().execute("DELETE FROM results")
+
+    def stats(self):
+        entries, size = self._connection().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        return {"backend": "sqlite", "entries": entries, "bytes": size, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "expirations": self.expirations}
+
+
+def create_result_cache(backend=None):
+    backend = backend if backend is not None else Config.RESULT_CACHE_BACKEND
+    if not backend:
+        return None
+    if backend == "memory":
+        return MemoryResultCache(Config.RESULT_CACHE_MAX_BYTES, Config.RESULT_CACHE_TTL)
+    if backend == "sqlite":
+        return SQLiteResultCache(data_path(Config.RESULT_CACHE_SQLITE_PATH), Config.RESULT_CACHE_MAX_BYTES,
+                                 Config.RESULT_CACHE_TTL)
+    raise ValueError(f"Unknown RESULT_CACHE_BACKEND '{backend}'. Choose from 'memory', 'sqlite' or None.")
+
+
+result_cache = create_result_cache()
+
+
+def _request_params():
+    # Normalized request: method, sorted query string and the JSON body (key order does not matter)
+    return [request.method, sorted(request.args.items(multi=True)), request.get_json(silent=True)]
+
+
+def cached_response(datasets):
+    """Serve a JSON view from the result cache.
+
+    ``datasets`` (names, or a callable returning names) are the registry entries the view reads;
+    their versions are part of the key, so a reloaded dataset never serves stale results.
+    Only 200 JSON responses are stored. Responses carry X-Cache: HIT or MISS.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if result_cache is None or profiling_requested():
+                return view(*args, **kwargs)  # a profiled request always runs the view
+            try:
+                names = datasets() if callable(datasets) else datasets
+                versions = [registry.version(name) for name in names]
+            except FileNotFoundError:
+                return view(*args, **kwargs)  # not available yet; the view reports it
+
+            key = make_key(request.endpoint, _request_params(), versions)
+            data = result_cache.get(key)
+            if data is not None:
+                response = Response(data, mimetype="application/json")
+                response.headers["X-Cache"] = "HIT"
+                return response
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200 and response.mimetype == "application/json":
+                result_cache.put(key, response.get_data())
+            response.headers["X-Cache"] = "MISS"
+            return response
+        return wrapper
+    return decorator
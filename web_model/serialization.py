@@ -0,0 +1,52 @@
+import json
+
+import numpy as np
+from flask import Response, request
+
+from .metrics import span
+
+try:
+    import orjson
+except ImportError:  # optional; the standard library encoder is used instead
+    orjson = None
+
+LAYOUTS = ("records", "columns")
+
+
+def _default(value):
+    # Standard-library fallback for what orjson handles natively
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(obj):
+    """JSON bytes with sorted keys (same key order as jsonify), NumPy arrays and scalars included."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_SORT_KEYS
+                            | orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(obj, default=_default, sort_keys=True, separators=(",", ":")) + "\n").encode()
+
+
+def json_response(obj, status=200):
+    with span("serialize"):
+        data = dumps(obj)
+    return Response(data, status=status, mimetype="application/json")
+
+
+def request_layout():
+    """'records' (list of objects, the default) or 'columns' from the ?layout= parameter; None if invalid."""
+    layout = request.args.get("layout", "records")
+    return layout if layout in LAYOUTS else None
+
+
+def encode_rows(names, columns, layout="records"):
+    """Rows built column-wise: each column (array or Series) is converted to Python values in one
+    call, then zipped. 'records' gives [{name: value, ...}, ...];
+    'columns' gives {"columns": names, "rows": [[value, ...], ...]}."""
+    values = [np.asarray(column).tolist() for column in columns]
+    if layout == "columns":
+        return {"columns": list(names), "rows": list(zip(*values))}
+    return [dict(zip(names, row)) for row in zip(*values)]
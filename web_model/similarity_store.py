@@ -0,0 +1,126 @@
+import argparse
+import json
+import os
+
+import numpy as np
+
+from config import Config
+from .data_registry import data_path
+
+
+def store_paths(prefix):
+    # <prefix>_neighbors.npy (int32, N x K) and <prefix>_scores.npy (float16, N x K)
+    return f"{prefix}_neighbors.npy", f"{prefix}_scores.npy"
+
+
+def meta_path(prefix):
+    # <prefix>_meta.json: the K and the source matrix (size, mtime) the store was built from
+    return f"{prefix}_meta.json"
+
+
+def load_mmap(path):
+    return np.load(path, mmap_mode="r")
+
+
+def build_topk_store(sim_matrix_path, prefix, k=Config.TEXT_TOPK_NEIGHBORS, block_size=1024):
+    """Keep only the top-k neighbours of every row of a dense N x N similarity matrix.
+
+    The dense matrix is memory-mapped and processed ``block_size`` rows at a
+    time, so building never needs the whole matrix in RAM. Each output row is
+    sorted by descending score and never contains the row itself.
+    """
+    source = os.stat(sim_matrix_path)
+    sim_matrix = np.load(sim_matrix_path, mmap_mode="r")
+    n_rows = sim_matrix.shape[0]
+    requested_k, k = k, max(0, min(k, n_rows - 1))
+
+    neighbors_path, scores_path = store_paths(prefix)
+    tmp_neighbors, tmp_scores = neighbors_path + ".tmp.npy", scores_path + ".tmp.npy"
+    neighbors = np.lib.format.open_memmap(tmp_neighbors, mode="w+", dtype=np.int32, shape=(n_rows, k))
+    scores = np.lib.format.open_memmap(tmp_scores, mode="w+", dtype=np.float16, shape=(n_rows, k))
+
+    for start in range(0, n_rows, block_size):
+        stop = min(start + block_size, n_rows)
+        block = np.array(sim_matrix[start:stop], dtype=np.float32)
+        rows = np.arange(stop - start)
+        block[rows, rows + start] = -np.inf  # exclude the query itself
+
+        if k == 0:
+            continue
+        top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(block, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        neighbors[start:stop] = np.take_along_axis(top, order, axis=1)
+        scores[start:stop] = np.take_along_axis(top_scores, order, axis=1)
+
+    neighbors.flush()
+    scores.flush()
+    del neighbors, scores
+
+    # Swap the finished files in so readers never see a half-written store
+    os.replace(tmp_neighbors, neighbors_path)
+    os.replace(tmp_scores, scores_path)
+
+    # Written last: a store without a matching sidecar is rebuilt
+    meta = {"k": requested_k, "n_rows": n_rows, "source": {"size": source.st_size, "mtime_ns": source.st_mtime_ns}}
+    tmp_meta = meta_path(prefix) + ".tmp"
+    with open(tmp_meta, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp_meta, meta_path(prefix))
+    return neighbors_path, scores_path
+
+
+def is_current(prefix, sim_matrix_path, k):
+    # Current when built with the same K from the matrix as it is now
+    if not all(os.path.exists(path) for path in (*store_paths(prefix), meta_path(prefix))):
+        return False
+    with open(meta_path(prefix)) as f:
+        meta = json.load(f)
+    stat = os.stat(sim_matrix_path)
+    return meta["k"] == k and (meta["source"]["size"], meta["source"]["mtime_ns"]) == (stat.st_size, stat.st_mtime_ns)
+
+
+class TopKSimilarityStore:
+    """Read side of the top-k store; both arrays are memory-mapped (registered with load_mmap)."""
+
+    def __init__(self, neighbors, scores):
+        self.neighbors = neighbors
+        self.scores = scores
+
+    def __len__(self):
+        return self.neighbors.shape[0]
+
+    def find_similar(self, row, threshold=None, limit=None):
+        # O(K): one row of neighbours, already sorted by descending score
+        return self.find_similar_many([row], threshold, limit)[0]
+
+    def find_similar_many(self, rows, threshold=None, limit=None):
+        # One gather of the requested rows; returns [(neighbors, scores), ...]
+        rows = np.asarray(rows, dtype=np.int64)
+        all_neighbors = np.asarray(self.neighbors[rows])
+        all_scores = np.asarray(self.scores[rows], dtype=np.float32)
+        results = []
+        for neighbors, scores in zip(all_neighbors, all_scores):
+            if threshold is not None:
+                keep = scores > threshold
+                neighbors, scores = neighbors[keep], scores[keep]
+            if limit is not None:
+                neighbors, scores = neighbors[:limit], scores[:limit]
+            results.append((neighbors, scores))
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the top-k text similarity store from a dense similarity matrix.")
+    parser.add_argument("--matrix", default=data_path(Config.TEXT_SIMILARITY_FILENAME), help="dense N x N .npy similarity matrix")
+    parser.add_argument("--prefix", default=data_path(Config.TEXT_TOPK_PREFIX), help="output path prefix")
+    parser.add_argument("--k", type=int, default=Config.TEXT_TOPK_NEIGHBORS, help="neighbours kept per row")
+    parser.add_argument("--block-size", type=int, default=1024, help="rows processed at a time")
+    args = parser.parse_args()
+
+    for path in build_topk_store(args.matrix, args.prefix, k=args.k, block_size=args.block_size):
+        print(f"Wrote {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import argparse
+import os
+
+import numpy as np
+
+from config import Config
+from .data_registry import data_path
+from .vector_index import ExactIndex
+
+
+def normalize(vectors):
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def save_embeddings(vectors, path, dtype=None, block_size=65536):
+    """Write L2-normalized sentence embeddings as a plain .npy that can be memory-mapped."""
+    dtype = np.dtype(dtype or Config.TEXT_EMBEDDING_DTYPE)
+    tmp_path = path + ".tmp.npy"
+    out = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=dtype, shape=np.shape(vectors))
+    for start in range(0, len(vectors), block_size):
+        out[start:start + block_size] = normalize(vectors[start:start + block_size])
+    out.flush()
+    del out
+    os.replace(tmp_path, path)
+    return path
+
+
+def append_embeddings(path, new_vectors, block_size=65536):
+    """Add rows for new utterances; costs one O(N*d) copy, no similarity rebuild."""
+    existing = np.load(path, mmap_mode="r")
+    new_vectors = normalize(new_vectors)
+    if new_vectors.shape[1] != existing.shape[1]:
+        raise ValueError(f"Embedding size {new_vectors.shape[1]} does not match stored size {existing.shape[1]}.")
+
+    n_rows = len(existing)
+    tmp_path = path + ".tmp.npy"
+    out = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=existing.dtype,
+                                    shape=(n_rows + len(new_vectors), existing.shape[1]))
+    for start in range(0, n_rows, block_size):
+        stop = min(start + block_size, n_rows)
+        out[start:stop] = existing[start:stop]
+    out[n_rows:] = new_vectors
+    out.flush()
+    del out, existing
+    os.replace(tmp_path, path)
+    return n_rows  # index of the first appended row
+
+
+class EmbeddingSimilarityIndex:
+    """Cosine top-k over memory-mapped normalized embeddings (blocked matrix-vector products)."""
+
+    def __init__(self, embeddings, block_size=None):
+        self.embeddings = embeddings
+        self.index = ExactIndex(embeddings, metric="ip", block_size=block_size)
+
+    @classmethod
+    def open(cls, path):
+        return cls(np.load(path, mmap_mode="r"))
+
+    def __len__(self):
+        return len(self.embeddings)
+
+    def search_vector(self, vector, k):
+        # Neighbours of an arbitrary (not necessarily stored) embedding
+        ids, distances = self.index.search(normalize(vector), k)
+        return ids[0], -distances[0]
+
+    def find_similar(self, row, threshold=None, limit=None):
+        # Same contract as TopKSimilarityStore.find_similar: excludes the row itself
+        return self.find_similar_many([row], threshold, limit)[0]
+
+    def find_similar_many(self, rows, threshold=None, limit=None):
+        # One blocked matrix-matrix product answers every row; returns [(neighbors, scores), ...]
+        rows = np.asarray(rows, dtype=np.int64)
+        k = len(self) if limit is None else limit + 1
+        ids, distances = self.index.search(normalize(np.asarray(self.embeddings[rows], dtype=np.float32)), k)
+        results = []
+        for row, neighbors, scores in zip(rows, ids, -distances):
+            keep = neighbors != row
+            if threshold is not None:
+                keep &= scores > threshold
+            neighbors, scores = neighbors[keep], scores[keep]
+            if limit is not None:
+                neighbors, scores = neighbors[:limit], scores[:limit]
+            results.append((neighbors, scores))
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Store (or append) normalized text embeddings for similarity search.")
+    parser.add_argument("vectors", help=".npy file with one embedding per utterance")
+    parser.add_argument("--out", default=data_path(Config.TEXT_EMBEDDING_FILENAME), help="embedding store path")
+    parser.add_argument("--append", action="store_true", help="append to the existing store instead of replacing it")
+    args = parser.parse_args()
+
+    vectors = np.load(args.vectors, mmap_mode="r")
+    if args.append:
+        first = append_embeddings(args.out, vectors)
+        print(f"Appended {len(vectors)} embeddings to {args.out} starting at index {first}")
+    else:
+        save_embeddings(vectors, args.out)
+        print(f"Wrote {len(vectors)} embeddings to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,22 @@
-import datetime
 from flask import render_template, request, jsonify
 from . import text_query_bp
-import pandas as pd
 import numpy as np
 import os
-import json, csv
-from config import Config, LoggerConfig
+from config import Config
+from ..data_registry import registry, data_path
+from ..class_index import ClassIndex
+from ..similarity_store import TopKSimilarityStore, build_topk_store, is_current, load_mmap, store_paths
+from ..text_embeddings import EmbeddingSimilarityIndex
+from ..text_search import InvertedIndex
+from ..event_log import get_event_writer
+from ..offload import PoolBusy, busy_response, offload
+from ..pagination import (PaginationError, cursor_error, dataset_version, ndjson_response, paginate,
+                          request_value, row_blocks)
+from ..lifecycle import lifecycle, requires_ready
+from ..metrics import span
+from ..result_cache import cached_response
+from ..serialization import LAYOUTS, encode_rows, json_response, request_layout
+import threading
 import logging 
 
 EXPERIMENT_GROUP = Config.EXPERIMENT_GROUP
@@ -21,60 +32,100 @@ SIMILARITY_THRESHOLD = Config.TEXT_SIMILARITY_THRESHOLD
 
 DEFAULT_PER_PAGE = Config.DEFAULT_PER_PAGE
 
-filename = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S") + ".log"
-filepath = os.path.join(LoggerConfig.basepath, filename)
-
-logging.basicConfig(filename=filepath,
-                    encoding=LoggerConfig.encoding,
-                    filemode=LoggerConfig.filemode,
-                    format=LoggerConfig.format,
-                    style=LoggerConfig.style,
-                    datefmt=LoggerConfig.datefmt,
-                    level=LoggerConfig.level
-                )
+# Experiment log handler: configured by create_app (web_model.configure_logging)
+logger = logging.getLogger(__name__)
 
 @text_query_bp.route('/check_status', methods=['GET'])
 def check_status():
-    # Returns whether the table data has been loaded.
-    print(f"return prediction_done: True")
-    return jsonify({"prediction_done": True})
-
-def load_text_data():
+    # Returns whether the text data has been loaded (prefer the /status/stream events).
+    return jsonify({"prediction_done": lifecycle.is_ready("text"), "state": lifecycle.state("text")})
+
+TEXT_STORE_PREFIX = data_path(Config.TEXT_STORE_PREFIX)
+
+def read_text_data(text_data_path):
+    # Ranked frame from the columnar text store; the CSV is only parsed and re-ranked
+    # when it or RLA_SELECTED_TEXTS has changed since the store was built (pandas is imported here)
+    from ..text_store import load_text_data as load_ranked_text_data
+    return load_ranked_text_data(text_data_path, TEXT_STORE_PREFIX, SELECTED, EXPERIMENT_GROUP)
+
+registry.register("text_data", data_path(DATA_FILE), read_text_data)
+
+TOPK_PREFIX = data_path(Config.TEXT_TOPK_PREFIX)
+TOPK_NEIGHBORS_PATH, TOPK_SCORES_PATH = store_paths(TOPK_PREFIX)
+# Both arrays are watched, so replacing either one reloads the store
+registry.register("text_topk_neighbors", TOPK_NEIGHBORS_PATH, load_mmap, preload=False)
+registry.register("text_topk_scores", TOPK_SCORES_PATH, load_mmap, preload=False)
+registry.derive("text_topk", ["text_topk_neighbors", "text_topk_scores"], TopKSimilarityStore)
+_topk_build_lock = threading.Lock()
+_topk_checked = None  # (matrix size, mtime, K) the store was last found current for
+
+EMBEDDING_PATH = data_path(Config.TEXT_EMBEDDING_FILENAME)
+registry.register("text_embeddings", EMBEDDING_PATH, EmbeddingSimilarityIndex.open)
+
+def similarity_store_name():
+    # Embedding search answers any stored row without precomputed similarities.
+    # The top-k store is brought up to date first, so its registry version (and the
+    # result-cache keys built from it) follow the dense matrix and TEXT_TOPK_NEIGHBORS
+    if Config.TEXT_SIMILARITY_BACKEND == "embeddings" and os.path.exists(EMBEDDING_PATH):
+        return "text_embeddings"
+    ensure_topk_store()
+    return "text_topk"
+
+def load_similarity_store():
+    return registry.get(similarity_store_name())
+
+def ensure_topk_store():
+    # (Re)build the top-k store when it is missing, or the dense matrix or TEXT_TOPK_NEIGHBORS has
+    # changed since it was built; the sidecar is only read when the matrix stat or K differs
+    global _topk_checked
+    matrix_path = data_path(SIMILARITY_FILE)
     try:
-        # Get the file path
-        base_path = os.path.dirname(os.path.abspath(__file__))
-        text_data_path = os.path.join(base_path, "..", DATA_FILE)
-
-        # Load snips_text_data.csv
-        text_data_df = pd.read_csv(text_data_path, index_col=0)
-
-        ### sort according to the index
-        # text_data_df.sort_index(inplace=True) #by=text_data_df.columns[0],
-
-        if EXPERIMENT_GROUP:
-            # Create a Series mapping index to rank (1-based)
-            rank_map = {idx: i+1 for i, idx in enumerate(SELECTED)}
-
-            # Assign priority_rank using the rank_map; others get NaN
-            text_data_df['priority_rank'] = text_data_df.index.map(rank_map)
-
-            # Sort by priority_rank: selected rows go to top in correct order
-            # NaNs (non-selected) will be placed at the end
-            text_data_df = text_data_df.sort_values(by='priority_rank', na_position='last')
-
-            # Set featured flag for RLA selected texts
-            text_data_df.loc[SELECTED, "featured"] = True
+        stat = os.stat(matrix_path)
+    except FileNotFoundError:
+        return  # nothing to build from: serve the existing store
+    k = Config.TEXT_TOPK_NEIGHBORS
+    key = (stat.st_size, stat.st_mtime_ns, k)
+    if key == _topk_checked and os.path.exists(TOPK_NEIGHBORS_PATH):
+        return
+    with _topk_build_lock:
+        if not is_current(TOPK_PREFIX, matrix_path, k):
+            logger.info("Building the top-%d similarity store from %s", k, matrix_path)
+            build_topk_store(matrix_path, TOPK_PREFIX, k=k)
+            # Picked up now rather than after the next DATASET_RECHECK_SECONDS stat
+            registry.invalidate("text_topk_neighbors")
+            registry.invalidate("text_topk_scores")
+        _topk_checked = key
+
+def after_fork():
+    global _topk_build_lock
+    _topk_build_lock = threading.Lock()
+
+def build_text_class_index(text_data_df):
+    # Row positions (in ranked order) per model-assigned label; unknown labels map to -1
+    label2id = {label: i for i, label in snips_id2label.items()}
+    codes = text_data_df['model-assigned label'].map(label2id).fillna(-1).to_numpy(dtype=np.int64)
+    return ClassIndex.from_labels(codes, n_classes=Config.N_TEXT_CLASSES)
+
+registry.derive("text_class_index", ["text_data"], build_text_class_index)
+registry.derive("text_search_index", ["text_data"], lambda text_data_df: InvertedIndex.build(text_data_df['utterance']))
+
+# Output names of the first five frame columns, in order
+TEXT_RESULT_FIELDS = ["Text", "Human-assigned Label", "Model-assigned Label", "Explanation", "featured"]
+
+def format_text_results(page_df, layout):
+    columns = [page_df.index.to_numpy()] + [page_df.iloc[:, i].to_numpy() for i in range(len(TEXT_RESULT_FIELDS))]
+    return encode_rows(["Index", *TEXT_RESULT_FIELDS], columns, layout)
 
-        return text_data_df
-    
-    except FileNotFoundError as e:
-        return jsonify({"error": f"File not found: {str(e)}. Please confirm that the file exists at {DATA_FILE}."}), 500
+def load_text_data():
+    # Shared ranked frame, parsed once and reloaded when the CSV changes.
+    # Callers must treat it as read-only (copy before modifying).
+    return registry.get("text_data")
 
 @text_query_bp.route('/click_data', methods=['POST'])
 def click_data():
-    log_file = filepath
-    with open(log_file, "a") as f:
-        f.write(json.dumps(request.json) + "\n")
+    # Queued for the background writer; a full queue pushes back instead of blocking on disk
+    if not get_event_writer("clicks").submit(request.json):
+        return jsonify({"error": "Too many events, retry shortly."}), 503, {"Retry-After": "1"}
     return jsonify({"success": True}), 200
 
 @text_query_bp.route('/text_data', methods=['GET'])
@@ -83,16 +134,16 @@ def index():
 
 # Query API (supports GET & POST)
 @text_query_bp.route('/text_data/query', methods=['GET', 'POST'])
+@requires_ready("text")
+@cached_response(["text_data"])
 def query():
-    # Get category value
-    if request.method == "POST":
-        category = request.json.get("class_value")
-        page = request.json.get("page", 1)  # Default is Page 1
-        per_page = int(request.args.get("per_page", DEFAULT_PER_PAGE))   
-    else:
-        category = request.args.get("class_value")
-        page = int(request.args.get("page", 1))  # Default is Page 1
-        per_page = int(request.args.get("per_page", DEFAULT_PER_PAGE))  
+    # Get category value (JSON body for POST, query string for GET)
+    category = request_value("class_value")
+    per_page = request_value("per_page", DEFAULT_PER_PAGE)
+
+    layout = request_layout()
+    if layout is None:
+        return jsonify({"error": f"layout must be one of {list(LAYOUTS)}."}), 400
 
     try:
         category = int(category)
@@ -103,118 +154,149 @@ def query():
         return jsonify({"error": "The class value must be a number."}), 400
 
     try:
-        text_data_df = load_text_data()
+        with span("load"):
+            version = dataset_version(["text_data"])
+            text_data_df = load_text_data()
+            class_index = registry.get("text_class_index")
 
-        # Get the data that meets the conditions
-        matched_indices = text_data_df.loc[text_data_df['model-assigned label'] == snips_id2label[category], :] # column ['utterance', 'explanation', 'model-assigned label', 'human-assigned label']
-        
-        # Query Filter
-        total_results = len(matched_indices)
+        # Query Filter (precomputed label -> row positions)
+        with span("filter"):
+            total_results = class_index.count(category)
 
         if total_results == 0:
             return jsonify({"error": f"No data found for class {category}."}), 404
         
-        # Calculate the paging range
-        start_idx = (page - 1) * per_page
-        end_idx = start_idx + per_page
-        paginated_results = matched_indices[start_idx:end_idx]  # Get the corresponding data
-
-        # Formatting data (text index)
-        from collections import OrderedDict
-        formatted_results = [
-            OrderedDict(
-                {"Index": int(idx), "Text": row.iloc[0], "Human-assigned Label": row.iloc[1] , "Model-assigned Label": row.iloc[2], "Explanation": row.iloc[3], "featured": row.iloc[4]}
-            )
-            for idx, row in paginated_results.iterrows()
-        ]
-
-        return jsonify({
+        # Calculate the paging range (?page= or the opaque ?cursor= of the previous page)
+        with span("slice"):
+            start_idx, end_idx, page_info = paginate(total_results, per_page, ("text", category), version)
+            paginated_results = text_data_df.iloc[class_index.page(category, start_idx, end_idx)]  # Get the corresponding data
+
+        # Formatting data (text index), column-wise
+        with span("format"):
+            formatted_results = format_text_results(paginated_results, layout)
+
+        return json_response({
             "category": category,
-            "total_results": total_results,
-            "total_pages": (total_results // per_page) + (1 if total_results % per_page > 0 else 0),
-            "current_page": page,
-            "per_page": per_page,
+            **page_info,
             "results": formatted_results
         })
 
+    except PaginationError as e:
+        return cursor_error(e)
     except FileNotFoundError as e:
         return jsonify({"error": f"File not found: {str(e)}. Please confirm that the file exists at {DATA_FILE}."}), 500
 
 
-@text_query_bp.route('text_data/find_similar', methods=['GET'])
-def find_similar_texts():
+# Export API: every text of a class as NDJSON, streamed block by block
+@text_query_bp.route('/text_data/export', methods=['GET'])
+@requires_ready("text")
+def export():
     try:
-        # Parse input parameters
-        text_index = request.args.get("index")
-        page = int(request.args.get("page", 1))  # Default is Page 1
-        per_page = int(request.args.get("per_page", DEFAULT_PER_PAGE))  
+        category = int(request.args.get("class_value"))
+        if category not in range(0, 7):  # Limit 0~7
+            return jsonify({"error": "Please enter a valid class value (0 to 6)."}), 400
+    except (TypeError, ValueError):
+        return jsonify({"error": "The class value must be a number."}), 400
 
-        if text_index is None:
-            return jsonify({"error": "Missing text index parameter"}), 400
+    try:
+        version = dataset_version(["text_data"])
+        text_data_df = load_text_data()
+        class_index = registry.get("text_class_index")
+    except FileNotFoundError as e:
+        return jsonify({"error": f"File not found: {str(e)}. Please confirm that the file exists at {DATA_FILE}."}), 500
 
-        text_index = int(text_index)
+    blocks = (format_text_results(text_data_df.iloc[rows], "records") for rows in row_blocks(class_index.rows(category)))
+    return ndjson_response(blocks, version)
 
-        # Read X_test.npy (text embeddings)
-        base_path = os.path.dirname(os.path.abspath(__file__))
-        sim_mat_path = os.path.join(base_path, "..", SIMILARITY_FILE)
 
-        sim_mat_loaded = np.load(sim_mat_path)  
+def similar_texts(queries, layout="records"):
+    """(body, status) for each (text_index, per_page, params) query; ``params`` supplies page/cursor
+    (None: the request). The neighbours of every query come from one find_similar_many call."""
+    with span("load"):
+        # Embedding index or top-k neighbour store (both memory-mapped)
+        similarity_store = load_similarity_store()
+        version = dataset_version(["text_data", similarity_store_name()])
 
         # Load text_data.csv file
         text_data_df = load_text_data()
 
-        if text_index < 0 or text_index >= len(text_data_df):
-            return jsonify({"error": "Text index out of range"}), 404
-
-        # Get similarities
-        similarities = sim_mat_loaded[text_index]
-
-        # Get all the most similar texts (excluding yourself)
-        similar_indices = np.extract(similarities > SIMILARITY_THRESHOLD, similarities)
-        
-        # Sort in order of high -> low similarity
-        sorted_indices = [int(idx) for idx in np.argsort(similar_indices)][-1::-1]
+    results, valid = [None] * len(queries), []
+    for i, (text_index, _, _) in enumerate(queries):
+        if text_index < 0 or text_index >= len(text_data_df) or text_index >= len(similarity_store):
+            results[i] = {"error": "Text index out of range"}, 404
+        else:
+            valid.append(i)
+    if not valid:
+        return results
+
+    # Get the most similar texts above the threshold (excluding yourself),
+    # sorted in order of high -> low similarity
+    with span("search"):
+        neighbours = offload(similarity_store.find_similar_many, [queries[i][0] for i in valid],
+                             threshold=SIMILARITY_THRESHOLD, limit=TOP_N)
+    for i, (similar_indices, _) in zip(valid, neighbours):
+        text_index, per_page, params = queries[i]
 
         # Filter data by similar indices
-        similar_texts = text_data_df.loc[sorted_indices, :] # columns=['utterance', 'human-assigned label', 'model-assigned label', 'explanation']
+        with span("filter"):
+            similar_texts = text_data_df.loc[similar_indices, :] # columns=['utterance', 'human-assigned label', 'model-assigned label', 'explanation']
 
         # Query Filter
         total_results = len(similar_texts)
 
         if total_results == 0:
-            return jsonify({"error": f"No similar text found for index {text_index}."}), 404
-        
-        # Limit the number of results to TOP_N
-        if total_results > TOP_N:
-            total_results = TOP_N
-            similar_texts = similar_texts.head(TOP_N)
+            results[i] = {"error": f"No similar text found for index {text_index}."}, 404
+            continue
         
         if EXPERIMENT_GROUP:
-            similar_texts.sort_values(by='featured', ascending=False, inplace=True)
+            with span("sort"):
+                similar_texts = similar_texts.sort_values(by='featured', ascending=False, kind='stable')
         
-        # Calculate the paging range
-        start_idx = (page - 1) * per_page
-        end_idx = start_idx + per_page
-        paginated_results = similar_texts[start_idx:end_idx]  # Get the corresponding data
-
-        # Formatting data (text index)
-        from collections import OrderedDict
-        formatted_results = [
-            OrderedDict(
-                {"Index": int(idx), "Text": row.iloc[0], "Human-assigned Label": row.iloc[1] , "Model-assigned Label": row.iloc[2], "Explanation": row.iloc[3], "featured": row.iloc[4]}
-            )
-            for idx, row in paginated_results.iterrows()
-        ]
-
-        return jsonify({
-            "query_index": text_index, 
-            "total_results": total_results,
-            "total_pages": (total_results // per_page) + (1 if total_results % per_page > 0 else 0),
-            "current_page": page,
-            "per_page": per_page,
+        # Calculate the paging range (?page= or the opaque ?cursor= of the previous page)
+        try:
+            start_idx, end_idx, page_info = paginate(total_results, per_page, ("similar_texts", text_index), version,
+                                                     params)
+        except PaginationError as e:
+            results[i] = cursor_error(e)
+            continue
+        with span("slice"):
+            paginated_results = similar_texts[start_idx:end_idx]  # Get the corresponding data
+
+        # Formatting data (text index), column-wise
+        with span("format"):
+            formatted_results = format_text_results(paginated_results, layout)
+
+        results[i] = {
+            "query_index": text_index,
+            **page_info,
             "similar_results": formatted_results
-        })
+        }, 200
+    return results
+
+@text_query_bp.route('text_data/find_similar', methods=['GET'])
+@requires_ready("text")
+@cached_response(lambda: ["text_data", similarity_store_name()])
+def find_similar_texts():
+    try:
+        # Parse input parameters
+        text_index = request.args.get("index")
+        per_page = request.args.get("per_page", DEFAULT_PER_PAGE)
+
+        if text_index is None:
+            return jsonify({"error": "Missing text index parameter"}), 400
 
+        layout = request_layout()
+        if layout is None:
+            return jsonify({"error": f"layout must be one of {list(LAYOUTS)}."}), 400
+
+        text_index = int(text_index)
+
+        (body, status), = similar_texts([(text_index, per_page, None)], layout)
+        return json_response(body, status)
+
+    except PoolBusy as e:
+        body, status, headers = busy_response(e)
+        return jsonify(body), status, headers
     except ValueError:
         return jsonify({"error": "Invalid text index"}), 400
     except FileNotFoundError:
@@ -223,55 +305,56 @@ def find_similar_texts():
         return jsonify({"error": f"Unexpected error: {str(e)}"}), 500
 
 @text_query_bp.route('text_data/find_keyword', methods=['GET'])
+@requires_ready("text")
+@cached_response(["text_data"])
 def find_keyword():
     try:
-        keyword = request.args.get("keyword").lower()
-        if keyword is None:
+        keyword = request.args.get("keyword")
+        if keyword is None or keyword.strip() == "":
             return jsonify({"error": "Missing keyword parameter"}), 400
 
         keyword = keyword.strip()
 
-        page = int(request.args.get("page", 1))  # Default is Page 1
-        per_page = int(request.args.get("per_page", DEFAULT_PER_PAGE))  
+        layout = request_layout()
+        if layout is None:
+            return jsonify({"error": f"layout must be one of {list(LAYOUTS)}."}), 400
 
-        text_data_df = load_text_data()
+        per_page = request.args.get("per_page", DEFAULT_PER_PAGE)
+
+        with span("load"):
+            version = dataset_version(["text_data"])
+            text_data_df = load_text_data()
+            search_index = registry.get("text_search_index")
 
-        # Get texts that contain the keyword
-        keyword_data = text_data_df.loc[text_data_df['utterance'].astype(str).str.contains(keyword, na=False), :] #columns=['utterance', 'human-assigned label', 'model-assigned label', 'explanation']
+        # Get texts that match the keyword query (terms, prefix*, OR, "phrases"), ranked by BM25;
+        # the last word also matches as a prefix, like the substring search it replaced
+        with span("search"):
+            matched_rows, _ = search_index.search(keyword, prefix_last=True)
 
         # Query Filter
-        total_results = len(keyword_data)
-        print(total_results)
+        total_results = len(matched_rows)
+        logger.debug("Keyword %r matched %d texts", keyword, total_results)
 
         if total_results == 0:
-            print("No data found containing keyword.")
             return jsonify({"error": f"No data found containing keyword {keyword}"}), 404
         
-        # Calculate the paging range
-        start_idx = (page - 1) * per_page
-        print(start_idx)
-        end_idx = start_idx + per_page
-        print(end_idx)
-        paginated_results = keyword_data[start_idx:end_idx]  # Get the corresponding data
-
-        # Formatting data (text index)
-        from collections import OrderedDict
-        formatted_results = [
-            OrderedDict(
-                {"Index": int(idx), "Text": row.iloc[0], "Human-assigned Label": row.iloc[1] , "Model-assigned Label": row.iloc[2], "Explanation": row.iloc[3], "featured": row.iloc[4]}
-            )
-            for idx, row in paginated_results.iterrows()
-        ]
-
-        return jsonify({
-            "query_word": keyword, 
-            "total_results": total_results,
-            "total_pages": (total_results // per_page) + (1 if total_results % per_page > 0 else 0),
-            "current_page": page,
-            "per_page": per_page,
+        # Calculate the paging range (?page= or the opaque ?cursor= of the previous page)
+        with span("slice"):
+            start_idx, end_idx, page_info = paginate(total_results, per_page, ("keyword", keyword), version)
+            paginated_results = text_data_df.iloc[matched_rows[start_idx:end_idx]]  # Get the corresponding data
+
+        # Formatting data (text index), column-wise
+        with span("format"):
+            formatted_results = format_text_results(paginated_results, layout)
+
+        return json_response({
+            "query_word": keyword.lower(),
+            **page_info,
             "results": formatted_results
         })
 
+    except PaginationError as e:
+        return cursor_error(e)
     except ValueError:
         return jsonify({"error": "Invalid text index"}), 400
     except FileNotFoundError:
@@ -288,16 +371,12 @@ def feedback():
         if feedback_data is None:
             return jsonify({"error": "Missing feedback parameter"}), 400
         
-        base_path = os.path.dirname(os.path.abspath(__file__))
-        feedback_path = os.path.join(base_path, "..", "feedback.csv")
-
         # clean feedback
         feedback_data = feedback_data.strip()
         feedback_data = feedback_data.replace("\n", " ")
 
-        with open(feedback_path, 'a') as f:
-            csv_writer = csv.writer(f)
-            csv_writer.writerow([timestamp, feedback_data])
+        if not get_event_writer("feedback").submit({"timestamp": timestamp, "feedback": feedback_data}):
+            return jsonify({"error": "Too many events, retry shortly."}), 503, {"Retry-After": "1"}
         
         return jsonify({"success": "Feedback submitted successfully."}), 200
     except Exception as e:
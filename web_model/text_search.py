@@ -0,0 +1,175 @@
+import bisect
+import re
+
+import numpy as np
+
+TOKEN_RE = re.compile(r"\w+")
+QUERY_RE = re.compile(r'"([^"]*)"|(\S+)')
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(str(text).lower())
+
+
+class _Matches:
+    # Sorted unique doc ids with their accumulated score
+    def __init__(self, docs, scores):
+        self.docs = docs
+        self.scores = scores
+
+    @classmethod
+    def empty(cls):
+        return cls(np.empty(0, dtype=np.int64), np.empty(0))
+
+    def and_(self, other):
+        docs, mine, theirs = np.intersect1d(self.docs, other.docs, assume_unique=True, return_indices=True)
+        return _Matches(docs, self.scores[mine] + other.scores[theirs])
+
+    def or_(self, other):
+        docs = np.union1d(self.docs, other.docs)
+        scores = np.zeros(len(docs))
+        scores[np.searchsorted(docs, self.docs)] += self.scores
+        scores[np.searchsorted(docs, other.docs)] += other.scores
+        return _Matches(docs, scores)
+
+
+class InvertedIndex:
+    """Token -> postings (doc, term frequency, positions) with BM25 ranking.
+
+    Doc ids are row positions in the frame the index was built from. Query
+    syntax: ``play music`` (AND), ``play OR music``, ``play*`` (prefix) and
+    ``"add to playlist"`` (phrase); AND binds tighter than OR. With ``prefix_last`` a bare
+    final word is a prefix too, so a partly typed ``pla`` still finds "play".
+    """
+
+    def __init__(self, terms, post_offsets, post_docs, post_tf, pos_offsets, positions, doc_lengths,
+                 k1=1.2, b=0.75):
+        self.terms = terms  # sorted, so prefixes are a contiguous range
+        self.term_ids = {term: i for i, term in enumerate(terms)}
+        self.post_offsets = post_offsets
+        self.post_docs = post_docs
+        self.post_tf = post_tf
+        self.pos_offsets = pos_offsets
+        self.positions = positions
+        self.doc_lengths = doc_lengths
+        self.avg_length = float(doc_lengths.mean()) if len(doc_lengths) else 0.0
+        self.k1 = k1
+        self.b = b
+
+    @classmethod
+    def build(cls, texts):
+        postings = {}
+        doc_lengths = []
+        for doc, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lengths.append(len(tokens))
+            for position, token in enumerate(tokens):
+                doc_positions = postings.setdefault(token, {})
+                doc_positions.setdefault(doc, []).append(position)
+
+        terms = sorted(postings)
+        post_offsets, post_docs, post_tf, pos_offsets, positions = [0], [], [], [0], []
+        for term in terms:
+            for doc, doc_positions in postings[term].items():  # docs were visited in ascending order
+                post_docs.append(doc)
+                post_tf.append(len(doc_positions))
+                positions.extend(doc_positions)
+                pos_offsets.append(len(positions))
+            post_offsets.append(len(post_docs))
+
+        return cls(terms,
+                   np.asarray(post_offsets, dtype=np.int64),
+                   np.asarray(post_docs, dtype=np.int64),
+                   np.asarray(post_tf, dtype=np.int32),
+                   np.asarray(pos_offsets, dtype=np.int64),
+                   np.asarray(positions, dtype=np.int32),
+                   np.asarray(doc_lengths, dtype=np.int32))
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def _scored_postings(self, lo, hi):
+        # (doc, BM25 score) of every posting of the terms lo..hi-1, which are contiguous
+        start, stop = self.post_offsets[lo], self.post_offsets[hi]
+        docs, tf = self.post_docs[start:stop], self.post_tf[start:stop]
+        term_doc_freq = np.diff(self.post_offsets[lo:hi + 1])
+        doc_freq = np.repeat(term_doc_freq, term_doc_freq)
+        idf = np.log(1 + (len(self.doc_lengths) - doc_freq + 0.5) / (doc_freq + 0.5))
+        norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[docs] / max(self.avg_length, 1e-9))
+        return docs, idf * tf * (self.k1 + 1) / (tf + norm)
+
+    def _term_matches(self, term_id):
+        return _Matches(*self._scored_postings(term_id, term_id + 1))
+
+    def _prefix_matches(self, prefix):
+        lo = bisect.bisect_left(self.terms, prefix)
+        hi = bisect.bisect_left(self.terms, prefix + "\U0010ffff")
+        if lo == hi:
+            return _Matches.empty()
+        # Sum the scores of all matching terms per doc in one pass over their postings
+        docs, scores = self._scored_postings(lo, hi)
+        docs, inverse = np.unique(docs, return_inverse=True)
+        return _Matches(docs, np.bincount(inverse, weights=scores, minlength=len(docs)))
+
+    def _positions(self, term_id, doc):
+        lo, hi = self.post_offsets[term_id], self.post_offsets[term_id + 1]
+        posting = lo + np.searchsorted(self.post_docs[lo:hi], doc)
+        return self.positions[self.pos_offsets[posting]:self.pos_offsets[posting + 1]]
+
+    def _phrase_matches(self, tokens):
+        term_ids = [self.term_ids.get(token) for token in tokens]
+        if not term_ids or None in term_ids:
+            return _Matches.empty()
+
+        matches = self._term_matches(term_ids[0])
+        for term_id in term_ids[1:]:
+            matches = matches.and_(self._term_matches(term_id))
+
+        # Keep docs where the terms appear at consecutive positions
+        keep = np.zeros(len(matches.docs), dtype=bool)
+        for i, doc in enumerate(matches.docs):
+            starts = self._positions(term_ids[0], doc)
+            for offset, term_id in enumerate(term_ids[1:], start=1):
+                starts = np.intersect1d(starts, self._positions(term_id, doc) - offset)
+            keep[i] = len(starts) > 0
+        return _Matches(matches.docs[keep], matches.scores[keep])
+
+    def _operand_matches(self, phrase, word):
+        if phrase is not None:
+            return self._phrase_matches(tokenize(phrase))
+        if word.endswith("*"):
+            tokens = tokenize(word[:-1])
+            return self._prefix_matches(tokens[0]) if len(tokens) == 1 else _Matches.empty()
+        tokens = tokenize(word)
+        if len(tokens) > 1:  # e.g. "don't" -> a phrase of its parts
+            return self._phrase_matches(tokens)
+        term_id = self.term_ids.get(tokens[0]) if tokens else None
+        return _Matches.empty() if term_id is None else self._term_matches(term_id)
+
+    def search(self, query, prefix_last=False):
+        """Return (doc ids, scores) ordered by descending BM25 score, ties by doc id."""
+        operands = QUERY_RE.findall(query)
+        if prefix_last and operands:
+            phrase, word = operands[-1]
+            if phrase == "" and word not in ("OR", "AND") and not word.endswith("*") and len(tokenize(word)) == 1:
+                operands[-1] = ("", word + "*")
+
+        result = None
+        clause = None
+        for phrase, word in operands:
+            if phrase == "" and word == "OR":
+                result = clause if result is None else (result if clause is None else result.or_(clause))
+                clause = None
+                continue
+            if phrase == "" and word == "AND":
+                continue
+            operand = self._operand_matches(phrase if word == "" else None, word)
+            clause = operand if clause is None else clause.and_(operand)
+
+        if clause is not None:
+            result = clause if result is None else result.or_(clause)
+        if result is None:
+            result = _Matches.empty()
+
+        order = np.lexsort((result.docs, -result.scores))
+        return result.docs[order], result.scores[order]
@@ -0,0 +1,150 @@
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from config import Config
+from .data_registry import data_path, file_digest
+
+
+def store_paths(prefix):
+    """Files of a text store: <prefix>.npz holds one array per column (numbers as-is, text as
+    int32 codes into an interned pool of its distinct values, kept as one UTF-8 blob + offsets).
+    <prefix>_meta.json describes the columns and what they were built from; it is written last."""
+    return {"meta": f"{prefix}_meta.json", "arrays": f"{prefix}.npz"}
+
+
+def rank_text_data(text_data_df, selected):
+    # Create a Series mapping index to rank (1-based)
+    rank_map = {idx: i+1 for i, idx in enumerate(selected)}
+
+    # Assign priority_rank using the rank_map; others get NaN
+    text_data_df['priority_rank'] = text_data_df.index.map(rank_map)
+
+    # Sort by priority_rank: selected rows go to top in correct order
+    # NaNs (non-selected) will be placed at the end
+    text_data_df = text_data_df.sort_values(by='priority_rank', na_position='last')
+
+    # Set featured flag for RLA selected texts
+    text_data_df.loc[selected, "featured"] = True
+    return text_data_df
+
+
+def _encode(values, key, arrays):
+    values = np.asarray(values)
+    if values.dtype != object:
+        arrays[key] = values
+        return {"kind": "values"}
+
+    codes, uniques = pd.factorize(values)  # missing values get code -1
+    arrays[key] = codes.astype(np.int32)
+    if all(isinstance(value, str) for value in uniques):
+        encoded = [value.encode("utf-8") for value in uniques]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        arrays[f"{key}_pool"] = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        arrays[f"{key}_offsets"] = offsets
+        return {"kind": "strings"}
+    # Mixed objects (e.g. True/NaN flags) are few distinct values; keep them in the meta
+    return {"kind": "pool", "pool": [value.item() if isinstance(value, np.generic) else value for value in uniques]}
+
+
+def _decode(spec, key, arrays):
+    if spec["kind"] == "values":
+        return arrays[key]
+    if spec["kind"] == "strings":
+        blob = arrays[f"{key}_pool"].tobytes()
+        offsets = arrays[f"{key}_offsets"].tolist()
+        pool = [blob[start:stop].decode("utf-8") for start, stop in zip(offsets[:-1], offsets[1:])]
+    else:
+        pool = spec["pool"]
+    # Every row shares the pool's string objects; code -1 picks the trailing NaN
+    lookup = np.empty(len(pool) + 1, dtype=object)
+    lookup[:-1] = pool
+    lookup[-1] = np.nan
+    return lookup[arrays[key]]
+
+
+def _source(csv_path):
+    stat = os.stat(csv_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "digest": file_digest(csv_path)}
+
+
+def _ranking(selected, experiment_group):
+    return {"experiment_group": bool(experiment_group), "selected": [int(idx) for idx in selected]}
+
+
+def build_text_store(csv_path, prefix, selected, experiment_group=True):
+    """Parse the CSV, apply the RLA ranking and write the prepared frame as a text store."""
+    paths = store_paths(prefix)
+    if os.path.exists(paths["meta"]):
+        os.remove(paths["meta"])  # an incomplete store is never opened
+
+    source = _source(csv_path)
+    text_data_df = pd.read_csv(csv_path, index_col=0)
+    if experiment_group:
+        text_data_df = rank_text_data(text_data_df, selected)
+
+    arrays = {}
+    meta = {"index": {"name": text_data_df.index.name, **_encode(text_data_df.index, "index", arrays)},
+            "columns": [{"name": column, **_encode(text_data_df[column], f"c{i}", arrays)}
+                        for i, column in enumerate(text_data_df.columns)],
+            "source": source,
+            "ranking": _ranking(selected, experiment_group)}
+
+    np.savez(paths["arrays"][:-len(".npz")] + ".tmp.npz", **arrays)
+    os.replace(paths["arrays"][:-len(".npz")] + ".tmp.npz", paths["arrays"])
+    with open(paths["meta"] + ".tmp", "w") as f:
+        json.dump(meta, f)
+    os.replace(paths["meta"] + ".tmp", paths["meta"])
+    return paths["meta"]
+
+
+def is_current(prefix, csv_path, selected, experiment_group=True):
+    # Current when built with the same ranking from the same CSV content
+    meta_path = store_paths(prefix)["meta"]
+    if not os.path.exists(meta_path):
+        return False
+    with open(meta_path) as f:
+        meta = json.load(f)
+    if meta["ranking"] != _ranking(selected, experiment_group):
+        return False
+    stat = os.stat(csv_path)
+    source = meta["source"]
+    if (stat.st_size, stat.st_mtime_ns) == (source["size"], source["mtime_ns"]):
+        return True
+    # Touched but possibly unchanged: only then is the CSV hashed
+    return stat.st_size == source["size"] and file_digest(csv_path) == source["digest"]
+
+
+def open_text_store(prefix):
+    """The prepared frame, rebuilt from the column arrays without parsing or ranking."""
+    paths = store_paths(prefix)
+    with open(paths["meta"]) as f:
+        meta = json.load(f)
+    with np.load(paths["arrays"]) as arrays:
+        index = pd.Index(_decode(meta["index"], "index", arrays), name=meta["index"]["name"])
+        return pd.DataFrame({column["name"]: _decode(column, f"c{i}", arrays)
+                             for i, column in enumerate(meta["columns"])}, index=index)
+
+
+def load_text_data(csv_path, prefix, selected, experiment_group=True):
+    if not is_current(prefix, csv_path, selected, experiment_group):
+        build_text_store(csv_path, prefix, selected, experiment_group)
+    return open_text_store(prefix)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the ranked SNIPS text store from the CSV.")
+    parser.add_argument("--csv", default=data_path(Config.TEXT_DATA_FILENAME))
+    parser.add_argument("--prefix", default=data_path(Config.TEXT_STORE_PREFIX))
+    args = parser.parse_args()
+
+    meta_path = build_text_store(args.csv, args.prefix, Config.RLA_SELECTED_TEXTS, Config.EXPERIMENT_GROUP)
+    print(f"Wrote text store {meta_path}")
+
+
+if __name__ == "__main__":
+    main()
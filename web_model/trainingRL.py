@@ -1,49 +1,270 @@
+import json
+import logging
+import os
+import shutil
+
 import numpy as np
 import pandas as pd
 
-import joblib  # for model saving
-
+from sklearn.linear_model import LogisticRegression, SGDClassifier
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
 
-prediction_done = False
+from config import Config
+from .artifact_store import ArtifactStore, file_hash
+from .data_registry import data_path
+from .model_sweep import run_sweep
+
+DATA_CSV = data_path("synthetic_dataset.csv")
+X_TEST_NPY = data_path("X_test.npy")
+Y_PRED_NPY = data_path("y_pred.npy")
+
+# Everything that changes the fitted artifacts; part of the artifact store key
+TABULAR_MODEL_PARAMS = {
+    "test_size": 0.4,
+    "random_state": 42,
+    "model": "LogisticRegression",
+    "model_params": {"max_iter": 1000, "multi_class": "ovr", "solver": "lbfgs", "random_state": 42},
+}
+
+# Streaming mode (TABULAR_TRAINING_MODE = 'streaming'); epochs and chunk_rows come from Config
+STREAMING_MODEL_PARAMS = {
+    "mode": "streaming",
+    "test_size": 0.4,
+    "random_state": 42,
+    "model": "SGDClassifier",
+    "model_params": {"loss": "log_loss", "random_state": 42},
+}
+
+logger = logging.getLogger(__name__)
+
+artifact_store = ArtifactStore(data_path(Config.TABULAR_ARTIFACT_DIR))
+
+def _copy_file(source, path):
+    # Streamed copy beside the target, then swapped in, so readers never load a half-written file
+    shutil.copyfile(source, path + ".tmp")
+    os.replace(path + ".tmp", path)
+
+
+def _file_signature(path):
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def current_params():
+    """Hyperparameters of the configured training mode (TABULAR_TRAINING_MODE)."""
+    if Config.TABULAR_TRAINING_MODE == "streaming":
+        return dict(STREAMING_MODEL_PARAMS, epochs=Config.TABULAR_STREAMING_EPOCHS,
+                    chunk_rows=Config.TABULAR_STREAMING_CHUNK_ROWS)
+    if Config.TABULAR_TRAINING_MODE == "batch":
+        if Config.TABULAR_SWEEP_CANDIDATES:
+            # JSON round trip so the params compare equal to the ones read back from a manifest
+            return {"test_size": TABULAR_MODEL_PARAMS["test_size"], "random_state": TABULAR_MODEL_PARAMS["random_state"],
+                    "sweep": json.loads(json.dumps(Config.TABULAR_SWEEP_CANDIDATES)),
+                    "validation_size": Config.TABULAR_VALIDATION_SIZE}
+        return TABULAR_MODEL_PARAMS
+    raise ValueError(f"Unknown TABULAR_TRAINING_MODE '{Config.TABULAR_TRAINING_MODE}'.")
 
-def train_model():
+
+def _publish(key, manifest):
+    # Copy the cached predictions to the paths the blueprints read, unless they are already there
+    published = dict(manifest.get("published", {}))
+    for name, path in (("X_test", X_TEST_NPY), ("y_pred", Y_PRED_NPY)):
+        if not os.path.exists(path) or published.get(name) != _file_signature(path):
+            _copy_file(artifact_store.array_path(key, name), path)
+            published[name] = _file_signature(path)
+    if manifest.get("published") != published:
+        manifest["published"] = published
+        artifact_store.update_manifest(key, manifest)
+
+
+def _fit_batch(csv_path, out_dir, params):
     # Load the dataset
-    df = pd.read_csv("web_model/synthetic_dataset.csv")
+    df = pd.read_csv(csv_path)
 
     # Separate features (X) and target labels (y)
     X = df.drop(columns=['Class']).values
     y = df['Class'].values
 
     # Split the dataset into training and testing sets
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.4, random_state=42)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=params["test_size"],
+                                                        random_state=params["random_state"])
 
     # Standardize the features (important for neural networks)
     scaler = StandardScaler()
     X_train = scaler.fit_transform(X_train)
     X_test = scaler.transform(X_test)
 
+    info = {"columns": list(df.columns), "n_rows": len(df), "n_scored": len(X_test)}
+    if params.get("sweep"):
+        # Hold out part of the training split and keep the candidate that scores best on it
+        X_fit, X_val, y_fit, y_val = train_test_split(X_train, y_train, test_size=params["validation_size"],
+                                                      random_state=params["random_state"])
+        model, info["sweep"] = run_sweep(X_fit, y_fit, X_val, y_val, params["sweep"])
+    else:
+        # Define the Logistic Regression model with a linear decision boundary
+        model = LogisticRegression(**params["model_params"])
 
-    from sklearn.linear_model import LogisticRegression
-
-    # Define the Logistic Regression model with a linear decision boundary
-    model = LogisticRegression(max_iter=1000, multi_class='ovr', solver='lbfgs', random_state=42)
-
-    # Train the model
-    model.fit(X_train, y_train)
+        # Train the model
+        model.fit(X_train, y_train)
 
     # Predict on the test set
     y_pred = model.predict(X_test)
 
-    # save data
-    np.save("web_model/X_test.npy", X_test)
-    np.save("web_model/y_pred.npy", y_pred)
+    np.save(os.path.join(out_dir, "X_test.npy"), X_test)
+    np.save(os.path.join(out_dir, "y_pred.npy"), y_pred)
+    return {"model": model, "scaler": scaler}, info
+
+
+def _feature_dtypes(columns, params):
+    # Streaming reads parse features straight to float32; batch mode keeps pandas' defaults
+    if params.get("mode") != "streaming":
+        return None
+    return {column: np.float32 for column in columns if column != 'Class'}
+
+
+def _stream_chunks(csv_path, columns, params):
+    # (X, y, is_test) per chunk. The train/test draw restarts from the same seed on every pass,
+    # so each pass over the file sees the same split without storing it.
+    rng = np.random.default_rng(params["random_state"])
+    for chunk in pd.read_csv(csv_path, dtype=_feature_dtypes(columns, params), chunksize=params["chunk_rows"]):
+        X = chunk.drop(columns=['Class']).to_numpy(dtype=np.float32)
+        y = chunk['Class'].to_numpy()
+        yield X, y, rng.random(len(chunk)) < params["test_size"]
+
+
+def _fit_streaming(csv_path, out_dir, params):
+    # Out-of-core training: only one chunk of rows is in memory at a time
+    columns = list(pd.read_csv(csv_path, nrows=0).columns)
+
+    # Pass 1: scaler statistics, split sizes and the set of classes
+    scaler = StandardScaler()
+    classes, n_rows, n_test = set(), 0, 0
+    for X, y, is_test in _stream_chunks(csv_path, columns, params):
+        if not is_test.all():
+            scaler.partial_fit(X[~is_test])
+        classes.update(np.unique(y).tolist())
+        n_rows += len(y)
+        n_test += int(is_test.sum())
+    if n_rows == n_test:
+        raise ValueError(f"{csv_path} has no training rows.")
+    classes = np.array(sorted(classes))
+
+    # Passes 2..epochs+1: incremental fit on the standardized training rows
+    model = SGDClassifier(**params["model_params"])
+    for _ in range(params["epochs"]):
+        for X, y, is_test in _stream_chunks(csv_path, columns, params):
+            if not is_test.all():
+                model.partial_fit(scaler.transform(X[~is_test]), y[~is_test], classes=classes)
+
+    # Last pass: score the test rows into preallocated memory-mapped outputs
+    X_out = np.lib.format.open_memmap(os.path.join(out_dir, "X_test.npy"), mode="w+", dtype=np.float32,
+                                      shape=(n_test, len(columns) - 1))
+    y_out = np.lib.format.open_memmap(os.path.join(out_dir, "y_pred.npy"), mode="w+", dtype=classes.dtype,
+                                      shape=(n_test,))
+    position = 0
+    for X, _, is_test in _stream_chunks(csv_path, columns, params):
+        X_test = scaler.transform(X[is_test])
+        X_out[position:position + len(X_test)] = X_test
+        y_out[position:position + len(X_test)] = model.predict(X_test)
+        position += len(X_test)
+    X_out.flush()
+    y_out.flush()
+    del X_out, y_out
+
+    return {"model": model, "scaler": scaler}, {"columns": columns, "n_rows": n_rows, "n_scored": n_test}
+
+
+def _fit(csv_path, csv_hash, csv_bytes, params):
+    key = artifact_store.make_key(params, csv_hash)
+    out_dir = artifact_store.begin(key)
+    fit = _fit_streaming if params.get("mode") == "streaming" else _fit_batch
+    objects, info = fit(csv_path, out_dir, params)
 
     # save model data
-    #joblib.dump(model, "logistic_model.pkl")
-    #joblib.dump(scaler, "scaler.pkl")
+    manifest = {"params": params, "fit_csv_hash": csv_hash, "csv_hash": csv_hash, "csv_bytes": csv_bytes, **info}
+    artifact_store.commit(key, objects, manifest)
+    artifact_store.prune(params, keep=Config.TABULAR_ARTIFACT_KEEP)
+    return key, manifest
+
+
+def _score_appended(key, manifest, csv_path, csv_hash, csv_bytes):
+    # Rows appended after the last run are scaled and scored with the cached model, then added
+    # to the end of X_test / y_pred; nothing is refitted. Both the copy of the cached arrays and the
+    # scoring go chunk by chunk, so memory stays flat however large the file is.
+    params = manifest["params"]
+    columns = manifest["columns"]
+    chunk_rows = params.get("chunk_rows", Config.TABULAR_STREAMING_CHUNK_ROWS)
+
+    def appended_chunks(**kwargs):
+        with open(csv_path, "rb") as f:
+            f.seek(manifest["csv_bytes"])
+            yield from pd.read_csv(f, header=None, names=columns, chunksize=chunk_rows, **kwargs)
+
+    n_new = sum(len(chunk) for chunk in appended_chunks(usecols=[0]))
+    scaler = artifact_store.load_object(key, "scaler")
+    model = artifact_store.load_object(key, "model")
+
+    outputs = {}
+    for name in ("X_test", "y_pred"):
+        cached = np.load(artifact_store.array_path(key, name), mmap_mode="r")
+        out = np.lib.format.open_memmap(artifact_store.array_path(key, name)[:-len(".npy")] + ".tmp.npy",
+                                        mode="w+", dtype=cached.dtype, shape=(len(cached) + n_new,) + cached.shape[1:])
+        for start in range(0, len(cached), chunk_rows):
+            stop = min(start + chunk_rows, len(cached))
+            out[start:stop] = cached[start:stop]
+        outputs[name] = out
+
+    position = manifest["n_scored"]
+    for chunk in appended_chunks(dtype=_feature_dtypes(columns, params)):
+        X_new = scaler.transform(chunk.drop(columns=['Class']).to_numpy(dtype=outputs["X_test"].dtype))
+        outputs["X_test"][position:position + len(chunk)] = X_new
+        outputs["y_pred"][position:position + len(chunk)] = model.predict(X_new)
+        position += len(chunk)
+
+    for name, out in outputs.items():
+        out.flush()
+        os.replace(out.filename, artifact_store.array_path(key, name))
+    del outputs, out
+
+    manifest.update({"csv_hash": csv_hash, "csv_bytes": csv_bytes, "published": {},
+                     "n_rows": manifest["n_rows"] + n_new, "n_scored": manifest["n_scored"] + n_new})
+    artifact_store.update_manifest(key, manifest)
+    logger.info("Scored %d appended rows with the cached model.", n_new)
+
+
+def _ends_with_newline(path, offset):
+    if offset == 0:
+        return False
+    with open(path, "rb") as f:
+        f.seek(offset - 1)
+        return f.read(1) == b"\n"
+
+
+def train_model(csv_path=DATA_CSV):
+    """Load (or fit) the tabular model and publish X_test.npy / y_pred.npy.
+
+    Cached artifacts are reused when the CSV and hyperparameters are unchanged;
+    when the CSV has only been appended to, just the new rows are scored.
+    """
+    params = current_params()
+    candidates = list(artifact_store.entries(params))
+    csv_hash, prefix_hashes = file_hash(csv_path, offsets=[manifest["csv_bytes"] for _, manifest in candidates])
+    csv_bytes = os.path.getsize(csv_path)
+
+    key, manifest = next(((key, manifest) for key, manifest in candidates if manifest["csv_hash"] == csv_hash),
+                         (None, None))
+    if key is not None:
+        logger.info("Loaded cached tabular model and predictions.")
+    else:
+        appended = [(key, manifest) for key, manifest in candidates
+                    if prefix_hashes.get(manifest["csv_bytes"]) == manifest["csv_hash"]
+                    and _ends_with_newline(csv_path, manifest["csv_bytes"])]
+        if appended:
+            key, manifest = max(appended, key=lambda entry: entry[1]["csv_bytes"])
+            _score_appended(key, manifest, csv_path, csv_hash, csv_bytes)
+        else:
+            key, manifest = _fit(csv_path, csv_hash, csv_bytes, params)
+
+    _publish(key, manifest)
 
-    global prediction_done
-    prediction_done = True
-    print(f"Prediction done: {prediction_done}")
\ No newline at end of file
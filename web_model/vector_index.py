@@ -0,0 +1,214 @@
+import os
+
+import numpy as np
+
+from config import Config
+
+
+def _topk(distances, k):
+    # Row-wise k smallest of a (m, n) distance matrix, sorted ascending; equal distances keep column order
+    k = min(k, distances.shape[1])
+    if k == 0:
+        empty = np.empty((distances.shape[0], 0))
+        return empty.astype(np.int64), empty
+    part = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    part_dist = np.take_along_axis(distances, part, axis=1)
+    order = np.lexsort((part, part_dist), axis=1)
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(part_dist, order, axis=1)
+
+
+def pairwise_distances(queries, vectors, metric="l2", vector_sq_norms=None):
+    """Distance of every query to every vector; smaller is closer for both metrics.
+
+    ``l2`` returns squared Euclidean distances (same ranking as ``np.linalg.norm``);
+    ``ip`` returns the negated inner product (cosine distance on normalized vectors).
+    """
+    products = queries @ vectors.T
+    if metric == "ip":
+        return -products
+    if vector_sq_norms is None:
+        vector_sq_norms = np.einsum("ij,ij->i", vectors, vectors)
+    query_sq_norms = np.einsum("ij,ij->i", queries, queries)
+    distances = query_sq_norms[:, None] - 2 * products + vector_sq_norms[None, :]
+    return np.maximum(distances, 0, out=distances)
+
+
+# Recall reported with each index: always at k=10, whatever k a request asks for
+RECALL_K = 10
+
+
+class ExactIndex:
+    """Brute-force search over blocks of rows with an argpartition top-k merge."""
+
+    backend = "exact"
+
+    def __init__(self, vectors, metric="l2", block_size=None, sq_norms=None):
+        self.vectors = vectors
+        self.metric = metric
+        self.block_size = block_size or Config.VECTOR_INDEX_BLOCK_SIZE
+        if sq_norms is None and metric == "l2":
+            sq_norms = np.einsum("ij,ij->i", vectors, vectors)
+        self.sq_norms = sq_norms
+        self.recall_at_10 = 1.0
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def search(self, queries, k):
+        # float16 storage is searched in float32
+        dtype = np.result_type(self.vectors.dtype, np.float32)
+        queries = np.atleast_2d(np.asarray(queries, dtype=dtype))
+        best_ids = np.empty((len(queries), 0), dtype=np.int64)
+        best_dist = np.empty((len(queries), 0), dtype=np.float64)
+
+        for start in range(0, len(self.vectors), self.block_size):
+            stop = min(start + self.block_size, len(self.vectors))
+            norms = None if self.sq_norms is None else self.sq_norms[start:stop]
+            block = np.asarray(self.vectors[start:stop], dtype=dtype)
+            distances = pairwise_distances(queries, block, self.metric, norms)
+            ids, dist = _topk(distances, k)
+
+            # Merge this block's candidates with the running best
+            merged_ids = np.concatenate([best_ids, ids + start], axis=1)
+            merged_dist = np.concatenate([best_dist, dist], axis=1)
+            keep, best_dist = _topk(merged_dist, k)
+            best_ids = np.take_along_axis(merged_ids, keep, axis=1)
+
+        return best_ids, best_dist
+
+    def state(self):
+        return {} if self.sq_norms is None else {"sq_norms": self.sq_norms}
+
+    @classmethod
+    def from_state(cls, vectors, metric, state):
+        return cls(vectors, metric=metric, sq_norms=state.get("sq_norms"))
+
+    @classmethod
+    def build(cls, vectors, metric="l2"):
+        return cls(vectors, metric=metric)
+
+
+class IVFIndex:
+    """Inverted-file approximate index: k-means coarse quantizer + exact search in the probed lists."""
+
+    backend = "ivf"
+
+    def __init__(self, vectors, centroids, list_offsets, list_ids, metric="l2", n_probe=None):
+        self.vectors = vectors
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_ids = list_ids
+        self.metric = metric
+        self.n_probe = n_probe or Config.IVF_N_PROBE
+        self.recall_at_10 = None  # measured against the exact backend when the index is built
+
+    def __len__(self):
+        return len(self.vectors)
+
+    @classmethod
+    def build(cls, vectors, metric="l2", n_lists=None, n_iter=10, points_per_list=64, seed=42):
+        rng = np.random.default_rng(seed)
+        n_lists = n_lists or Config.IVF_N_LISTS or max(1, int(np.sqrt(len(vectors))))
+        n_lists = min(n_lists, len(vectors))
+
+        # Train the coarse quantizer on a sample of the rows
+        sample_size = min(len(vectors), max(points_per_list * n_lists, 10_000))
+        sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))],
+                            dtype=np.float32)
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+        for _ in range(n_iter):
+            assignment = cls._assign(sample, centroids, metric)
+            counts = np.bincount(assignment, minlength=n_lists)
+            sums = np.stack([np.bincount(assignment, weights=sample[:, j], minlength=n_lists)
+                             for j in range(sample.shape[1])], axis=1)
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+            if metric == "ip":
+                centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+
+        # Bucket every row into its nearest list, stored CSR-style
+        assignment = cls._assign(vectors, centroids, metric)
+        list_ids = np.argsort(assignment, kind="stable").astype(np.int64)
+        list_offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignment, minlength=n_lists), out=list_offsets[1:])
+        return cls(vectors, centroids.astype(np.float32), list_offsets, list_ids, metric=metric)
+
+    @staticmethod
+    def _assign(vectors, centroids, metric, block_size=8192):
+        assignment = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), block_size):
+            block = np.asarray(vectors[start:start + block_size], dtype=np.float32)
+            assignment[start:start + block_size] = pairwise_distances(block, centroids, metric).argmin(axis=1)
+        return assignment
+
+    def search(self, queries, k, n_probe=None):
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float64))
+        n_probe = min(n_probe or self.n_probe, len(self.centroids))
+        probes, _ = _topk(pairwise_distances(queries, self.centroids, self.metric), n_probe)
+
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        dist = np.full((len(queries), k), np.inf)
+        for q, query in enumerate(queries):
+            candidates = np.concatenate([self.list_ids[self.list_offsets[p]:self.list_offsets[p + 1]]
+                                         for p in probes[q]])
+            if len(candidates) == 0:
+                continue
+            distances = pairwise_distances(query[None, :], np.asarray(self.vectors[candidates], dtype=np.float64),
+                                           self.metric)
+            top, top_dist = _topk(distances, k)
+            ids[q, :top.shape[1]] = candidates[top[0]]
+            dist[q, :top.shape[1]] = top_dist[0]
+        return ids, dist
+
+    def measure_recall(self, exact, k=RECALL_K, n_queries=100, seed=0):
+        """Recall@k of this index against the exact backend on rows sampled from the data."""
+        rng = np.random.default_rng(seed)
+        rows = rng.choice(len(self.vectors), min(n_queries, len(self.vectors)), replace=False)
+        queries = np.asarray(self.vectors[rows])
+        approx_ids, _ = self.search(queries, k)
+        exact_ids, _ = exact.search(queries, k)
+        hits = sum(len(np.intersect1d(a[a >= 0], e)) for a, e in zip(approx_ids, exact_ids))
+        return hits / exact_ids.size if exact_ids.size else 1.0
+
+    def state(self):
+        return {"centroids": self.centroids, "list_offsets": self.list_offsets, "list_ids": self.list_ids,
+                "recall_at_10": np.float64(np.nan if self.recall_at_10 is None else self.recall_at_10)}
+
+    @classmethod
+    def from_state(cls, vectors, metric, state):
+        index = cls(vectors, state["centroids"], state["list_offsets"], state["list_ids"], metric=metric)
+        # Files written before the rename call it recall_at_k; it was measured at k=10 as well
+        recall = float(state.get("recall_at_10", state.get("recall_at_k", np.nan)))
+        index.recall_at_10 = None if np.isnan(recall) else recall
+        return index
+
+
+BACKENDS = {ExactIndex.backend: ExactIndex, IVFIndex.backend: IVFIndex}
+
+
+def index_path(data_file, backend):
+    # Persisted beside the data: X_test.npy -> X_test.ivf.npz
+    return f"{os.path.splitext(data_file)[0]}.{backend}.npz"
+
+
+def load_or_build_index(backend, vectors, data_file, version, metric="l2"):
+    """Load the persisted index for this dataset version, or build and persist it."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown vector index backend '{backend}'. Choose from {sorted(BACKENDS)}.")
+    cls = BACKENDS[backend]
+    path = index_path(data_file, backend)
+
+    if os.path.exists(path):
+        with np.load(path) as data:
+            state = {key: data[key] for key in data.files}
+        if str(state.pop("version")) == version and str(state.pop("metric")) == metric:
+            return cls.from_state(vectors, metric, state)
+
+    index = cls.build(vectors, metric=metric)
+    if isinstance(index, IVFIndex):
+        index.recall_at_10 = index.measure_recall(ExactIndex(vectors, metric=metric), k=RECALL_K)
+
+    tmp_path = path + ".tmp.npz"
+    np.savez(tmp_path, version=np.str_(version), metric=np.str_(metric), **index.state())
+    os.replace(tmp_path, path)
+    return index